@@ -0,0 +1,340 @@
+"""Offline benchmarks of pypre against a fake cbftp instance.
+
+For each combination of release and site counts, a fake cbftp server is started in a separate
+process, and pypre is driven through the selected scenarios. Wall time, number of requests
+received by the server, pre fan-out spread (delay between the first and the last site receiving
+the pre of a release) and peak memory allocated by pypre are reported.
+
+Example:
+
+    python benchmarks/bench.py --releases 10 100 --sites 2 8 --latency 0.05 --output results.json
+    python benchmarks/bench.py --releases 10 100 --sites 2 8 --latency 0.05 --compare results.json
+"""
+
+from __future__ import annotations
+
+import json
+import multiprocessing
+import statistics
+import sys
+import tempfile
+import tracemalloc
+from argparse import ArgumentParser, Namespace
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from multiprocessing.connection import Connection
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+from urllib.request import Request, urlopen
+
+from fake_cbftp import FakeSettings, add_settings_arguments, make_server, settings_from_args
+
+import pypre.config
+from pypre.config import Config, load_config
+from pypre.manager import CBFTPManager
+from pypre.operations import pre_releases
+
+SCENARIOS = ("plan", "upload", "fxp", "fxp-tree", "fxp-spread", "pre")
+CBFTP_NAME = "bench"
+
+
+@dataclass
+class Result:
+    scenario: str
+    releases: int
+    sites: int
+    wall_time: float
+    requests: int
+    requests_by_endpoint: dict[str, int]
+    pre_spread_mean: float | None
+    pre_spread_max: float | None
+    peak_memory: int | None
+    error: str | None = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.scenario}:{self.releases}x{self.sites}"
+
+
+def _serve(settings: FakeSettings, conn: Connection) -> None:
+    server = make_server(settings)
+    conn.send(server.server_address[1])
+    server.serve_forever()
+
+
+def release_names(count: int) -> list[str]:
+    return [f"Bench.Release.{i:05d}.S01E01.720p.HDTV.x264-GRP" for i in range(count)]
+
+
+def site_names(count: int) -> list[str]:
+    return [f"S{i}" for i in range(1, count + 1)]
+
+
+def write_config(path: Path, sites: list[str], port: int) -> None:
+    lines = [
+        "sections = [['tv', '.+S\\d{2,3}E\\d+.+']]",
+        f"data_dir = '{path.parent / 'data'}'",
+        "[cbftp.bench]",
+        f"base_url = 'http://127.0.0.1:{port}'",
+        "password = 'bench'",
+    ]
+    for site in sites:
+        lines += [
+            f"[sites.{site}]",
+            f"id = '{site}'",
+            "pre_command = 'site pre {release} {section}'",
+            "groups_dir = '/groups/'",
+            f"[sites.{site}.dir_config]",
+            "match_group = true",
+            "default = 'DEFAULT'",
+        ]
+    lines += [
+        "[logging]",
+        "version = 1",
+        "disable_existing_loggers = true",
+        "[logging.loggers.pypre]",
+        "level = 'WARNING'",
+    ]
+    path.write_text("\n".join(lines) + "\n")
+
+
+def _request(port: int, method: str, endpoint: str) -> Any:
+    with urlopen(Request(f"http://127.0.0.1:{port}{endpoint}", method=method)) as response:
+        data = response.read()
+    return json.loads(data) if data else None
+
+
+def _spreads(raw_calls: list[dict[str, Any]], releases: list[str]) -> list[float]:
+    received: dict[str, list[float]] = {}
+    for call in raw_calls:
+        release = call["command"].split()[2]
+        received.setdefault(release, []).extend([call["received"]] * len(call["sites"]))
+    return [max(times) - min(times) for release, times in received.items() if release in releases and len(times) > 1]
+
+
+def run_scenario(
+    scenario: str,
+    port: int,
+    *,
+    config: Config,
+    releases: list[str],
+    sites: list[str],
+    staging_dir: Path,
+    release_file: Path,
+    args: Namespace,
+) -> Result:
+    # The commands read the global config when imported, which is only set by `main`
+    from pypre.main import main  # noqa: PLC0415
+
+    def run_cli(*cli_args: str) -> None:
+        try:
+            main([*cli_args], standalone_mode=False)
+        except SystemExit as e:
+            if e.code:
+                raise
+
+    common = ["--cbftp", CBFTP_NAME, "--yes"]
+    wait = ["--wait"] if args.wait else []
+    runners: dict[str, Callable[[], None]] = {
+        "plan": lambda: _plan(config, releases, sites),
+        "upload": lambda: run_cli(
+            *common, "upload", "-g", str(staging_dir / "*"), *(f"--site={site}" for site in sites), *wait
+        ),
+        "fxp": lambda: run_cli(
+            *common,
+            "fxp",
+            "--file",
+            str(release_file),
+            "--from",
+            sites[0],
+            *(f"--to={site}" for site in sites[1:]),
+            *wait,
+        ),
+        "fxp-tree": lambda: run_cli(
+            *common,
+            "fxp",
+            "--file",
+            str(release_file),
+            "--from",
+            sites[0],
+            *(f"--to={site}" for site in sites[1:]),
+            "--distribution",
+            "tree",
+        ),
+        "fxp-spread": lambda: run_cli(
+            *common,
+            "fxp",
+            "--file",
+            str(release_file),
+            "--from",
+            sites[0],
+            *(f"--to={site}" for site in sites[1:]),
+            "--engine",
+            "spread",
+            *wait,
+        ),
+        "pre": lambda: _pre(config, releases, sites, args.cooldown),
+    }
+
+    _request(port, "POST", "/_reset")
+    error = None
+    peak_memory = None
+    if args.memory:
+        tracemalloc.start()
+    start = perf_counter()
+    try:
+        runners[scenario]()
+    except Exception as e:
+        error = repr(e)
+    wall_time = perf_counter() - start
+    if args.memory:
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    stats = _request(port, "GET", "/_stats")
+    spreads = _spreads(stats["raw_calls"], releases)
+    return Result(
+        scenario=scenario,
+        releases=len(releases),
+        sites=len(sites),
+        wall_time=wall_time,
+        requests=sum(stats["requests"].values()),
+        requests_by_endpoint=stats["requests"],
+        pre_spread_mean=statistics.mean(spreads) if spreads else None,
+        pre_spread_max=max(spreads) if spreads else None,
+        peak_memory=peak_memory,
+        error=error,
+    )
+
+
+def _manager(config: Config) -> CBFTPManager:
+    return CBFTPManager(cbftp=config.cbftp_client(CBFTP_NAME), sections=config.sections)
+
+
+def _plan(config: Config, releases: list[str], sites: list[str]) -> None:
+    """Resolve the destination path and section of every release on every site."""
+    manager = _manager(config)
+    for site_key in sites:
+        site = config.sites[site_key]
+        for release in releases:
+            manager._get_dst_path(site, release)
+            site.get_section(release, config.sections)
+
+
+def _pre(config: Config, releases: list[str], sites: list[str], cooldown: float) -> None:
+    pre_releases(_manager(config), releases, [config.sites[site_key] for site_key in sites], cooldown)
+
+
+def format_results(results: list[Result], baseline: dict[str, dict[str, Any]]) -> str:
+    def ms(value: float | None) -> str:
+        return "-" if value is None else f"{value * 1000:.1f}"
+
+    def kib(value: int | None) -> str:
+        return "-" if value is None else f"{value / 1024:.1f}"
+
+    header = (
+        f"{'Scenario':<10} {'Rel':>4} {'Sites':>5} {'Wall (s)':>9} {'Change':>8} {'Requests':>9} "
+        f"{'Spread avg (ms)':>16} {'Spread max (ms)':>16} {'Peak mem (KiB)':>15}"
+    )
+    lines = [header]
+    for result in results:
+        previous = baseline.get(result.key)
+        change = f"{(result.wall_time / previous['wall_time'] - 1) * 100:+.1f}%" if previous else "-"
+        lines.append(
+            f"{result.scenario:<10} {result.releases:>4} {result.sites:>5} {result.wall_time:>9.3f} {change:>8} "
+            f"{result.requests:>9} {ms(result.pre_spread_mean):>16} {ms(result.pre_spread_max):>16} "
+            f"{kib(result.peak_memory):>15}"
+        )
+        if result.error is not None:
+            lines.append(f"  error: {result.error}")
+    return "\n".join(lines)
+
+
+def handle_args() -> Namespace:
+    parser = ArgumentParser(description="Benchmark pypre against a fake cbftp instance.")
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=SCENARIOS,
+        default=[scenario for scenario in SCENARIOS if scenario != "fxp-tree"],
+        help="Scenarios to run. 'fxp-tree' always waits for transfers, and is only run if explicitly requested.",
+    )
+    parser.add_argument("--releases", nargs="+", type=int, default=[10, 100], help="Release counts to benchmark.")
+    parser.add_argument("--sites", nargs="+", type=int, default=[2, 4], help="Site counts to benchmark (>= 2).")
+    parser.add_argument("--wait", action="store_true", help="Wait for upload/fxp transfers to complete.")
+    parser.add_argument("--cooldown", type=float, default=0.0, help="Cooldown between each pre.")
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="Measure peak memory allocated by pypre. Slows down pypre, so wall times are not comparable.",
+    )
+    parser.add_argument("--output", type=Path, help="Write results to this JSON file.")
+    parser.add_argument("--compare", type=Path, help="Compare wall times against a previous JSON output.")
+    add_settings_arguments(parser)
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = handle_args()
+    if min(args.sites) < 2:
+        print("At least 2 sites are required (fxp needs a source and a destination).", file=sys.stderr)
+        return 1
+
+    all_sites = site_names(max(args.sites))
+    all_releases = release_names(max(args.releases))
+    baseline: dict[str, dict[str, Any]] = {}
+    if args.compare is not None:
+        baseline = {f"{r['scenario']}:{r['releases']}x{r['sites']}": r for r in json.loads(args.compare.read_text())}
+
+    ctx = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = ctx.Pipe()
+    server = ctx.Process(target=_serve, args=(settings_from_args(args, all_sites, all_releases), child_conn))
+    server.daemon = True
+    server.start()
+    port: int = parent_conn.recv()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="pypre-bench-") as tmp:
+        tmp_dir = Path(tmp)
+        config_path = tmp_dir / "config.toml"
+        write_config(config_path, all_sites, port)
+        config = load_config(config_path)
+        # The command line uses the global config, which would otherwise be loaded from PYPRE_CONFIG
+        pypre.config.config = config
+
+        try:
+            for release_count in args.releases:
+                releases = all_releases[:release_count]
+                staging_dir = tmp_dir / f"staging-{release_count}"
+                for release in releases:
+                    (staging_dir / release).mkdir(parents=True)
+                    (staging_dir / release / f"{release}.nfo").write_bytes(b"\0" * 1024)
+                release_file = tmp_dir / f"releases-{release_count}.txt"
+                release_file.write_text("\n".join(releases) + "\n")
+
+                for site_count in args.sites:
+                    for scenario in args.scenarios:
+                        results.append(
+                            run_scenario(
+                                scenario,
+                                port,
+                                config=config,
+                                releases=releases,
+                                sites=all_sites[:site_count],
+                                staging_dir=staging_dir,
+                                release_file=release_file,
+                                args=args,
+                            )
+                        )
+        finally:
+            server.terminate()
+
+    print(format_results(results, baseline))
+    if args.output is not None:
+        args.output.write_text(json.dumps([asdict(result) for result in results], indent=2))
+    return 1 if any(result.error is not None for result in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
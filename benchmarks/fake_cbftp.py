@@ -0,0 +1,594 @@
+"""A local stand-in for the cbftp REST API, used by the benchmarks.
+
+Only the endpoints used by pypre are implemented. Latency and failures can be injected
+to reproduce slow or flaky cbftp instances and sites.
+
+The server can be run standalone:
+
+    python benchmarks/fake_cbftp.py --port 55477 --latency 0.05 --sites S1 S2 S3
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import re
+import threading
+from argparse import ArgumentParser, Namespace
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import PurePosixPath
+from time import monotonic, sleep, time
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+
+@dataclass
+class FakeSettings:
+    sites: list[str]
+    """The site IDs available on the instance."""
+
+    group_dirs: list[str] = field(default_factory=lambda: ["GRP", "DEFAULT"])
+    """The group directories available on every site."""
+
+    extra_group_dirs: int = 0
+    """Number of additional filler group directories, to simulate large listings."""
+
+    releases: list[str] = field(default_factory=list)
+    """Releases present in every group directory of every site."""
+
+    latency: float = 0.0
+    """Delay in seconds added to every request."""
+
+    jitter: float = 0.0
+    """Random delay in seconds added on top of `latency`."""
+
+    failure_rate: float = 0.0
+    """Probability of a request failing with an HTTP 500 error."""
+
+    raw_failure_rate: float = 0.0
+    """Probability of a site failing a raw command."""
+
+    raw_delay: float = 0.0
+    """Delay in seconds before the result of a raw command is available."""
+
+    raw_failures: dict[str, int] = field(default_factory=dict)
+    """Number of raw commands each site fails before succeeding."""
+
+    raw_unanswered: list[str] = field(default_factory=list)
+    """Sites left out of the results of raw commands."""
+
+    release_size: int = 100 * 1024**2
+    """Size in bytes of each transferred release."""
+
+    speed: float = 50 * 1024**2
+    """Transfer speed in bytes per second of each transfer job."""
+
+    site_bandwidth: float | None = None
+    """Upload bandwidth in bytes per second of each site, shared between its outbound transfer jobs."""
+
+    seed: int | None = None
+    """Random seed used for failure injection."""
+
+
+@dataclass
+class FakeJob:
+    id: int
+    name: str
+    src_site: str | None
+    dst_site: str
+    src_path: str | None
+    dst_path: str
+    size: int
+    started: float = field(default_factory=monotonic)
+    progress: float = 0.0
+    ended_at: float | None = None
+    aborted: bool = False
+
+    @property
+    def running(self) -> bool:
+        return self.ended_at is None
+
+    def state(self) -> dict[str, Any]:
+        elapsed = (self.ended_at if self.ended_at is not None else monotonic()) - self.started
+        progress = int(self.progress)
+        if self.aborted:
+            status = "ABORTED"
+        elif not self.running:
+            status = "DONE"
+        else:
+            status = "RUNNING"
+        return {
+            "id": self.id,
+            "name": self.name,
+            "type": "FXP" if self.src_site is not None else "UPLOAD",
+            "src_site": self.src_site,
+            "src_path": self.src_path,
+            "dst_site": self.dst_site,
+            "dst_path": self.dst_path,
+            "status": status,
+            "progress": int(100 * progress / self.size) if self.size else 100,
+            "time_spent_seconds": int(elapsed),
+            "size_progress_bytes": progress,
+            "size_estimated_bytes": self.size,
+        }
+
+
+@dataclass
+class FakeSpreadJob:
+    id: int
+    name: str
+    section: str
+    profile: str
+    sites: list[str]
+    """The destination sites."""
+    sites_dlonly: list[str]
+    """The source sites, only downloaded from."""
+    size: int
+    started: float = field(default_factory=monotonic)
+    progress: dict[str, float] = field(default_factory=dict)
+    """The bytes received by each destination."""
+    ended_at: float | None = None
+    aborted: bool = False
+
+    @property
+    def running(self) -> bool:
+        return self.ended_at is None
+
+    def site_status(self, site: str) -> str:
+        if self.progress[site] >= self.size:
+            return "DONE"
+        return "ABORTED" if self.aborted else "RUNNING"
+
+    def state(self) -> dict[str, Any]:
+        elapsed = (self.ended_at if self.ended_at is not None else monotonic()) - self.started
+        if self.aborted:
+            status = "ABORTED"
+        elif not self.running:
+            status = "DONE"
+        else:
+            status = "RUNNING"
+        return {
+            "id": self.id,
+            "name": self.name,
+            "section": self.section,
+            "profile": self.profile,
+            "status": status,
+            "time_spent_seconds": int(elapsed),
+            "size_progress_bytes": int(sum(self.progress.values())),
+            "size_estimated_bytes": self.size * len(self.sites),
+            "sites": [
+                {
+                    "name": site,
+                    "status": self.site_status(site),
+                    "size_progress_bytes": int(self.progress[site]),
+                    "size_estimated_bytes": self.size,
+                }
+                for site in self.sites
+            ],
+        }
+
+
+class FakeCBFTP:
+    """State of the fake cbftp instance."""
+
+    def __init__(self, settings: FakeSettings) -> None:
+        self.settings = settings
+        self.random = random.Random(settings.seed)
+        self.lock = threading.Lock()
+        self.jobs: dict[int, FakeJob] = {}
+        self.spreadjobs: dict[str, FakeSpreadJob] = {}
+        self.requests: Counter[str] = Counter()
+        self.raw_calls: list[dict[str, Any]] = []
+        self.raw_results: dict[int, tuple[float, dict[str, Any]]] = {}
+        self.raw_failed: Counter[str] = Counter()
+        self.group_dirs = sorted(settings.group_dirs + [f"FILLER{i:06d}" for i in range(settings.extra_group_dirs)])
+        self.last_advance = monotonic()
+
+    def advance(self) -> None:
+        """Progress the running transfer jobs up to now. Must be called with the lock held."""
+        now = monotonic()
+        elapsed, self.last_advance = now - self.last_advance, now
+        running = [job for job in self.jobs.values() if job.running]
+        outbound = Counter(job.src_site for job in running)
+        for job in running:
+            speed = self.settings.speed
+            if self.settings.site_bandwidth is not None:
+                speed = min(speed, self.settings.site_bandwidth / outbound[job.src_site])
+            job.progress = min(job.size, job.progress + elapsed * speed)
+            if job.progress >= job.size:
+                job.ended_at = now
+
+        for spreadjob in self.spreadjobs.values():
+            if not spreadjob.running:
+                continue
+            # The sources and the destinations having the release upload to the other destinations
+            receiving = [site for site in spreadjob.sites if spreadjob.progress[site] < spreadjob.size]
+            uploaders = len(spreadjob.sites_dlonly) + len(spreadjob.sites) - len(receiving)
+            speed = self.settings.speed
+            if self.settings.site_bandwidth is not None and receiving:
+                speed = min(speed, self.settings.site_bandwidth * uploaders / len(receiving))
+            for site in receiving:
+                spreadjob.progress[site] = min(spreadjob.size, spreadjob.progress[site] + elapsed * speed)
+            if all(progress >= spreadjob.size for progress in spreadjob.progress.values()):
+                spreadjob.ended_at = now
+
+    def reset(self) -> None:
+        with self.lock:
+            self.jobs.clear()
+            self.spreadjobs.clear()
+            self.requests.clear()
+            self.raw_calls.clear()
+            self.raw_results.clear()
+            self.raw_failed.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            self.advance()
+            return {
+                "requests": dict(self.requests),
+                "raw_calls": list(self.raw_calls),
+                "jobs": [job.state() for job in self.jobs.values()],
+                "spreadjobs": [spreadjob.state() for spreadjob in self.spreadjobs.values()],
+            }
+
+    def list_path(self, site: str, path: str) -> list[dict[str, Any]] | None:
+        if site not in self.settings.sites:
+            return None
+        parts = PurePosixPath(path).parts
+        if len(parts) == 2:  # A groups dir, e.g. /groups
+            return [_path_entry(name, "DIR") for name in self.group_dirs]
+        if len(parts) == 3:  # A group dir, e.g. /groups/GRP
+            return [_path_entry(name, "DIR") for name in self.settings.releases]
+        if len(parts) == 4:  # A release dir
+            return [
+                _path_entry(f"{parts[-1]}.nfo", "FILE", 1024),
+                _path_entry(f"{parts[-1]}.sfv", "FILE", 1024),
+                _path_entry(f"[{site}] - ( 100% COMPLETE )", "DIR"),
+            ]
+        return []
+
+    def raw(self, payload: dict[str, Any]) -> dict[str, Any]:
+        sites = payload.get("sites") or []
+        received = time()
+        successes, failures = [], []
+        with self.lock:
+            for site in sites:
+                if site in self.settings.raw_unanswered:
+                    continue
+                if site not in self.settings.sites:
+                    failures.append({"name": site, "reason": "site not found"})
+                elif self.raw_failed[site] < self.settings.raw_failures.get(site, 0):
+                    self.raw_failed[site] += 1
+                    failures.append({"name": site, "reason": "scripted failure"})
+                elif self.random.random() < self.settings.raw_failure_rate:
+                    failures.append({"name": site, "reason": "injected failure"})
+                else:
+                    successes.append({"name": site, "result": "200 Command successful."})
+            self.raw_calls.append(
+                {
+                    "command": payload.get("command"),
+                    "sites": sites,
+                    "path": payload.get("path"),
+                    "received": received,
+                    "failures": [failure["name"] for failure in failures],
+                }
+            )
+            if payload.get("async"):
+                request_id = len(self.raw_results) + 1
+                ready_at = monotonic() + self.settings.raw_delay
+                self.raw_results[request_id] = (ready_at, {"successes": successes, "failures": failures})
+                return {"request_id": request_id}
+        if self.settings.raw_delay:
+            sleep(self.settings.raw_delay)
+        return {"successes": successes, "failures": failures}
+
+    def raw_result(self, request_id: int) -> dict[str, Any] | None:
+        """Return the result of an asynchronous raw command, empty until its delay elapsed."""
+        with self.lock:
+            entry = self.raw_results.get(request_id)
+        if entry is None:
+            return None
+        ready_at, result = entry
+        if monotonic() < ready_at:
+            return {"successes": [], "failures": []}
+        return result
+
+    def create_job(self, payload: dict[str, Any]) -> dict[str, Any] | None:
+        dst_site = payload.get("dst_site")
+        src_site = payload.get("src_site")
+        if dst_site not in self.settings.sites or (src_site is not None and src_site not in self.settings.sites):
+            return None
+        with self.lock:
+            self.advance()
+            job_id = len(self.jobs) + 1
+            self.jobs[job_id] = FakeJob(
+                id=job_id,
+                name=payload["name"],
+                src_site=src_site,
+                dst_site=dst_site,
+                src_path=payload.get("src_path"),
+                dst_path=payload["dst_path"],
+                size=self.settings.release_size,
+            )
+        return {"id": job_id}
+
+    def create_spreadjob(self, payload: dict[str, Any]) -> dict[str, Any] | None:
+        sites = payload.get("sites") or []
+        sites_dlonly = payload.get("sites_dlonly") or []
+        if (
+            not sites
+            or not payload.get("section")
+            or any(site not in self.settings.sites for site in sites + sites_dlonly)
+        ):
+            return None
+        with self.lock:
+            self.advance()
+            existing = self.spreadjobs.get(payload["name"])
+            if existing is not None and existing.running and not payload.get("reset"):
+                return None
+            spreadjob_id = len(self.spreadjobs) + 1
+            self.spreadjobs[payload["name"]] = FakeSpreadJob(
+                id=spreadjob_id,
+                name=payload["name"],
+                section=payload["section"],
+                profile=payload.get("profile", "RACE"),
+                sites=sites,
+                sites_dlonly=sites_dlonly,
+                size=self.settings.release_size,
+                progress=dict.fromkeys(sites, 0.0),
+            )
+        return {"id": spreadjob_id}
+
+    def find_spreadjob(self, name: str) -> FakeSpreadJob | None:
+        with self.lock:
+            self.advance()
+            return self.spreadjobs.get(name)
+
+    def find_job(self, key: str, by_id: bool) -> FakeJob | None:
+        with self.lock:
+            self.advance()
+            if by_id:
+                return self.jobs.get(int(key)) if key.isdigit() else None
+            return next((job for job in self.jobs.values() if job.name == key), None)
+
+
+def _path_entry(name: str, type: str, size: int = 0) -> dict[str, Any]:
+    return {
+        "name": name,
+        "type": type,
+        "size": size,
+        "user": "user",
+        "group": "group",
+        "owner": "user",
+        "last_modified": "2024-01-01 00:00",
+    }
+
+
+_Handled = tuple[int, Any]
+"""The status code and JSON body of a response."""
+
+
+def _routes(
+    fake: FakeCBFTP,
+) -> list[tuple[str, re.Pattern[str], str, Callable[[re.Match[str], dict[str, str], Any], _Handled]]]:
+    """Return the method, path pattern, counted name and handler of each endpoint.
+
+    The endpoints without a name are internal to the benchmarks: they are neither counted, nor delayed,
+    nor failed.
+    """
+
+    def stats(match: re.Match[str], query: dict[str, str], payload: Any) -> _Handled:
+        return 200, fake.stats()
+
+    def reset(match: re.Match[str], query: dict[str, str], payload: Any) -> _Handled:
+        fake.reset()
+        return 204, None
+
+    def get_sites(match: re.Match[str], query: dict[str, str], payload: Any) -> _Handled:
+        return 200, fake.settings.sites
+
+    def get_site(match: re.Match[str], query: dict[str, str], payload: Any) -> _Handled:
+        if match["name"] not in fake.settings.sites:
+            return 404, None
+        # Each group directory is a section, so that spread jobs can target it
+        sections = [{"name": name, "path": f"/groups/{name}"} for name in fake.settings.group_dirs]
+        return 200, {"name": match["name"], "sections": sections}
+
+    def get_path(match: re.Match[str], query: dict[str, str], payload: Any) -> _Handled:
+        listing = fake.list_path(query.get("site", ""), query.get("path", ""))
+        return (404, None) if listing is None else (200, listing)
+
+    def get_transferjobs(match: re.Match[str], query: dict[str, str], payload: Any) -> _Handled:
+        with fake.lock:
+            fake.advance()
+            return 200, [job.state() for job in fake.jobs.values()]
+
+    def get_transferjob(match: re.Match[str], query: dict[str, str], payload: Any) -> _Handled:
+        job = fake.find_job(match["key"], query.get("id") == "true")
+        return (404, None) if job is None else (200, job.state())
+
+    def abort_transferjob(match: re.Match[str], query: dict[str, str], payload: Any) -> _Handled:
+        job = fake.find_job(match["key"], query.get("id") == "true")
+        if job is None:
+            return 404, None
+        with fake.lock:
+            if job.running:
+                job.ended_at = monotonic()
+                job.aborted = True
+        return 204, None
+
+    def create_transferjob(match: re.Match[str], query: dict[str, str], payload: Any) -> _Handled:
+        created = fake.create_job(payload)
+        return (400, None) if created is None else (200, created)
+
+    def raw(match: re.Match[str], query: dict[str, str], payload: Any) -> _Handled:
+        return 200, fake.raw(payload)
+
+    def get_raw_result(match: re.Match[str], query: dict[str, str], payload: Any) -> _Handled:
+        result = fake.raw_result(int(match["id"]))
+        return (404, None) if result is None else (200, result)
+
+    def get_spreadjobs(match: re.Match[str], query: dict[str, str], payload: Any) -> _Handled:
+        with fake.lock:
+            fake.advance()
+            return 200, [spreadjob.state() for spreadjob in fake.spreadjobs.values()]
+
+    def get_spreadjob(match: re.Match[str], query: dict[str, str], payload: Any) -> _Handled:
+        spreadjob = fake.find_spreadjob(match["name"])
+        return (404, None) if spreadjob is None else (200, spreadjob.state())
+
+    def abort_spreadjob(match: re.Match[str], query: dict[str, str], payload: Any) -> _Handled:
+        spreadjob = fake.find_spreadjob(match["name"])
+        if spreadjob is None:
+            return 404, None
+        with fake.lock:
+            if spreadjob.running:
+                spreadjob.ended_at = monotonic()
+                spreadjob.aborted = True
+        return 204, None
+
+    def create_spreadjob(match: re.Match[str], query: dict[str, str], payload: Any) -> _Handled:
+        created = fake.create_spreadjob(payload)
+        return (400, None) if created is None else (201, created)
+
+    routes = [
+        ("GET", r"/_stats", "", stats),
+        ("POST", r"/_reset", "", reset),
+        ("GET", r"/sites", "GET /sites", get_sites),
+        ("GET", r"/sites/(?P<name>[^/]+)", "GET /sites/<name>", get_site),
+        ("GET", r"/path", "GET /path", get_path),
+        ("GET", r"/transferjobs", "GET /transferjobs", get_transferjobs),
+        ("POST", r"/transferjobs", "POST /transferjobs", create_transferjob),
+        ("GET", r"/transferjobs/(?P<key>[^/]+)", "GET /transferjobs/<job>", get_transferjob),
+        ("POST", r"/transferjobs/(?P<key>[^/]+)/abort", "POST /transferjobs/<job>/abort", abort_transferjob),
+        ("POST", r"/raw", "POST /raw", raw),
+        ("GET", r"/raw/(?P<id>\d+)", "GET /raw/<id>", get_raw_result),
+        ("GET", r"/spreadjobs", "GET /spreadjobs", get_spreadjobs),
+        ("POST", r"/spreadjobs", "POST /spreadjobs", create_spreadjob),
+        ("GET", r"/spreadjobs/(?P<name>[^/]+)", "GET /spreadjobs/<name>", get_spreadjob),
+        ("POST", r"/spreadjobs/(?P<name>[^/]+)/abort", "POST /spreadjobs/<name>/abort", abort_spreadjob),
+    ]
+    return [(method, re.compile(f"^{path}$"), name, handler) for method, path, name, handler in routes]
+
+
+def make_handler(fake: FakeCBFTP) -> type[BaseHTTPRequestHandler]:
+    routes = _routes(fake)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def _count(self, name: str) -> None:
+            with fake.lock:
+                fake.requests[name] += 1
+
+        def _delay(self) -> bool:
+            """Apply the configured latency. Return whether an error should be injected."""
+            settings = fake.settings
+            delay = settings.latency + (fake.random.random() * settings.jitter if settings.jitter else 0.0)
+            if delay:
+                sleep(delay)
+            return fake.random.random() < settings.failure_rate
+
+        def _send(self, status: int, body: Any = None) -> None:
+            data = b"" if body is None else json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(data)
+
+        def _body(self) -> Any:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length)) if length else None
+
+        def _dispatch(self) -> None:
+            url = urlsplit(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            for method, pattern, name, handler in routes:
+                match = pattern.match(url.path)
+                if method != self.command or match is None:
+                    continue
+                payload = self._body() if method == "POST" else None
+                if name:
+                    self._count(name)
+                    if self._delay():
+                        self._send(500)
+                        return
+                self._send(*handler(match, query, payload))
+                return
+            self._send(404)
+
+        def do_HEAD(self) -> None:
+            self._count("HEAD /")
+            self._delay()
+            self._send(200)
+
+        def do_GET(self) -> None:
+            self._dispatch()
+
+        def do_POST(self) -> None:
+            self._dispatch()
+
+    return Handler
+
+
+def make_server(settings: FakeSettings, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Create the fake cbftp HTTP server. Use port 0 to bind to a random free port."""
+    server = ThreadingHTTPServer((host, port), make_handler(FakeCBFTP(settings)))
+    server.daemon_threads = True
+    return server
+
+
+def add_settings_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay in seconds added to every request.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random delay added on top of --latency.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability of a request failing.")
+    parser.add_argument("--raw-failure-rate", type=float, default=0.0, help="Probability of a site failing a pre.")
+    parser.add_argument("--raw-delay", type=float, default=0.0, help="Delay before the result of a pre, in seconds.")
+    parser.add_argument("--extra-group-dirs", type=int, default=0, help="Additional group dirs on each site.")
+    parser.add_argument("--release-size", type=int, default=100 * 1024**2, help="Size of each release, in bytes.")
+    parser.add_argument("--speed", type=float, default=50 * 1024**2, help="Transfer speed, in bytes/s.")
+    parser.add_argument("--site-bandwidth", type=float, default=None, help="Upload bandwidth of each site.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for failure injection.")
+
+
+def settings_from_args(args: Namespace, sites: list[str], releases: list[str]) -> FakeSettings:
+    return FakeSettings(
+        sites=sites,
+        releases=releases,
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        raw_failure_rate=args.raw_failure_rate,
+        raw_delay=args.raw_delay,
+        extra_group_dirs=args.extra_group_dirs,
+        release_size=args.release_size,
+        speed=args.speed,
+        site_bandwidth=args.site_bandwidth,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Run a fake cbftp REST API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=55477)
+    parser.add_argument("--sites", nargs="+", default=["S1", "S2", "S3"], help="Available site IDs.")
+    parser.add_argument("--releases", nargs="*", default=[], help="Releases present on every site.")
+    add_settings_arguments(parser)
+    args = parser.parse_args()
+
+    server = make_server(settings_from_args(args, args.sites, args.releases), args.host, args.port)
+    print(f"Fake cbftp listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
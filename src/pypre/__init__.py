@@ -1,3 +1,8 @@
+__all__ = ("BatchResult", "Config", "Session", "load_config")
+
 import urllib3
 
+from pypre.config import Config, load_config
+from pypre.session import BatchResult, Session
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -1,13 +1,20 @@
 from __future__ import annotations
 
+from collections.abc import Callable, Sequence
+from json import JSONDecodeError
 from pathlib import PurePosixPath
-from typing import Any, Literal
+from typing import Any, Literal, TypeVar
 from urllib.parse import urlencode, urljoin
 
 import requests
 from requests import ConnectionError, HTTPError
+from requests.exceptions import InvalidJSONError
 
 from pypre.cbftp.exceptions import CommandFailure
+from pypre.utils import jsonlib
+from pypre.utils.profiling import profiler
+
+_T = TypeVar("_T")
 
 
 class CBFTP:
@@ -51,15 +58,23 @@ class CBFTP:
         return True
 
     def _json_request(self, method: str, endpoint: str, **kwargs: Any) -> Any:
-        url = urljoin(self.base_url, endpoint)
-        rq = self._session.request(method, url, **kwargs)
-        rq.raise_for_status()
-        return rq.json()
+        return self._decode(self._raw_request(method, endpoint, **kwargs), jsonlib.loads)
 
-    def _raw_request(self, method: str, endpoint: str, **kwargs: Any) -> None:
+    @staticmethod
+    def _decode(rq: requests.Response, decode: Callable[[bytes], _T]) -> _T:
+        """Decode the body of a response, raising invalid bodies as `requests` does, i.e. as a `RequestException`."""
+        try:
+            return decode(rq.content)
+        except JSONDecodeError as e:
+            raise requests.JSONDecodeError(e.msg, e.doc, e.pos, response=rq) from e
+        except KeyError as e:
+            raise InvalidJSONError(f"Missing {e} field in the response", response=rq) from e
+
+    def _raw_request(self, method: str, endpoint: str, **kwargs: Any) -> requests.Response:
         url = urljoin(self.base_url, endpoint)
         rq = self._session.request(method, url, **kwargs)
         rq.raise_for_status()
+        return rq
 
     def _get(self, endpoint: str, params: dict[str, str] | None = None, **kwargs: Any) -> Any:
         return self._json_request("get", endpoint, params=params, **kwargs)
@@ -67,6 +82,7 @@ class CBFTP:
     def _post(self, endpoint: str, json: dict[str, Any] | None = None, **kwargs: Any) -> Any:
         return self._json_request("post", endpoint, json=json, **kwargs)
 
+    @profiler.timed("cbftp.raw")
     def raw(
         self,
         command: str,
@@ -77,19 +93,24 @@ class CBFTP:
         path: PurePosixPath | str | None = None,
         path_section: str | None = None,
         timeout: int | None = None,
+        *,
+        raise_on_failure: bool = True,
         **kwargs: Any,
     ) -> dict[str, Any]:
         """Send a raw command.
 
         Args:
             command: The command to send.
-            is_async: Whether to wait for the command result.
+            is_async: Don't wait for the command result. The returned data then only contains the
+                `request_id` to pass to `get_raw_result`.
             sites_all: Send to all available sites.
             sites: Send to the specified sites IDs.
             sites_with_sections: Send to sites with these sections defined.
             path: The path to cwd to before running command.
             path_section: The section to cwd to before running command.
             timeout: Max wait time in seconds before failing.
+            raise_on_failure: Raise `CommandFailure` if the command failed on any site. Otherwise, the
+                failures are only returned along with the successes.
 
         Returns:
             Command results from the CBFTP instance.
@@ -108,17 +129,30 @@ class CBFTP:
             "sites_all": sites_all,
             "sites": sites,
             "sites_with_sections": sites_with_sections,
-            "path": str(path),
+            "path": str(path) if path is not None else None,
             "path_section": path_section,
             "timeout": timeout,
         }
         json = {k: v for k, v in json.items() if v is not None}
 
         cmd_data: dict[str, Any] = self._post("/raw", json=json, **kwargs)
-        if cmd_data["failures"]:
+        if raise_on_failure and cmd_data["failures"]:
             raise CommandFailure(command, cmd_data["failures"])
         return cmd_data
 
+    def get_raw_result(self, request_id: int, **kwargs: Any) -> dict[str, Any]:
+        """Get the results of an asynchronous raw command.
+
+        Args:
+            request_id: The request ID returned by `raw` with `is_async`.
+            **kwargs: kwargs to be passed to the CBFTP client.
+
+        Returns:
+            The successes and failures of the sites that answered so far.
+        """
+        cmd_data: dict[str, Any] = self._get(f"/raw/{request_id}", **kwargs)
+        return cmd_data
+
     def get_sites(self, **kwargs: Any) -> list[str]:
         """Get available sites on the CBFTP instance.
 
@@ -131,6 +165,20 @@ class CBFTP:
         sites: list[str] = self._get("/sites", **kwargs)
         return sites
 
+    def get_site(self, site: str, **kwargs: Any) -> dict[str, Any]:
+        """Get data about a site, including its sections as `name` and `path` objects.
+
+        Args:
+            site: The site ID.
+            **kwargs: kwargs to be passed to the CBFTP client.
+
+        Returns:
+            Data for the site.
+        """
+        site_data: dict[str, Any] = self._get(f"/sites/{site}", **kwargs)
+        return site_data
+
+    @profiler.timed("cbftp.list_path")
     def list_path(
         self,
         site: str,
@@ -157,6 +205,47 @@ class CBFTP:
         else:
             return paths
 
+    @profiler.timed("cbftp.list_path")
+    def list_path_fields(
+        self,
+        site: str,
+        path: PurePosixPath | str | None,
+        fields: Sequence[str] = ("name",),
+        type: Literal["FILE", "DIR"] | None = None,
+        **kwargs: Any,
+    ) -> list[tuple[Any, ...]]:
+        """List a directory, only decoding the needed fields of each path.
+
+        Lighter than `list_path` for directories holding many paths.
+
+        Args:
+            site: The site to be used.
+            path: The path to be listed. Can also be a section name.
+            fields: The fields of the path objects to return, e.g. `name` or `size`.
+            type: The type of path to list.
+            **kwargs: kwargs to be passed to the CBFTP client.
+
+        Returns:
+            The values of the fields of each path, in the order of `fields`.
+        """
+        params = {"site": site, "path": str(path)}
+        # We need to explicitly set params as cbftp isn't decoding urlencoded params
+        rq = self._raw_request("get", f"/path?{urlencode(params, safe='/')}", **kwargs)
+        where = {"type": type} if type is not None else None
+        return self._decode(rq, lambda content: jsonlib.load_records(content, fields, where=where))
+
+    def get_transferjobs(self, **kwargs: Any) -> list[dict[str, Any]]:
+        """Get data about all the transferjobs.
+
+        Args:
+            **kwargs: kwargs to be passed to the CBFTP client.
+
+        Returns:
+            Data for each transferjob.
+        """
+        transferjobs: list[dict[str, Any]] = self._get("/transferjobs", **kwargs)
+        return transferjobs
+
     def get_transferjob(self, *, name: str | None = None, id: int | None = None, **kwargs: Any) -> dict[str, Any]:
         """Get data about a transferjob.
 
@@ -192,3 +281,57 @@ class CBFTP:
             self._raw_request("post", f"/transferjobs/{id}/abort", params={"id": "true"}, **kwargs)
         else:
             raise ValueError("Either name or id must be provided.")
+
+    def create_spreadjob(
+        self,
+        *,
+        name: str,
+        section: str,
+        sites: list[str],
+        sites_dlonly: list[str] | None = None,
+        profile: Literal["RACE", "DISTRIBUTE", "PREPARE"] = "RACE",
+        reset: bool = False,
+        **kwargs: Any,
+    ) -> None:
+        """Create a spread job, transferring a release between sites.
+
+        Args:
+            name: The name of the release.
+            section: The CBFTP section the release is located in on each site.
+            sites: The sites the release is spread to. They also serve as sources for each other.
+            sites_dlonly: The sites the release is only downloaded from.
+            profile: The spread job profile.
+            reset: Whether to reset an existing spread job of the same name.
+            **kwargs: kwargs to be passed to the CBFTP client.
+        """
+        payload = {
+            "name": name,
+            "section": section,
+            "sites": sites,
+            "sites_dlonly": sites_dlonly or [],
+            "profile": profile,
+            "reset": reset,
+        }
+        self._raw_request("post", "/spreadjobs", json=payload, **kwargs)
+
+    def get_spreadjob(self, name: str, **kwargs: Any) -> dict[str, Any]:
+        """Get data about a spread job.
+
+        Args:
+            name: The name of the spread job, i.e. the release name.
+            **kwargs: kwargs to be passed to the CBFTP client.
+
+        Returns:
+            Data for the spread job, including the progress of each site.
+        """
+        spreadjob: dict[str, Any] = self._get(f"/spreadjobs/{name}", **kwargs)
+        return spreadjob
+
+    def abort_spreadjob(self, name: str, **kwargs: Any) -> None:
+        """Abort a spread job.
+
+        Args:
+            name: The name of the spread job, i.e. the release name.
+            **kwargs: kwargs to be passed to the CBFTP client.
+        """
+        self._raw_request("post", f"/spreadjobs/{name}/abort", **kwargs)
@@ -1,5 +1,8 @@
-__all__ = ("upload", "fxp", "pre")
+__all__ = ("abort", "fxp", "plan", "pre", "stats", "upload")
 
+from pypre.commands.abort import abort
 from pypre.commands.fxp import fxp
+from pypre.commands.plan import plan
 from pypre.commands.pre import pre
+from pypre.commands.stats import stats
 from pypre.commands.upload import upload
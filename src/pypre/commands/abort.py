@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import fnmatch
+import re
+from typing import Any, cast
+
+import click
+
+from pypre.config import config
+from pypre.manager.manager import ABORT_WORKERS
+from pypre.utils.click import CtxObj
+from pypre.utils.progress import FINISHED_STATUSES
+
+
+@click.command(name="abort", short_help="Abort running transfer jobs.")
+@click.option(
+    "-s",
+    "--site",
+    type=click.Choice(cast("list[str]", config.sites.keys())),
+    multiple=True,
+    help="Only abort the transfer jobs from or to the provided site(s).",
+)
+@click.option(
+    "-r",
+    "--release",
+    multiple=True,
+    help="Only abort the transfer jobs of releases matching the provided pattern(s), case insensitive.",
+)
+@click.option(
+    "--all",
+    "all_",
+    is_flag=True,
+    default=False,
+    help="Abort every running transfer job. Required if neither --site nor --release is provided.",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=ABORT_WORKERS,
+    show_default=True,
+    help="Maximum number of transfer jobs aborted concurrently.",
+)
+@click.pass_context
+def abort(ctx: click.Context, site: tuple[str, ...], release: tuple[str, ...], all_: bool, workers: int) -> None:
+    """Abort the running transfer jobs of the CBFTP server(s), selected by site and/or release name.
+
+    The command exits with an error if any transfer job couldn't be aborted.
+    """
+    ctx_obj: CtxObj = ctx.obj
+
+    if not (site or release or all_):
+        raise click.UsageError("Provide --site, --release or --all.")
+
+    sites = set(site)
+    patterns = [re.compile(fnmatch.translate(pattern), flags=re.I) for pattern in release]
+
+    def selected(transferjob: dict[str, Any]) -> bool:
+        if transferjob.get("status") in FINISHED_STATUSES:
+            return False
+        if sites and not sites.intersection((transferjob.get("src_site"), transferjob.get("dst_site"))):
+            return False
+        return not patterns or any(pattern.match(transferjob.get("name", "")) for pattern in patterns)
+
+    transferjobs = [transferjob for transferjob in ctx_obj.manager.get_transferjobs() if selected(transferjob)]
+    if not transferjobs:
+        click.echo("No running transfer job to abort.")
+        return
+
+    for transferjob in transferjobs:
+        route = f"{transferjob.get('src_site') or 'local'} -> {transferjob.get('dst_site')}"
+        click.echo(f"{transferjob.get('name', '')}  {route}  {transferjob.get('status', '')}")
+    if not ctx_obj.yes and not click.confirm(f"Abort these {len(transferjobs)} transfer jobs?"):
+        return
+
+    failed = ctx_obj.manager.abort_transferjobs((transferjob["id"] for transferjob in transferjobs), workers=workers)
+    click.echo(f"Aborted {len(transferjobs) - len(failed)} transfer jobs, {len(failed)} failed.")
+    if failed:
+        names = {transferjob["id"]: transferjob.get("name", "") for transferjob in transferjobs}
+        for job_id, error in failed.items():
+            click.echo(f"Couldn't abort {names[job_id]} (job {job_id}): {error}", err=True)
+        ctx.exit(1)
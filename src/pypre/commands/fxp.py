@@ -1,18 +1,17 @@
 from __future__ import annotations
 
 import io
-import itertools
 import logging
-from collections.abc import Iterable
 from pathlib import Path
 from typing import cast
 
 import click
-from natsort import natsorted
 
 from pypre.config import config
-from pypre.manager import CBFTPManager
-from pypre.utils.click import CtxObj, GlobPaths
+from pypre.operations import fxp_releases, fxp_releases_spread, fxp_releases_tree
+from pypre.utils.click import CtxObj
+from pypre.utils.profiling import profiler
+from pypre.utils.scan import scan_releases
 
 
 @click.command(name="fxp", short_help="FXP releases to site(s).")
@@ -26,7 +25,6 @@ from pypre.utils.click import CtxObj, GlobPaths
 @click.option(
     "-g",
     "--glob",
-    type=GlobPaths(at_least_one=False, readable_only=False, files_okay=False),
     multiple=True,
     help="Process releases matching the provided pattern(s).",
 )
@@ -35,9 +33,13 @@ from pypre.utils.click import CtxObj, GlobPaths
     "-f",
     "--from",
     "from_",
-    type=click.Choice(cast("list[str]", config.sites.keys())),
+    type=click.Choice([*config.sites.keys(), "auto"]),
     required=True,
-    help="Site to FXP from.",
+    multiple=True,
+    help=(
+        "Site(s) to FXP from. If several sites are provided, the fastest site having the release is used "
+        "for each destination. Use 'auto' to consider all the configured sites."
+    ),
 )
 @click.option(
     "-t",
@@ -54,74 +56,85 @@ from pypre.utils.click import CtxObj, GlobPaths
     help="Wait for FXP transfers to complete before exiting.",
 )
 @click.option("-c", "--check", is_flag=True, help="Check completeness of releases after upload.")
+@click.option(
+    "-d",
+    "--distribution",
+    type=click.Choice(["star", "tree"], case_sensitive=False),
+    default="star",
+    show_default=True,
+    help=(
+        "'star' copies every release from the source site(s) to each destination. 'tree' uses the destinations "
+        "that completed a release as additional sources for the remaining ones. Implies --wait."
+    ),
+)
+@click.option(
+    "--engine",
+    type=click.Choice(["transfer", "spread"], case_sensitive=False),
+    default="transfer",
+    show_default=True,
+    help=(
+        "'transfer' creates one transfer job per release and destination. 'spread' creates one cbftp spread job "
+        "per release covering all the destinations, letting cbftp use the destinations as sources for each other. "
+        "Can't be used with the 'tree' distribution."
+    ),
+)
+@click.option(
+    "--max-outbound",
+    type=click.IntRange(min=1),
+    default=2,
+    show_default=True,
+    help="Maximum number of simultaneous outbound copies per site with the 'tree' distribution.",
+)
 @click.pass_context
 def fxp(
     ctx: click.Context,
+    *,
     releases: tuple[Path, ...],
-    glob: tuple[list[Path], ...],
+    glob: tuple[str, ...],
     file: io.TextIOWrapper | None,
-    from_: str,
+    from_: tuple[str, ...],
     to: tuple[str, ...],
     wait: bool,
     check: bool,
+    distribution: str,
+    engine: str,
+    max_outbound: int,
 ) -> None:
     log = logging.getLogger("pypre.fxp")
 
     ctx_obj: CtxObj = ctx.obj
 
-    if from_ in to:
-        log.critical("Can't FXP to the site the releases were uploaded to.")
-        raise SystemExit()
+    if engine.lower() == "spread" and distribution.lower() == "tree":
+        raise click.UsageError("The 'tree' distribution can't be used with the 'spread' engine.")
 
     to_set = set(to)
 
-    releases_set = set(itertools.chain(releases, *glob))
-
-    if file is not None:
-        file_list = file.read().splitlines()
-        for rel in file_list:
-            if rel.strip():
-                releases_set.add(Path(rel))
-
-    release_names = [release.name for release in filter(None, releases_set)]
-
-    reverse = ctx_obj.sort_order == "DSC"
-    if ctx_obj.psort:
-        release_names.sort(reverse=reverse)
+    if "auto" in from_:
+        sources = [site_key for site_key in config.sites if site_key not in to_set]
     else:
-        release_names = natsorted(release_names, reverse=reverse)
-
-    fxp_releases(ctx_obj.manager, release_names, from_, to_set, wait, check)
-
-
-def fxp_releases(
-    manager: CBFTPManager,
-    releases: Iterable[str],
-    from_: str,
-    to: Iterable[str],
-    wait: bool,
-    check: bool,
-) -> None:
-    log = logging.getLogger("pypre.fxp")
-
-    upload_jobs = []
-    for site in to:
-        for release in releases:
-            log.info("FXP %s from %s to %s...", release, from_, site)
-            transfer_data = manager.fxp(
-                src_site=config.sites[from_],
-                dst_site=config.sites[site],
-                release_name=release,
-            )
-            upload_jobs.append(transfer_data["id"])
-
-    if wait:
-        manager.show_transfer_progress(upload_jobs)
-    if check:
-        for site in to:
-            for release in releases:
-                is_complete = manager.check(release, config.sites[site])
-                if is_complete:
-                    log.info("%s is complete on %s", release, site)
-                else:
-                    log.warning("%s is incomplete on %s", release, site)
+        if not to_set.isdisjoint(from_):
+            log.critical("Can't FXP to the site the releases were uploaded to.")
+            raise SystemExit()
+        sources = list(dict.fromkeys(from_))
+
+    with profiler.phase("plan.releases"):
+        # Only the names are needed, which are much lighter than paths for large batches
+        names = {release.name for release in releases}
+        names.update(release.name for release in scan_releases(glob, readable_only=False))
+        if file is not None:
+            names.update(Path(rel).name for rel in file.read().splitlines() if rel.strip())
+        names.discard("")
+
+        release_names = ctx_obj.sort_releases(names)
+
+    batch = ctx_obj.start_batch("fxp")
+    src_sites = [config.sites[site_key] for site_key in sources]
+    dst_sites = [config.sites[site_key] for site_key in to_set]
+    if engine.lower() == "spread":
+        fxp_releases_spread(ctx_obj.manager, release_names, src_sites, dst_sites, wait=wait, check=check, batch=batch)
+    elif distribution.lower() == "tree":
+        fxp_releases_tree(
+            ctx_obj.manager, release_names, src_sites, dst_sites, max_outbound=max_outbound, check=check, batch=batch
+        )
+    else:
+        fxp_releases(ctx_obj.manager, release_names, src_sites, dst_sites, wait=wait, check=check, batch=batch)
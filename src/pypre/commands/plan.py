@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import io
+import json
+import logging
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+from typing import Any, TypeVar, cast
+
+import click
+
+from pypre.config import config
+from pypre.objects.site import GroupDirIndex, Site
+from pypre.utils.click import CtxObj
+from pypre.utils.profiling import profiler
+from pypre.utils.scan import scan_paths, scan_releases
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+@dataclass
+class PlannedAction:
+    """An action resolved by the `plan` command."""
+
+    action: str
+    release: str
+    site: str
+    path: str | None = None
+    """The group directory the release is sent to."""
+    sources: list[dict[str, str]] = field(default_factory=list)
+    """The source sites and paths, for FXP actions."""
+    section: str | None = None
+    command: str | None = None
+    """The rendered pre command."""
+    error: str | None = None
+
+
+class _GroupDirs:
+    """Group directories lookup, from the local cache or from cbftp."""
+
+    def __init__(self, ctx_obj: CtxObj, refresh: bool) -> None:
+        self.ctx_obj = ctx_obj
+        self.refresh = refresh
+        self._group_dirs: dict[str, GroupDirIndex | None] = {}
+
+    def get(self, site: Site) -> GroupDirIndex:
+        if site.id not in self._group_dirs:
+            if self.refresh:
+                self._group_dirs[site.id] = GroupDirIndex(self.ctx_obj.manager.get_site_group_dirs(site))
+            else:
+                cached = self.ctx_obj.group_dirs.get(site.id)
+                if cached is not None:
+                    logging.getLogger("pypre.plan").debug(
+                        "Using the group directories of %s listed at %s", site.id, datetime.fromtimestamp(cached[1])
+                    )
+                self._group_dirs[site.id] = GroupDirIndex(cached[0]) if cached is not None else None
+
+        group_dirs = self._group_dirs[site.id]
+        if group_dirs is None:
+            raise ValueError(f"The group directories of {site.id} are not cached, use --refresh to list them.")
+        return group_dirs
+
+
+def _plan_options(func: F) -> F:
+    options = [
+        click.option(
+            "-r",
+            "--releases",
+            type=click.Path(exists=False, file_okay=False, path_type=Path),
+            multiple=True,
+            help="Releases to be processed, relative to the working directory.",
+        ),
+        click.option("-g", "--glob", multiple=True, help="Process releases matching the provided pattern(s)."),
+        click.option("--file", type=click.File(), help="Process releases from a file list."),
+        click.option(
+            "--format",
+            "format_",
+            type=click.Choice(["table", "json"], case_sensitive=False),
+            default="table",
+            show_default=True,
+            help="Output format of the plan.",
+        ),
+        click.option(
+            "--refresh",
+            is_flag=True,
+            default=False,
+            help="List the group directories on cbftp instead of using the ones cached by previous commands.",
+        ),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+@click.group(name="plan", short_help="Show the actions of a command, without running it.")
+def plan() -> None:
+    """Resolve the actions of the upload, fxp or pre commands, without submitting anything.
+
+    Group directories are resolved using the ones listed on each site by previous commands,
+    unless --refresh is provided. The command exits with an error if any action couldn't be resolved.
+    """
+
+
+@plan.command(name="upload", short_help="Plan the upload of releases.")
+@_plan_options
+@click.option(
+    "-s",
+    "--site",
+    type=click.Choice(cast("list[str]", config.sites.keys())),
+    required=True,
+    multiple=True,
+    help="Site(s) to upload to.",
+)
+@click.pass_context
+def plan_upload(
+    ctx: click.Context,
+    *,
+    releases: tuple[Path, ...],
+    glob: tuple[str, ...],
+    file: io.TextIOWrapper | None,
+    format_: str,
+    refresh: bool,
+    site: tuple[str, ...],
+) -> None:
+    ctx_obj: CtxObj = ctx.obj
+    started = perf_counter()
+    group_dirs = _GroupDirs(ctx_obj, refresh)
+    release_names = _release_names(ctx_obj, releases, glob, file, local=True)
+
+    actions = []
+    for site_key in dict.fromkeys(site):
+        for release in release_names:
+            actions.append(
+                _resolve_path(PlannedAction("upload", release, site_key), config.sites[site_key], group_dirs)
+            )
+    _output(ctx, actions, perf_counter() - started, format_)
+
+
+@plan.command(name="fxp", short_help="Plan the FXP of releases.")
+@_plan_options
+@click.option(
+    "-f",
+    "--from",
+    "from_",
+    type=click.Choice([*config.sites.keys(), "auto"]),
+    required=True,
+    multiple=True,
+    help="Site(s) to FXP from. Use 'auto' to consider all the configured sites.",
+)
+@click.option(
+    "-t",
+    "--to",
+    type=click.Choice(cast("list[str]", config.sites.keys())),
+    required=True,
+    multiple=True,
+    help="Site(s) to FXP to.",
+)
+@click.pass_context
+def plan_fxp(
+    ctx: click.Context,
+    *,
+    releases: tuple[Path, ...],
+    glob: tuple[str, ...],
+    file: io.TextIOWrapper | None,
+    format_: str,
+    refresh: bool,
+    from_: tuple[str, ...],
+    to: tuple[str, ...],
+) -> None:
+    ctx_obj: CtxObj = ctx.obj
+    started = perf_counter()
+    group_dirs = _GroupDirs(ctx_obj, refresh)
+    release_names = _release_names(ctx_obj, releases, glob, file, local=False)
+
+    to_sites = list(dict.fromkeys(to))
+    if "auto" in from_:
+        sources = [site_key for site_key in config.sites if site_key not in to_sites]
+    else:
+        sources = list(dict.fromkeys(from_))
+
+    actions = []
+    for site_key in to_sites:
+        for release in release_names:
+            action = _resolve_path(PlannedAction("fxp", release, site_key), config.sites[site_key], group_dirs)
+            source_errors = []
+            for src_key in sources:
+                try:
+                    src_path = config.sites[src_key].get_dst_path(release, group_dirs.get(config.sites[src_key]))
+                except ValueError as e:
+                    source_errors.append(f"{src_key}: {e}")
+                else:
+                    action.sources.append({"site": src_key, "path": str(src_path)})
+            if not action.sources and action.error is None:
+                action.error = "No usable source site. " + " ".join(source_errors)
+            actions.append(action)
+    _output(ctx, actions, perf_counter() - started, format_)
+
+
+@plan.command(name="pre", short_help="Plan the pre of releases.")
+@_plan_options
+@click.option(
+    "-s",
+    "--site",
+    type=click.Choice(cast("list[str]", config.sites.keys())),
+    required=True,
+    multiple=True,
+    help="Site(s) to pre.",
+)
+@click.pass_context
+def plan_pre(
+    ctx: click.Context,
+    *,
+    releases: tuple[Path, ...],
+    glob: tuple[str, ...],
+    file: io.TextIOWrapper | None,
+    format_: str,
+    refresh: bool,
+    site: tuple[str, ...],
+) -> None:
+    ctx_obj: CtxObj = ctx.obj
+    started = perf_counter()
+    group_dirs = _GroupDirs(ctx_obj, refresh)
+    release_names = _release_names(ctx_obj, releases, glob, file, local=False)
+
+    actions = []
+    for release in release_names:
+        for site_key in dict.fromkeys(site):
+            pre_site = config.sites[site_key]
+            action = _resolve_path(PlannedAction("pre", release, site_key), pre_site, group_dirs)
+            try:
+                action.section = pre_site.get_section(release, config.sections)
+                action.command = pre_site.get_pre_command(release, config.sections)
+            except ValueError as e:
+                action.error = action.error or str(e)
+            actions.append(action)
+    _output(ctx, actions, perf_counter() - started, format_)
+
+
+def _release_names(
+    ctx_obj: CtxObj,
+    releases: tuple[Path, ...],
+    glob: tuple[str, ...],
+    file: io.TextIOWrapper | None,
+    local: bool,
+) -> list[str]:
+    log = logging.getLogger("pypre.plan")
+
+    with profiler.phase("plan.releases"):
+        names = {release.name for release in releases}
+        names.update(release.name for release in scan_releases(glob, readable_only=local))
+
+        if file is not None:
+            file_list = [rel for rel in file.read().splitlines() if rel.strip()]
+            if local:
+                file_releases, missing = scan_paths(file_list)
+                for rel in missing:
+                    log.warning("%s does not exist or is not a directory, and will be skipped.", rel)
+                names.update(release.name for release in file_releases)
+            else:
+                names.update(Path(rel).name for rel in file_list)
+        names.discard("")
+
+        return ctx_obj.sort_releases(names)
+
+
+def _resolve_path(action: PlannedAction, site: Site, group_dirs: _GroupDirs) -> PlannedAction:
+    with profiler.phase("plan.dst_path"):
+        try:
+            action.path = str(site.get_dst_path(action.release, group_dirs.get(site)))
+        except ValueError as e:
+            action.error = str(e)
+    return action
+
+
+def _output(ctx: click.Context, actions: list[PlannedAction], duration: float, format_: str) -> None:
+    errors = sum(action.error is not None for action in actions)
+    if format_.lower() == "json":
+        click.echo(
+            json.dumps(
+                {
+                    "actions": [asdict(action) for action in actions],
+                    "errors": errors,
+                    "planning_ms": round(duration * 1000, 3),
+                },
+                indent=2,
+            )
+        )
+    else:
+        rows = [("Action", "Release", "Site", "Path", "Details")]
+        for action in actions:
+            if action.error is not None:
+                details = f"ERROR: {action.error}"
+            elif action.command is not None:
+                details = action.command
+            elif action.sources:
+                details = "from " + ", ".join(source["site"] for source in action.sources)
+            else:
+                details = ""
+            rows.append((action.action, action.release, action.site, action.path or "-", details))
+        widths = [max(len(row[column]) for row in rows) for column in range(4)]
+        for row in rows:
+            click.echo("  ".join(value.ljust(width) for value, width in zip(row, widths)) + "  " + row[4])
+        click.echo(f"Planned {len(actions)} actions ({errors} errors) in {duration * 1000:.1f} ms", err=True)
+
+    if errors:
+        ctx.exit(1)
@@ -1,18 +1,18 @@
 from __future__ import annotations
 
 import io
-import itertools
 import logging
 from pathlib import Path
-from time import sleep
 from typing import cast
 
 import click
-from natsort import natsorted
 
 from pypre.config import config
-from pypre.manager import CBFTPManager
-from pypre.utils.click import CtxObj, GlobPaths
+from pypre.operations import pre_releases
+from pypre.operations.pre import PRE_RETRIES
+from pypre.utils.click import CtxObj, Timestamp
+from pypre.utils.profiling import profiler
+from pypre.utils.scan import scan_releases
 
 
 @click.command(name="pre", short_help="Pre releases to site(s).")
@@ -26,7 +26,6 @@ from pypre.utils.click import CtxObj, GlobPaths
 @click.option(
     "-g",
     "--glob",
-    type=GlobPaths(at_least_one=False, readable_only=False, files_okay=False),
     multiple=True,
     help="Process releases matching the provided pattern(s).",
 )
@@ -47,45 +46,83 @@ from pypre.utils.click import CtxObj, GlobPaths
     show_default=True,
     help="Cooldown between each pre.",
 )
+@click.option(
+    "--at",
+    type=Timestamp(),
+    help="Time of the first pre, as a UNIX timestamp, an ISO 8601 date and time or a time of day (HH:MM[:SS]).",
+)
+@click.option(
+    "--fixed-rate",
+    is_flag=True,
+    default=False,
+    help="Start each pre --cooldown seconds after the previous one started, instead of after it finished.",
+)
+@click.option(
+    "--async",
+    "async_",
+    is_flag=True,
+    default=False,
+    help=(
+        "Don't wait for the sites to answer a pre before sending the next one. The results are collected "
+        "in the background."
+    ),
+)
+@click.option(
+    "--retries",
+    type=click.IntRange(min=0),
+    default=PRE_RETRIES,
+    show_default=True,
+    help=(
+        "Number of times a pre is retried on the sites it failed on, with an exponential backoff, while the next "
+        "releases are pred."
+    ),
+)
 @click.pass_context
 def pre(
     ctx: click.Context,
+    *,
     releases: tuple[Path, ...],
-    glob: tuple[list[Path], ...],
+    glob: tuple[str, ...],
     file: io.TextIOWrapper | None,
     site: tuple[str, ...],
     cooldown: float,
+    at: float | None,
+    fixed_rate: bool,
+    async_: bool,
+    retries: int,
 ) -> None:
-    sites = set(site)
-
-    ctx_obj: CtxObj = ctx.obj
-
-    releases_set = set(itertools.chain(releases, *glob))
+    """Pre releases to site(s).
 
-    if file is not None:
-        file_list = file.read().splitlines()
-        for rel in file_list:
-            if rel.strip():
-                releases_set.add(Path(rel))
-
-    release_names = [release.name for release in filter(None, releases_set)]
-
-    reverse = ctx_obj.sort_order == "DSC"
-    if ctx_obj.psort:
-        release_names.sort(reverse=reverse)
-    else:
-        release_names = natsorted(release_names, reverse=reverse)
-
-    pre_releases(ctx_obj.manager, release_names, sites, cooldown)
+    Commands and paths are resolved for every release before the first pre. With --at, the first pre is
+    sent at the provided time, with the connections to CBFTP warmed up just before.
 
+    The command exits with an error if any pre failed after all the retries.
+    """
+    ctx_obj: CtxObj = ctx.obj
 
-def pre_releases(manager: CBFTPManager, releases: list[str], sites_keys: set[str], cooldown: float) -> None:
-    log = logging.getLogger("pypre.pre")
+    with profiler.phase("plan.releases"):
+        names = {release.name for release in releases}
+        names.update(release.name for release in scan_releases(glob, readable_only=False))
+        if file is not None:
+            names.update(Path(rel).name for rel in file.read().splitlines() if rel.strip())
+        names.discard("")
 
-    sites = [config.sites[site] for site in sites_keys]
+        release_names = ctx_obj.sort_releases(names)
 
-    for release_name in releases:
-        log.info("Preing %s...", release_name)
-        manager.pre(release_name, sites)
-        if release_name != releases[-1]:
-            sleep(cooldown)
+    try:
+        failures = pre_releases(
+            ctx_obj.manager,
+            release_names,
+            [config.sites[site_key] for site_key in dict.fromkeys(site)],
+            cooldown,
+            batch=ctx_obj.start_batch("pre"),
+            at=at,
+            fixed_rate=fixed_rate,
+            async_=async_,
+            retries=retries,
+        )
+    except ValueError as e:
+        logging.getLogger("pypre.pre").critical("%s", e)
+        ctx.exit(1)
+    if failures:
+        ctx.exit(1)
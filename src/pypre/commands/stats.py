@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from time import time
+
+import click
+
+from pypre.utils.click import CtxObj
+from pypre.utils.units import format_size
+
+
+@click.command(name="stats", short_help="Show transfer statistics per route.")
+@click.option(
+    "-s",
+    "--site",
+    multiple=True,
+    help="Only show routes from or to the provided site(s).",
+)
+@click.option(
+    "-d",
+    "--days",
+    type=click.FloatRange(min=0.0, min_open=True),
+    default=None,
+    help="Only use transfers finished in the last N days.",
+)
+@click.pass_context
+def stats(ctx: click.Context, site: tuple[str, ...], days: float | None) -> None:
+    ctx_obj: CtxObj = ctx.obj
+
+    since = time() - days * 86400 if days is not None else None
+    route_stats = ctx_obj.history.route_stats(since=since, sites=set(site) or None)
+    if not route_stats:
+        click.echo("No transfers recorded.")
+        return
+
+    click.echo(
+        f"{'Source':<12} {'Destination':<12} {'Jobs':>6} {'Failed':>7} {'Transferred':>12} "
+        f"{'Median speed':>13} {'P90 speed':>11}"
+    )
+    for route in route_stats:
+        click.echo(
+            f"{route.src_site:<12} {route.dst_site:<12} {route.transfers:>6} {route.failure_rate:>7.1%} "
+            f"{format_size(route.total_bytes):>12} {_format_speed(route.median_speed):>13} "
+            f"{_format_speed(route.p90_speed):>11}"
+        )
+
+
+def _format_speed(speed: float | None) -> str:
+    return "-" if speed is None else f"{format_size(speed)}/s"
@@ -1,16 +1,17 @@
 from __future__ import annotations
 
 import io
-import itertools
 import logging
 from pathlib import Path
 from typing import cast
 
 import click
-from natsort import natsorted
 
 from pypre.config import config
-from pypre.utils.click import CtxObj, GlobPaths
+from pypre.operations import upload_releases
+from pypre.utils.click import CtxObj
+from pypre.utils.profiling import profiler
+from pypre.utils.scan import LocalRelease, scan_paths, scan_releases
 
 
 @click.command(name="upload", short_help="Upload releases to site(s).")
@@ -24,7 +25,6 @@ from pypre.utils.click import CtxObj, GlobPaths
 @click.option(
     "-g",
     "--glob",
-    type=GlobPaths(at_least_one=False, readable_only=True, files_okay=False, resolve=True),
     multiple=True,
     help="Process releases matching the provided pattern(s).",
 )
@@ -50,7 +50,7 @@ from pypre.utils.click import CtxObj, GlobPaths
 def upload(
     ctx: click.Context,
     releases: tuple[Path, ...],
-    glob: tuple[list[Path], ...],
+    glob: tuple[str, ...],
     file: io.TextIOWrapper | None,
     site: tuple[str, ...],
     wait: bool,
@@ -77,42 +77,38 @@ def upload(
         )
         raise SystemExit()
 
-    releases_set = set(itertools.chain(releases, *glob))
+    with profiler.phase("plan.releases"):
+        releases_set = set(releases)
+        releases_set.update(release.path for release in scan_releases(glob))
 
-    if file is not None:
-        file_list = file.read().splitlines()
-        for rel in file_list:
-            p = Path(rel)
-            if p.exists() and p.is_dir():
-                releases_set.add(p.resolve())
-            else:
+        if file is not None:
+            file_releases, missing = scan_paths(rel for rel in file.read().splitlines() if rel.strip())
+            for rel in missing:
                 log.warning("%s does not exist or is not a directory, and will be skipped.", rel)
+            releases_set.update(release.path for release in file_releases)
 
-    releases_list = list(filter(None, releases_set))
-
-    reverse = ctx_obj.sort_order == "DSC"
-    if ctx_obj.psort:
-        releases_list.sort(reverse=reverse)
-    else:
-        releases_list = natsorted(releases_list, reverse=reverse)
+        releases_list = ctx_obj.sort_releases(filter(None, releases_set))
 
     if not releases_list:
         log.info("No releases provided. Exiting.")
         raise SystemExit()
 
-    upload_jobs = []
-    for site_key in sites:
-        for release in releases_list:
-            log.info("Uploading %s to %s...", release, site_key)
-            up_data = manager.upload(
-                site=config.sites[site_key],
-                release_name=release.name,
-                src_path=str(release.parent),
-            )
-            upload_jobs.append(up_data["id"])
+    local_releases: dict[Path, LocalRelease] = {}
+    if wait:
+        with profiler.phase("plan.sizes"):
+            local_releases = ctx_obj.sizes.get(releases_list)
+
+    upload_jobs = upload_releases(
+        manager, releases_list, [config.sites[site_key] for site_key in sites], batch=ctx_obj.start_batch("upload")
+    )
+    totals = {
+        job_id: size
+        for job_id, release in upload_jobs.items()
+        if release in local_releases and (size := local_releases[release].size)
+    }
 
     if wait:
-        manager.show_transfer_progress(upload_jobs)
+        manager.show_transfer_progress(list(upload_jobs), totals)
     if check:
         for site_key in sites:
             for release in releases_list:
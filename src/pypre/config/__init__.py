@@ -5,7 +5,8 @@ import os
 import re
 from getpass import getpass
 from pathlib import Path
-from typing import Annotated, Any
+from time import perf_counter
+from typing import TYPE_CHECKING, Annotated, Any
 
 from typing_extensions import Self
 
@@ -22,11 +23,20 @@ except ModuleNotFoundError:
     has_crypto = False
 
 from dotenv import find_dotenv, load_dotenv
-
-from pydantic import AnyHttpUrl, BaseModel, BeforeValidator, ValidationError, model_validator, field_serializer
+from pydantic import (
+    AfterValidator,
+    AnyHttpUrl,
+    BaseModel,
+    BeforeValidator,
+    ValidationError,
+    field_serializer,
+    model_validator,
+)
 from pydantic_settings import BaseSettings, PydanticBaseSettingsSource, SettingsConfigDict, TomlConfigSettingsSource
 
+from pypre.cbftp import CBFTP
 from pypre.objects.site import Site
+from pypre.utils.profiling import profiler
 
 load_dotenv(dotenv_path=find_dotenv(usecwd=True))
 
@@ -52,6 +62,7 @@ class EncryptedTomlConfigSettingsSource(TomlConfigSettingsSource):
             cfg_file.seek(0)
             encrypted_data = cfg_file.read()
             key_str = os.environ.get("PYPRE_CONFIG_KEY") or getpass("Enter AES passphrase: ")
+            decrypt_start = perf_counter()
             try:
                 decrypted_config = decrypt_config(key_str, encrypted_data)
             except InvalidToken:
@@ -62,6 +73,7 @@ class EncryptedTomlConfigSettingsSource(TomlConfigSettingsSource):
                         break
                     except InvalidToken:
                         pass
+            profiler.record("config.decrypt", perf_counter() - decrypt_start)
 
             return tomllib.loads(decrypted_config.decode())
 
@@ -86,12 +98,21 @@ def regex_i_flag(value: Any) -> tuple[str, re.Pattern[str]]:
 SectionTuple = Annotated[tuple[str, re.Pattern[str]], BeforeValidator(regex_i_flag)]
 
 
+def default_data_dir() -> Path:
+    return Path(os.environ.get("XDG_DATA_HOME") or Path.home() / ".local" / "share") / "pypre"
+
+
+ExpandedPath = Annotated[Path, AfterValidator(lambda path: path.expanduser())]
+
+
 class Config(BaseSettings):
     sections: list[SectionTuple]
     sites: dict[str, Site]
     cbftp: dict[str, Cbftp]
     proxies: dict[str, str] = {}
     arguments: dict[str, str] = {}
+    data_dir: ExpandedPath = default_data_dir()
+    log_queue: bool = False
     logging: dict[str, Any]
 
     @model_validator(mode="after")
@@ -122,11 +143,55 @@ class Config(BaseSettings):
         dotenv_settings: PydanticBaseSettingsSource,
         file_secret_settings: PydanticBaseSettingsSource,
     ) -> tuple[PydanticBaseSettingsSource, ...]:
-        return (EncryptedTomlConfigSettingsSource(settings_cls),)
-
-
-try:
-    config = Config()  # type: ignore[call-arg]
-except ValidationError as e:
-    logging.exception("An error has occured when validating config", exc_info=e)
-    raise SystemExit()
+        return (init_settings, EncryptedTomlConfigSettingsSource(settings_cls))
+
+    def cbftp_client(self, name: str) -> CBFTP:
+        """Create the client of a configured CBFTP instance.
+
+        Args:
+            name: The name of the CBFTP instance.
+        """
+        cbftp_cfg = self.cbftp[name]
+        return CBFTP(
+            name=name,
+            proxy=self.proxies.get(cbftp_cfg.proxy) if cbftp_cfg.proxy is not None else None,
+            **cbftp_cfg.model_dump(exclude={"proxy"}),
+        )
+
+
+def load_config(path: Path | str | None = None) -> Config:
+    """Load and validate a configuration file, decrypting it if needed.
+
+    Args:
+        path: The path of the configuration file. If not provided, the `PYPRE_CONFIG` environment variable
+            is used, or `config.toml` in the working directory. Keyword arguments given to `Config` directly
+            are merged over the file instead.
+
+    Raises:
+        ValidationError: The configuration is invalid.
+    """
+    load_start = perf_counter()
+    if path is None:
+        loaded = Config()  # type: ignore[call-arg]
+    else:
+        loaded = Config.model_validate(EncryptedTomlConfigSettingsSource(Config, toml_file=Path(path))())
+    profiler.record("config.load", perf_counter() - load_start)
+    return loaded
+
+
+if TYPE_CHECKING:
+    config: Config
+
+
+def __getattr__(name: str) -> Any:
+    # The global configuration of the command line is only loaded on first access, so that programs
+    # using pypre as a library can import it with their own configuration.
+    if name == "config":
+        try:
+            config = load_config()
+        except ValidationError as e:
+            logging.exception("An error has occured when validating config", exc_info=e)
+            raise SystemExit()
+        globals()["config"] = config
+        return config
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,16 +1,23 @@
-import logging.config
+from __future__ import annotations
+
+import functools
 from importlib.metadata import version
-from typing import cast
+from pathlib import Path
 
 import click
 
-from pypre.cbftp import CBFTP
-from pypre.commands import fxp, pre, upload
+from pypre.commands import abort, fxp, plan, pre, stats, upload
 from pypre.config import config
-from pypre.manager import CBFTPManager
-from pypre.utils.click import CtxObj
+from pypre.manager import CBFTPManager, ShardedCBFTPManager
+from pypre.manager.manager import BARS_MAX_JOBS
+from pypre.manager.probe import select_cbftp
+from pypre.storage import GroupDirCache, JobJournal, ProbeCache, ReleaseSizeIndex, TransferHistory
+from pypre.utils.click import CBFTPNames, CtxObj
+from pypre.utils.events import events as event_stream
+from pypre.utils.logging import configure_logging
+from pypre.utils.profiling import profiler
 
-logging.config.dictConfig(config.logging)
+configure_logging(config.logging, use_queue=config.log_queue)
 
 
 @click.group(context_settings={"default_map": config.arguments})
@@ -37,43 +44,134 @@ logging.config.dictConfig(config.logging)
     default=False,
     help="Use Python sort method. By default, the natsorted method is used.",
 )
+@click.option(
+    "--resume",
+    is_flag=True,
+    default=False,
+    help=(
+        "Resume the last batch of the command: skip the actions already done, and wait for the transfer jobs "
+        "still running instead of submitting them again."
+    ),
+)
 @click.option(
     "--cbftp",
-    type=click.Choice(cast(list[str], config.cbftp.keys())),
-    help="Cbftp server to use.",
+    type=CBFTPNames(config.cbftp.keys()),
+    help=(
+        "Cbftp server to use. Several comma-separated servers, or 'all', can be provided to spread the "
+        "operations across them. 'auto' probes every server, and uses the reachable one with the fewest running "
+        "transfer jobs."
+    ),
     required=True,
 )
+@click.option(
+    "--progress",
+    type=click.Choice(["auto", "bars", "dashboard", "none"], case_sensitive=False),
+    default="auto",
+    show_default=True,
+    help=(
+        "How to display transfer progress. 'bars' displays one progress bar per job, 'dashboard' an aggregated "
+        f"view. 'auto' uses bars for up to {BARS_MAX_JOBS} jobs on a terminal, and the dashboard otherwise. "
+        "'none' doesn't display anything."
+    ),
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Print a breakdown of the time spent in each phase once the command completes.",
+)
+@click.option(
+    "--profile-output",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    default=None,
+    help="Run cProfile over the command and write the raw profile to this file. Implies --profile.",
+)
+@click.option(
+    "--events",
+    type=click.Choice(["ndjson"], case_sensitive=False),
+    default=None,
+    help=(
+        "Write one JSON event per line for each state change (submitted jobs, progress samples, completions, "
+        "checks, pres sent and acknowledged), for programs wrapping pypre."
+    ),
+)
+@click.option(
+    "--events-output",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    default=None,
+    help="Write the events to this file or FIFO instead of the standard output.",
+)
 @click.pass_context
 def main(
     ctx: click.Context,
+    *,
     debug: bool,
     yes: bool,
     sort: str,
     psort: bool,
-    cbftp: str,
+    resume: bool,
+    cbftp: list[str],
+    progress: str,
+    profile: bool,
+    profile_output: Path | None,
+    events: str | None,
+    events_output: Path | None,
 ) -> None:
-    cbftp_cfg = config.cbftp[cbftp]
+    if profile or profile_output is not None:
+        profiler.start(cprofile=profile_output is not None)
+        ctx.call_on_close(functools.partial(_print_profile, profile_output))
 
-    manager = CBFTPManager(
-        cbftp=CBFTP(
-            name=cbftp,
-            proxy=config.proxies.get(cbftp_cfg.proxy) if cbftp_cfg.proxy is not None else None,
-            **cbftp_cfg.model_dump(exclude={"proxy"}),
-        ),
-    )
+    if events is not None:
+        event_stream.start(events_output)
+        ctx.call_on_close(event_stream.stop)
+
+    history = TransferHistory(config.data_dir / "history.sqlite3")
+    group_dirs = GroupDirCache(config.data_dir / "group_dirs.json")
+
+    def manager_factory() -> CBFTPManager:
+        if cbftp == [CBFTPNames.AUTO]:
+            probe_cache = ProbeCache(config.data_dir / "probes.json")
+            clients = [select_cbftp([config.cbftp_client(name) for name in config.cbftp], probe_cache)]
+        else:
+            clients = [config.cbftp_client(name) for name in cbftp]
+        kwargs = {
+            "history": history,
+            "group_dirs": group_dirs,
+            "progress": progress.lower(),
+            "sections": config.sections,
+        }
+        if len(clients) == 1:
+            # A server selected among the probed ones was just checked to be online
+            return CBFTPManager(cbftp=clients[0], check_online=cbftp != [CBFTPNames.AUTO], **kwargs)  # type: ignore[arg-type]
+        return ShardedCBFTPManager(cbftps=clients, **kwargs)  # type: ignore[arg-type]
 
     ctx.obj = CtxObj(
         debug=debug,
         yes=yes,
         sort_order=sort.upper(),  # type: ignore[arg-type]
         psort=psort,
-        manager=manager,
+        resume=resume,
+        history=history,
+        sizes=ReleaseSizeIndex(config.data_dir / "sizes.sqlite3"),
+        journal=JobJournal(config.data_dir / "journal.sqlite3"),
+        group_dirs=group_dirs,
+        manager_factory=manager_factory,
     )
 
 
+def _print_profile(profile_output: Path | None) -> None:
+    profiler.stop(profile_output)
+    click.echo(profiler.report(), err=True)
+    if profile_output is not None:
+        click.echo(f"Raw profile written to {profile_output}", err=True)
+
+
 main.add_command(upload)
 main.add_command(fxp)
 main.add_command(pre)
+main.add_command(stats)
+main.add_command(plan)
+main.add_command(abort)
 
 if __name__ == "__main__":
     main()
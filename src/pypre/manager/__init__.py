@@ -1,3 +1,13 @@
-__all__ = ("CBFTPManager",)
+__all__ = (
+    "CBFTPManager",
+    "PendingPre",
+    "PreResult",
+    "PreparedPre",
+    "ShardedCBFTPManager",
+    "SpreadJob",
+    "TreeDistribution",
+)
 
-from pypre.manager.manager import CBFTPManager
+from pypre.manager.distribution import TreeDistribution
+from pypre.manager.manager import CBFTPManager, PendingPre, PreparedPre, PreResult, SpreadJob
+from pypre.manager.sharded import ShardedCBFTPManager
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from time import monotonic, sleep
+
+import click
+from requests import HTTPError
+
+from pypre.manager.manager import CBFTPManager, emit_job_progress
+from pypre.objects.site import Site
+from pypre.utils.profiling import profiler
+from pypre.utils.progress import FINISHED_STATUSES, JobState
+
+
+@dataclass
+class _Copy:
+    release: str
+    src_site_id: str
+    dst_site: Site
+    started: float = field(default_factory=monotonic)
+
+
+class TreeDistribution:
+    """Distribute releases to several sites, using sites that completed a release as additional sources.
+
+    Each time a destination completes a release, it becomes a source for the remaining destinations,
+    so that the distribution forms a tree instead of being capped by the upload bandwidth of the
+    initial source(s). When several sources are available for a copy, the one holding the fewest
+    releases still needed elsewhere is preferred, then the fastest one.
+
+    Args:
+        manager: The manager used to submit and monitor transfer jobs.
+        src_sites: The sites the releases are initially available on.
+        dst_sites: The sites to distribute the releases to.
+        max_outbound: The default maximum number of simultaneous outbound copies per site. Can be
+            overridden per site using the `max_outbound` site setting.
+        max_attempts: The maximum number of attempts to copy a release to a site.
+        poll_interval: Delay in seconds between each transfer jobs status poll.
+        retry_delay: Delay in seconds before a failed copy is attempted again, doubled after each attempt.
+    """
+
+    def __init__(
+        self,
+        manager: CBFTPManager,
+        src_sites: list[Site],
+        dst_sites: list[Site],
+        *,
+        max_outbound: int = 2,
+        max_attempts: int = 2,
+        poll_interval: float = 2.0,
+        retry_delay: float = 5.0,
+    ) -> None:
+        self.manager = manager
+        self.src_sites = src_sites
+        self.dst_sites = dst_sites
+        self.max_outbound = max_outbound
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.log = logging.getLogger("pypre.distribution")
+
+        self._holders: dict[str, list[Site]] = {}
+        self._pending: dict[str, list[Site]] = {}
+        self._running: dict[int, _Copy] = {}
+        self._completed: dict[str, list[Site]] = {}
+        self._outbound: Counter[str] = Counter()
+        self._attempts: Counter[tuple[str, str]] = Counter()
+        self._retry_at: dict[tuple[str, str], float] = {}
+        self._states: dict[int, JobState] = {}
+
+    def _outbound_limit(self, site: Site) -> int:
+        return site.max_outbound if site.max_outbound is not None else self.max_outbound
+
+    def completed(self, release: str, site: Site) -> None:
+        """Mark a release as already copied to a destination site, e.g. during a previous run.
+
+        The site is used as an additional source, and the release is not copied to it again.
+        """
+        self._completed.setdefault(release, []).append(site)
+
+    def attach(self, job_id: int, release: str, src_site_id: str, dst_site: Site) -> None:
+        """Wait for a running copy that was not submitted by this distribution, e.g. during a previous run.
+
+        Args:
+            job_id: The ID of the transfer job, as used by the manager.
+            release: The release name being copied.
+            src_site_id: The ID of the site the release is copied from, which may not be one of the sites of
+                the distribution.
+            dst_site: The site the release is copied to.
+        """
+        self._running[job_id] = _Copy(release, src_site_id, dst_site)
+        self._outbound[src_site_id] += 1
+        self._attempts[(release, dst_site.id)] += 1
+
+    @profiler.timed("wait.distribution")
+    def run(self, releases: list[str]) -> dict[str, list[Site]]:
+        """Distribute the releases, and wait for all the copies to finish, displaying their progress.
+
+        Args:
+            releases: The release names to distribute.
+
+        Returns:
+            A mapping of each release to the destination sites it could not be copied to.
+        """
+        available = self.manager.verify_sources(releases, self.src_sites)
+        failed: dict[str, list[Site]] = {release: [] for release in releases}
+        for release in releases:
+            holders = available[release]
+            completed = self._completed.get(release, [])
+            holders.extend(site for site in completed if site not in holders)
+            running = {copy.dst_site.id for copy in self._running.values() if copy.release == release}
+            pending = [site for site in self.dst_sites if site not in completed and site.id not in running]
+            self._holders[release] = holders
+            if holders:
+                self._pending[release] = pending
+            else:
+                # The destinations already done or being copied to aren't reported as failed
+                self.log.error("%s is missing on all the source sites.", release)
+                self._pending[release] = []
+                failed[release] = pending
+
+        display = self.manager._transfer_display(len(self._running) + sum(map(len, self._pending.values())))
+        try:
+            while True:
+                self._schedule(failed)
+                if not self._running:
+                    if any(self._pending.values()):  # Failed copies to be retried
+                        sleep(max(self._next_retry() - monotonic(), 0.0))
+                        continue
+                    break
+                sleep(self.poll_interval)
+                self._poll(failed)
+                display.update(self._states)
+        except KeyboardInterrupt:
+            display.close()
+            if click.confirm("Do you want to abort all running transfer jobs?"):
+                self.manager.abort_transferjobs(self._running)
+            raise
+        display.close()
+
+        return {release: sites for release, sites in failed.items() if sites}
+
+    def _schedule(self, failed: dict[str, list[Site]]) -> None:
+        demand: Counter[str] = Counter(
+            site.id for release, pending in self._pending.items() if pending for site in self._holders[release]
+        )
+        now = monotonic()
+        for release, pending in self._pending.items():
+            for dst_site in list(pending):
+                if self._retry_at.get((release, dst_site.id), now) > now:
+                    continue
+                sources = [
+                    site
+                    for site in self.manager.rank_sources(dst_site, self._holders[release])
+                    if self._outbound[site.id] < self._outbound_limit(site)
+                ]
+                if not sources:
+                    continue
+                src_site = min(sources, key=lambda site: demand[site.id])
+                pending.remove(dst_site)
+                self._attempts[(release, dst_site.id)] += 1
+                self.log.info("FXP %s from %s to %s...", release, src_site.id, dst_site.id)
+                try:
+                    transfer_data = self.manager.fxp(src_site=src_site, dst_site=dst_site, release_name=release)
+                except (HTTPError, ValueError) as e:
+                    self.log.warning("Couldn't FXP %s from %s to %s: %s", release, src_site.id, dst_site.id, e)
+                    self._retry_or_fail(release, dst_site, failed)
+                    continue
+                self._running[transfer_data["id"]] = _Copy(release, src_site.id, dst_site)
+                self._outbound[src_site.id] += 1
+
+    def _poll(self, failed: dict[str, list[Site]]) -> None:
+        for job_id, copy in list(self._running.items()):
+            state = self.manager.get_transferjob(job_id)
+            status = state["status"]
+            self._states[job_id] = JobState.from_transferjob(state)
+            if status not in FINISHED_STATUSES:
+                emit_job_progress(state)
+                continue
+
+            del self._running[job_id]
+            self._outbound[copy.src_site_id] -= 1
+            self.manager.record_transfer(state, monotonic() - copy.started)
+            if status == "DONE":
+                self.log.info("%s is done on %s (from %s)", copy.release, copy.dst_site.id, copy.src_site_id)
+                self._holders[copy.release].append(copy.dst_site)
+            else:
+                self.log.warning(
+                    "FXP of %s from %s to %s is %s", copy.release, copy.src_site_id, copy.dst_site.id, status
+                )
+                self._retry_or_fail(copy.release, copy.dst_site, failed)
+
+    def _next_retry(self) -> float:
+        return min(
+            self._retry_at.get((release, dst_site.id), 0.0)
+            for release, pending in self._pending.items()
+            for dst_site in pending
+        )
+
+    def _retry_or_fail(self, release: str, dst_site: Site, failed: dict[str, list[Site]]) -> None:
+        attempts = self._attempts[(release, dst_site.id)]
+        if attempts < self.max_attempts:
+            self._retry_at[(release, dst_site.id)] = monotonic() + self.retry_delay * 2 ** (attempts - 1)
+            self._pending[release].append(dst_site)
+        else:
+            self.log.error("Couldn't FXP %s to %s.", release, dst_site.id)
+            failed[release].append(dst_site)
@@ -3,16 +3,119 @@ from __future__ import annotations
 import concurrent.futures
 import functools
 import logging
+import re
+import statistics
+import sys
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from dataclasses import dataclass, field
 from pathlib import PurePosixPath
-from time import sleep
-from typing import Any
+from time import monotonic, sleep, time
+from typing import Any, Final, Literal, NamedTuple
 
 import click
-from tqdm import tqdm
+from requests import HTTPError, RequestException
 
 from pypre.cbftp import CBFTP
-from pypre.objects.site import Site
-from pypre.utils.types import PBarsType
+from pypre.cbftp.exceptions import CommandFailure
+from pypre.objects.site import GroupDirIndex, Site
+from pypre.storage import (
+    LOCAL_SITE,
+    Action,
+    ActionState,
+    ActionStatus,
+    Batch,
+    GroupDirCache,
+    TransferHistory,
+    transfer_speed,
+)
+from pypre.utils.events import events
+from pypre.utils.profiling import profiler
+from pypre.utils.progress import JobState, NoDisplay, TransferBars, TransferDashboard, TransferDisplay
+
+SPEED_HISTORY_DAYS = 7
+"""Number of days of transfer history used to estimate the speed of a route."""
+
+LISTING_TTL = 30.0
+"""Number of seconds during which the listing of a group directory is reused to check the presence of releases."""
+
+PRE_POLL_INTERVAL = 0.2
+"""Number of seconds between each poll of the results of an asynchronous pre."""
+
+PRE_RESULT_TIMEOUT = 60.0
+"""Default maximum number of seconds to wait for the sites to answer an asynchronous pre."""
+
+ABORT_WORKERS = 16
+"""Maximum number of transfer jobs aborted concurrently."""
+
+BARS_MAX_JOBS = 10
+"""Maximum number of transfer jobs for which progress bars are displayed in 'auto' progress mode."""
+
+SPREAD_PROFILE: Final = "DISTRIBUTE"
+"""Profile of the spread jobs created to FXP releases."""
+
+SPREAD_FINISHED_STATUSES = ("DONE", "ABORTED", "TIMEOUT", "FAILED")
+"""Spread job statuses for which the job won't progress anymore."""
+
+ProgressMode = Literal["auto", "bars", "dashboard", "none"]
+
+
+def emit_job_progress(transferjob: dict[str, Any]) -> None:
+    """Emit a progress sample of a running transfer job to the event stream."""
+    events.emit(
+        "job.progress",
+        job_id=transferjob["id"],
+        status=transferjob["status"],
+        bytes=transferjob.get("size_progress_bytes"),
+        total_bytes=transferjob.get("size_estimated_bytes"),
+    )
+
+
+def _pre_outcomes(data: dict[str, Any]) -> dict[str, str | None]:
+    """Map each site of a raw command result to its failure reason, or None if it succeeded."""
+    outcomes: dict[str, str | None] = {success["name"]: None for success in data.get("successes", [])}
+    outcomes.update((failure["name"], failure["reason"]) for failure in data.get("failures", []))
+    return outcomes
+
+
+class PreparedPre(NamedTuple):
+    """The pre command of a release on a site, resolved ahead of submission."""
+
+    site: Site
+    command: str
+    path: PurePosixPath
+
+
+@dataclass
+class PreResult:
+    """The outcome of a pre on the sites it wasn't acknowledged on."""
+
+    failures: dict[str, str] = field(default_factory=dict)
+    """The failure reason of each site CBFTP reported the pre as failed on."""
+    unknown: dict[str, str] = field(default_factory=dict)
+    """Why the outcome is unknown on each site whose request failed or wasn't answered. The pre may have happened
+    on these sites, so they are left journaled as submitted."""
+
+
+@dataclass
+class PendingPre:
+    """A pre sent by `CBFTPManager.send_pre`, whose results are still to be collected."""
+
+    release_name: str
+    requests: list[tuple[CBFTP, int, str, list[Site]]] = field(default_factory=list)
+    """The CBFTP instance, request ID, command and sites of each asynchronous request."""
+    result: PreResult = field(default_factory=PreResult)
+    """The outcome of the sites whose request couldn't be sent."""
+
+
+@dataclass
+class SpreadJob:
+    """A spread job distributing a release to several sites, created by `CBFTPManager.spread`."""
+
+    release_name: str
+    """The name of the release, which is also the name of the spread job."""
+    client: CBFTP
+    """The CBFTP instance running the spread job."""
+    dst_sites: list[Site]
 
 
 class CBFTPManager:
@@ -20,32 +123,59 @@ class CBFTPManager:
 
     Args:
         cbftp: The CBFTP client instance to use.
+        history: The history in which finished transfer jobs are recorded.
+        group_dirs: The cache in which the group directories listed on each site are stored.
+        progress: How to display the transfer progress. 'bars' displays one progress bar per job,
+            'dashboard' an aggregated view. 'auto' uses bars for a few jobs on a TTY, and
+            the dashboard otherwise. 'none' doesn't display anything.
+        sections: The configured sections, used to render the pre commands.
+        check_online: Check that the CBFTP instance is reachable. Can be disabled if it was just checked,
+            e.g. by `select_cbftp`.
     """
 
-    def __init__(self, cbftp: CBFTP) -> None:
+    def __init__(
+        self,
+        cbftp: CBFTP,
+        history: TransferHistory | None = None,
+        group_dirs: GroupDirCache | None = None,
+        progress: ProgressMode = "auto",
+        sections: Sequence[tuple[str, re.Pattern[str]]] = (),
+        *,
+        check_online: bool = True,
+    ) -> None:
         self.cbftp = cbftp
+        self.history = history
+        self.group_dirs = group_dirs
+        self.progress = progress
+        self.sections = sections
         self.log = logging.getLogger("pypre.manager")
-        if not self.cbftp.online:
-            self.log.critical("The CBFTP server %r is not reachable.", cbftp.name)
-            raise SystemExit()
+        self.journal: Batch | None = None
+        """The journal of the running batch, in which the submitted and finished actions are recorded."""
+        self._live_speeds: dict[tuple[str, str], list[float]] = {}
+        self._journaled: dict[int, Action] = {}
+        self._submitted_at: dict[int, float] = {}
+        self._listings: dict[tuple[str, PurePosixPath], tuple[float, frozenset[str]]] = {}
+        if check_online:
+            self._check_online()
 
-    def _get_dst_path(self, site: Site, release_name: str) -> PurePosixPath:
-        group_dir, default_group_dir = site.get_group_dir(release_name)
-        site_group_dirs = self.get_site_group_dirs(site)
+    def _check_online(self) -> None:
+        with profiler.phase("cbftp.online"):
+            online = self.cbftp.online
+        if not online:
+            self.log.critical("The CBFTP server %r is not reachable.", self.cbftp.name)
+            raise SystemExit()
 
-        if group_dir is not None and group_dir.lower().endswith("_int"):
-            group_dir = group_dir[:-4]
-        if default_group_dir is not None and default_group_dir.lower().endswith("_int"):
-            default_group_dir = default_group_dir[:-4]
+    def _client(self, *sites: Site) -> CBFTP:
+        """Return the CBFTP client to use for an operation involving the provided sites."""
+        return self.cbftp
 
-        if group_dir not in site_group_dirs:
-            if default_group_dir is None:
-                raise ValueError("No group directory matching and no default one provided.")
-            if default_group_dir not in site_group_dirs:
-                raise ValueError(f"{default_group_dir} does not exist.")
-            group_dir = default_group_dir
+    def _register_job(self, client: CBFTP, transfer_data: dict[str, Any]) -> dict[str, Any]:
+        """Register a created transfer job, and return the transfer data to expose."""
+        return transfer_data
 
-        return PurePosixPath(site.groups_dir, group_dir)
+    @profiler.timed("plan.dst_path")
+    def _get_dst_path(self, site: Site, release_name: str) -> PurePosixPath:
+        return site.get_dst_path(release_name, self._group_dir_index(site))
 
     def get_sites(self, **kwargs: Any) -> list[str]:
         """Get available sites on the CBFTP instance.
@@ -59,6 +189,7 @@ class CBFTPManager:
         return self.cbftp.get_sites(**kwargs)
 
     @functools.cache
+    @profiler.timed("plan.group_dirs")
     def get_site_group_dirs(self, site: Site, **kwargs: Any) -> list[str]:
         """Get the available group directories for the provided site.
 
@@ -69,8 +200,15 @@ class CBFTPManager:
         Returns:
             The list of the available group directories.
         """
-        list_path = self.cbftp.list_path(site=site.id, path=site.groups_dir, type="DIR", **kwargs)
-        return [path["name"] for path in list_path]
+        list_path = self._client(site).list_path_fields(site=site.id, path=site.groups_dir, type="DIR", **kwargs)
+        group_dirs = [name for (name,) in list_path]
+        if self.group_dirs is not None:
+            self.group_dirs.save(site.id, group_dirs)
+        return group_dirs
+
+    @functools.cache
+    def _group_dir_index(self, site: Site) -> GroupDirIndex:
+        return GroupDirIndex(self.get_site_group_dirs(site))
 
     def upload(self, site: Site, release_name: str, src_path: str | None = None, **kwargs: Any) -> dict[str, Any]:
         """Upload the release from the specified source path to site.
@@ -88,7 +226,11 @@ class CBFTPManager:
         json = {"dst_site": site.id, "dst_path": str(dst_path), "name": release_name}
         if src_path is not None:
             json["src_path"] = src_path
-        transferjobs: dict[str, Any] = self.cbftp._post("/transferjobs", json=json, **kwargs)
+        client = self._client(site)
+        with profiler.phase("submit.transferjob"):
+            transferjobs: dict[str, Any] = client._post("/transferjobs", json=json, **kwargs)
+        transferjobs = self._register_job(client, transferjobs)
+        self._job_submitted(Action("upload", release_name, site.id), None, transferjobs["id"])
         return transferjobs
 
     def fxp(self, src_site: Site, dst_site: Site, release_name: str, **kwargs: Any) -> dict[str, Any]:
@@ -113,69 +255,839 @@ class CBFTPManager:
             "dst_path": str(dst_path),
             "name": release_name,
         }
-        transferjobs: dict[str, Any] = self.cbftp._post("/transferjobs", json=json, **kwargs)
+        client = self._client(src_site, dst_site)
+        with profiler.phase("submit.transferjob"):
+            transferjobs: dict[str, Any] = client._post("/transferjobs", json=json, **kwargs)
+        transferjobs = self._register_job(client, transferjobs)
+        self._job_submitted(Action("fxp", release_name, dst_site.id), src_site.id, transferjobs["id"])
         return transferjobs
 
+    def spread(self, release_name: str, src_sites: list[Site], dst_sites: list[Site]) -> SpreadJob:
+        """Create a spread job distributing a release from the source sites to the destinations.
+
+        CBFTP uses the destinations as sources for each other as soon as they have parts of the release. The
+        spread job is named after the release, and created in the CBFTP section pointing to the group directory
+        of the release on every site, as resolved for the other transfers. Each destination is journaled as
+        submitted, if a journal is set.
+
+        Args:
+            release_name: The release name to be transfered.
+            src_sites: The sites having the release, which are only downloaded from.
+            dst_sites: The sites to spread the release to.
+
+        Raises:
+            ValueError: The group directory of the release couldn't be resolved on a site, no CBFTP section
+                points to it on every site, or no CBFTP instance has all the sites.
+            HTTPError: The spread job couldn't be created.
+        """
+        client = self._client(*src_sites, *dst_sites)
+        section = self._spread_section(release_name, [*src_sites, *dst_sites])
+        with profiler.phase("submit.spreadjob"):
+            client.create_spreadjob(
+                name=release_name,
+                section=section,
+                sites=[site.id for site in dst_sites],
+                sites_dlonly=[site.id for site in src_sites],
+                profile=SPREAD_PROFILE,
+            )
+        events.emit(
+            "spread.submitted",
+            release=release_name,
+            src_sites=[site.id for site in src_sites],
+            dst_sites=[site.id for site in dst_sites],
+            cbftp=client.name,
+        )
+        if self.journal is not None:
+            for dst_site in dst_sites:
+                self.journal.submitted(Action("fxp", release_name, dst_site.id), None, client.name, None)
+        return SpreadJob(release_name, client, dst_sites)
+
+    def _spread_section(self, release_name: str, sites: list[Site]) -> str:
+        """Return the name of the CBFTP section pointing to the group directory of the release on every site.
+
+        Spread jobs can only target sections, so the release would otherwise land in a section unrelated
+        to the group directory it is pred from.
+        """
+        candidates: set[str] | None = None
+        for site in sites:
+            group_dir = self._get_dst_path(site, release_name)
+            names = {name for name, path in self._site_sections(site).items() if path == group_dir}
+            candidates = names if candidates is None else candidates & names
+        if not candidates:
+            raise ValueError(
+                f"No CBFTP section points to the group directory of {release_name} on every site "
+                f"({', '.join(f'{site.id}: {self._get_dst_path(site, release_name)}' for site in sites)})"
+            )
+        return min(candidates)
+
+    @functools.cache
+    def _site_sections(self, site: Site) -> dict[str, PurePosixPath]:
+        sections = self._client(site).get_site(site.id).get("sections", [])
+        return {section["name"]: PurePosixPath(section["path"]) for section in sections}
+
+    def reattach_spread(self, release_name: str, cbftp: str, dst_sites: list[Site]) -> SpreadJob | None:
+        """Re-attach to the spread job of a release submitted by a previous run.
+
+        Args:
+            release_name: The release name.
+            cbftp: The name of the CBFTP instance running the spread job, as journaled.
+            dst_sites: The destinations of the release that aren't done yet.
+
+        Returns:
+            The spread job, or `None` if it can't be found or didn't succeed.
+        """
+        try:
+            client = self._cbftp_named(cbftp)
+            spreadjob = client.get_spreadjob(release_name)
+        except (RequestException, ValueError) as e:
+            self.log.warning("Couldn't re-attach to the spread job of %s: %s", release_name, e)
+            return None
+        if spreadjob["status"] in {"ABORTED", "TIMEOUT", "FAILED"}:
+            return None
+        return SpreadJob(release_name, client, dst_sites)
+
+    def _cbftp_named(self, cbftp: str) -> CBFTP:
+        if cbftp != self.cbftp.name:
+            raise ValueError(f"The CBFTP server {cbftp!r} is not in use.")
+        return self.cbftp
+
+    def prepare_pre(self, release_name: str, sites: list[Site]) -> list[PreparedPre]:
+        """Resolve the pre command and path of a release on each site, without submitting anything.
+
+        Args:
+            release_name: The release name to pre.
+            sites: The list of sites to pre to.
+
+        Raises:
+            ValueError: The group directory or the section of the release couldn't be resolved on a site.
+        """
+        return [
+            PreparedPre(site, site.get_pre_command(release_name, self.sections), self._get_dst_path(site, release_name))
+            for site in sites
+        ]
+
+    def warm_up(self, sites: list[Site]) -> None:
+        """Open a connection to the CBFTP instance of each site, so that a following pre doesn't pay for it.
+
+        One request is sent per site in parallel, as the pre requests are.
+
+        Args:
+            sites: The sites about to be pred.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(sites)) as executor:
+            list(executor.map(lambda site: self._client(site).online, sites))
+
     def pre(self, release_name: str, sites: list[Site]) -> None:
         """Pre the provided release name to the specified sites, using a thread pool.
 
+        The result for each site is recorded in the journal, if any.
+
         Args:
             release_name: The release name to pre.
             sites: The list of sites to pre to.
+
+        Raises:
+            CommandFailure: The pre failed on some sites, or its outcome is unknown.
         """
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(sites)) as executor:
+        prepared = self.prepare_pre(release_name, sites)
+        result = self.submit_pre(release_name, prepared)
+        failures = {**result.failures, **result.unknown}
+        if failures:
+            commands = {item.site.id: item.command for item in prepared}
+            raise CommandFailure(
+                commands[next(iter(failures))],
+                [{"name": site_id, "reason": reason} for site_id, reason in failures.items()],
+            )
+
+    def _pre_requests(self, prepared: list[PreparedPre]) -> list[tuple[CBFTP, str, PurePosixPath, list[Site]]]:
+        """Group the sites sharing the same rendered command and path, to pre them with a single request.
+
+        Sites are only grouped on a CBFTP instance having all of them, and split per instance otherwise.
+        """
+        groups: dict[tuple[str, PurePosixPath], list[Site]] = {}
+        for site, command, path in prepared:
+            groups.setdefault((command, path), []).append(site)
+
+        requests = []
+        for (command, path), sites in groups.items():
+            try:
+                requests.append((self._client(*sites), command, path, sites))
+            except ValueError:
+                by_client: dict[str, tuple[CBFTP, list[Site]]] = {}
+                for site in sites:
+                    client = self._client(site)
+                    by_client.setdefault(client.name, (client, []))[1].append(site)
+                requests.extend((client, command, path, client_sites) for client, client_sites in by_client.values())
+        return requests
+
+    @profiler.timed("submit.pre")
+    def submit_pre(
+        self, release_name: str, prepared: list[PreparedPre], *, on_send: Callable[[], None] | None = None
+    ) -> PreResult:
+        """Pre a release with commands resolved by `prepare_pre`, using a thread pool.
+
+        Sites sharing the same command and path are pred with a single request, and its results are split
+        back per site. The result for each site is recorded in the journal, if any.
+
+        Args:
+            release_name: The release name to pre.
+            prepared: The resolved pre command of each site.
+            on_send: Called once the sites are journaled as submitted, right before the requests are sent.
+
+        Returns:
+            The outcome of the sites the pre wasn't acknowledged on. A request that failed, or a response lacking
+            some sites, leaves their outcome unknown.
+        """
+        requests = self._pre_requests(prepared)
+        self._pre_sent(release_name, requests)
+        if on_send is not None:
+            on_send()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(requests)) as executor:
             futures = {}
-            for site in sites:
-                section = site.get_section(release_name)
-                path = self._get_dst_path(site, release_name)
-                command = site.pre_command.format(release=release_name, section=section)
-                futures[executor.submit(self.cbftp.raw, command, sites=site.id, path=path)] = site
+            for client, command, path, sites in requests:
+                future = executor.submit(
+                    client.raw, command, sites=[site.id for site in sites], path=path, raise_on_failure=False
+                )
+                futures[future] = (command, sites)
 
+            result = PreResult()
             for future in concurrent.futures.as_completed(futures):
-                data = future.result()
-                site_id = futures[future].id
-                self.log.debug("%s response: %s", site_id, data)
+                command, sites = futures[future]
+                site_ids = [site.id for site in sites]
+                try:
+                    data = future.result()
+                except RequestException as e:
+                    result.unknown.update(self._pre_unknown(release_name, site_ids, str(e)))
+                    continue
+                self.log.debug("%s response: %s", ", ".join(site_ids), data)
+                outcomes = _pre_outcomes(data)
+                result.failures.update(self._record_pre(release_name, outcomes))
+                missing = [site_id for site_id in site_ids if site_id not in outcomes]
+                result.unknown.update(self._pre_unknown(release_name, missing, "No result returned."))
+        return result
+
+    @profiler.timed("submit.pre")
+    def send_pre(
+        self, release_name: str, prepared: list[PreparedPre], *, on_send: Callable[[], None] | None = None
+    ) -> PendingPre:
+        """Pre a release with commands resolved by `prepare_pre`, without waiting for the sites to answer.
+
+        The requests are sent asynchronously, as `submit_pre` would send them. Their results are then
+        collected by `collect_pre`. The request ID of each site is recorded in the journal, if any, so that
+        the results can still be collected if the batch is interrupted. A request answered without an ID is
+        recorded as failed.
+
+        Args:
+            release_name: The release name to pre.
+            prepared: The resolved pre command of each site.
+            on_send: Called once the sites are journaled as submitted, right before the requests are sent.
+
+        Returns:
+            The pending pre requests.
+        """
+        pending = PendingPre(release_name)
+        requests = self._pre_requests(prepared)
+        self._pre_sent(release_name, requests)
+        if on_send is not None:
+            on_send()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(requests)) as executor:
+            futures = {}
+            for client, command, path, sites in requests:
+                future = executor.submit(
+                    client.raw,
+                    command,
+                    is_async=True,
+                    sites=[site.id for site in sites],
+                    path=path,
+                    raise_on_failure=False,
+                )
+                futures[future] = (client, command, sites)
+
+            submissions: list[tuple[Action, str | None, str, int | None]] = []
+            for future in concurrent.futures.as_completed(futures):
+                client, command, sites = futures[future]
+                site_ids = [site.id for site in sites]
+                try:
+                    data = future.result()
+                except RequestException as e:
+                    pending.result.unknown.update(self._pre_unknown(release_name, site_ids, str(e)))
+                    continue
+                request_id = data.get("request_id")
+                if request_id is None:
+                    self.log.debug("%s response: %s", ", ".join(site_ids), data)
+                    reason = "No request ID returned."
+                    pending.result.failures.update(self._record_pre(release_name, dict.fromkeys(site_ids, reason)))
+                    continue
+                pending.requests.append((client, request_id, command, sites))
+                submissions.extend(
+                    (Action("pre", release_name, site_id), None, client.name, request_id) for site_id in site_ids
+                )
+        if self.journal is not None:
+            self.journal.submitted_all(submissions)
+        return pending
+
+    def resume_pre(
+        self, release_name: str, prepared: list[PreparedPre], states: Mapping[str, ActionState]
+    ) -> PendingPre:
+        """Rebuild the pending requests of a pre sent by an interrupted batch, to collect them with `collect_pre`.
+
+        Only the requests sent by `send_pre` can be collected, from the request ID journaled for each site.
+        The outcome of the other sites is unknown.
+
+        Args:
+            release_name: The release name the pre was sent for.
+            prepared: The resolved pre command of each site the pre was sent to.
+            states: The last journaled state of the pre on each site, by site ID.
+
+        Returns:
+            The pending pre requests.
+        """
+        pending = PendingPre(release_name)
+        requests: dict[tuple[str, int], tuple[CBFTP, int, str, list[Site]]] = {}
+        for site, command, _ in prepared:
+            state = states[site.id]
+            if state.cbftp is None or state.job_id is None:
+                reason = "Sent by the interrupted batch, without a request ID to get its outcome."
+                pending.result.unknown.update(self._pre_unknown(release_name, [site.id], reason))
+                continue
+            try:
+                client = self._cbftp_named(state.cbftp)
+            except ValueError as e:
+                pending.result.unknown.update(self._pre_unknown(release_name, [site.id], str(e)))
+                continue
+            requests.setdefault((state.cbftp, state.job_id), (client, state.job_id, command, []))[3].append(site)
+        pending.requests.extend(requests.values())
+        return pending
+
+    def collect_pre(self, pending: PendingPre, timeout: float = PRE_RESULT_TIMEOUT) -> PreResult:
+        """Poll the results of a pre sent by `send_pre`, recording each site as soon as it answered.
+
+        The result for each site is recorded in the journal, if any. The outcome of the sites that didn't
+        answer before the timeout is unknown.
+
+        Args:
+            pending: The pending pre requests.
+            timeout: The maximum number of seconds to wait for the sites to answer.
+
+        Returns:
+            The outcome of the sites the pre wasn't acknowledged on.
+        """
+        deadline = monotonic() + timeout
+        unanswered = {index: {site.id for site in request[3]} for index, request in enumerate(pending.requests)}
+        result = PreResult(dict(pending.result.failures), dict(pending.result.unknown))
+        while unanswered:
+            for index, site_ids in list(unanswered.items()):
+                client, request_id, command, _ = pending.requests[index]
+                try:
+                    data = client.get_raw_result(request_id)
+                except RequestException as e:
+                    self.log.debug("Couldn't get the result of %r: %s", command, e)
+                    continue
+                outcomes = {name: reason for name, reason in _pre_outcomes(data).items() if name in site_ids}
+                result.failures.update(self._record_pre(pending.release_name, outcomes))
+                site_ids.difference_update(outcomes)
+                if not site_ids:
+                    del unanswered[index]
+
+            if unanswered and monotonic() >= deadline:
+                for site_ids in unanswered.values():
+                    result.unknown.update(
+                        self._pre_unknown(pending.release_name, site_ids, "No result before the timeout.")
+                    )
+                break
+            if unanswered:
+                sleep(PRE_POLL_INTERVAL)
+        return result
+
+    def _pre_sent(self, release_name: str, requests: list[tuple[CBFTP, str, PurePosixPath, list[Site]]]) -> None:
+        """Journal the sites of the pre requests as submitted, in a single transaction, before the requests are sent.
+
+        A pre interrupted after this point may have happened on the sites, so it must not be sent again when
+        the batch is resumed.
+        """
+        for _, command, path, sites in requests:
+            for site in sites:
+                events.emit("pre.sent", release=release_name, site=site.id, command=command, path=str(path))
+        if self.journal is not None:
+            self.journal.submitted_all(
+                (Action("pre", release_name, site.id), None, client.name, None)
+                for client, _, _, sites in requests
+                for site in sites
+            )
+
+    def _record_pre(self, release_name: str, outcomes: Mapping[str, str | None]) -> dict[str, str]:
+        """Record the outcome of a pre on each site, given the failure reason of the failed ones.
 
+        Returns:
+            The failure reason of each failed site.
+        """
+        failures = {}
+        for site_id, reason in outcomes.items():
+            if reason is not None:
+                events.emit("pre.failed", release=release_name, site=site_id, error=reason)
+                self._journal_finished(Action("pre", release_name, site_id), "FAILED")
+                failures[site_id] = reason
+            else:
+                events.emit("pre.acked", release=release_name, site=site_id)
+                self._journal_finished(Action("pre", release_name, site_id), "DONE")
+        return failures
+
+    def _pre_unknown(self, release_name: str, site_ids: Iterable[str], reason: str) -> dict[str, str]:
+        """Report the sites a pre was sent to without getting their outcome, leaving them journaled as submitted.
+
+        Returns:
+            The reason the outcome of each site is unknown.
+        """
+        unknown = {}
+        for site_id in site_ids:
+            events.emit("pre.unknown", release=release_name, site=site_id, error=reason)
+            unknown[site_id] = reason
+        return unknown
+
+    @functools.cached_property
+    def _history_speeds(self) -> dict[tuple[str, str], float]:
+        if self.history is None:
+            return {}
+        route_stats = self.history.route_stats(since=time() - SPEED_HISTORY_DAYS * 86400)
+        return {
+            (route.src_site, route.dst_site): route.median_speed
+            for route in route_stats
+            if route.median_speed is not None
+        }
+
+    def route_speed(self, src_site: Site, dst_site: Site) -> float | None:
+        """Estimate the transfer speed between two sites.
+
+        Speeds measured during this session are preferred over the ones recorded in the transfer history.
+
+        Args:
+            src_site: The site to download from.
+            dst_site: The site to upload to.
+
+        Returns:
+            The median measured speed in bytes/s, or `None` if no transfer was measured for this route.
+        """
+        route = (src_site.id, dst_site.id)
+        live_speeds = self._live_speeds.get(route)
+        if live_speeds:
+            return statistics.median(live_speeds)
+        return self._history_speeds.get(route)
+
+    def rank_sources(self, dst_site: Site, src_sites: list[Site]) -> list[Site]:
+        """Sort the source sites from the fastest to the slowest one for the provided destination.
+
+        Sources without any measured speed are ranked last, in their original order.
+
+        Args:
+            dst_site: The site to upload to.
+            src_sites: The candidate sites to download from.
+
+        Returns:
+            The sorted source sites.
+        """
+        speeds = {src_site.id: self.route_speed(src_site, dst_site) for src_site in src_sites}
+        return sorted(src_sites, key=lambda src_site: -(speeds[src_site.id] or -1.0))
+
+    def _listed_releases(self, site: Site, group_dir: PurePosixPath) -> frozenset[str]:
+        """List the release directories of a group directory, reusing the listing for `LISTING_TTL` seconds."""
+        key = (site.id, group_dir)
+        cached = self._listings.get(key)
+        if cached is not None and monotonic() - cached[0] < LISTING_TTL:
+            return cached[1]
+        list_path = self._client(site).list_path_fields(site=site.id, path=group_dir, type="DIR")
+        releases = frozenset(name for (name,) in list_path)
+        self._listings[key] = (monotonic(), releases)
+        return releases
+
+    def has_release(self, site: Site, release_name: str) -> bool:
+        """Check whether the release is present on site.
+
+        The listing of the group directory is cached for `LISTING_TTL` seconds, so that checking several
+        releases costs one request per group directory.
+
+        Args:
+            site: The site to be checked.
+            release_name: The release name to look for.
+
+        Returns:
+            Whether the release directory exists in the site group directory.
+        """
+        return release_name in self._listed_releases(site, self._get_dst_path(site, release_name))
+
+    @profiler.timed("plan.sources")
+    def verify_sources(self, releases: Iterable[str], src_sites: list[Site]) -> dict[str, list[Site]]:
+        """Find the source sites having each release, before submitting any transfer job.
+
+        Each source group directory is listed once. A release whose group directory can't be resolved on
+        a site is considered missing there. If a group directory can't be listed, its releases are assumed
+        to be present, and the transfer jobs are submitted as usual.
+
+        Args:
+            releases: The release names to look for.
+            src_sites: The candidate source sites.
+
+        Returns:
+            The source sites having each release, in the order of `src_sites`.
+        """
+        unlisted: set[tuple[str, PurePosixPath]] = set()
+        available: dict[str, list[Site]] = {}
+        for release in releases:
+            available[release] = []
+            for site in src_sites:
+                try:
+                    group_dir = self._get_dst_path(site, release)
+                except ValueError as e:
+                    self.log.debug("%s is missing on %s: %s", release, site.id, e)
+                    continue
+                if (site.id, group_dir) not in unlisted:
+                    try:
+                        present = release in self._listed_releases(site, group_dir)
+                    except HTTPError as e:
+                        self.log.warning("Couldn't list %s on %s: %s", group_dir, site.id, e)
+                        unlisted.add((site.id, group_dir))
+                    else:
+                        if not present:
+                            self.log.debug("%s is missing on %s.", release, site.id)
+                            continue
+                available[release].append(site)
+        return available
+
+    def get_transferjob(self, job_id: int) -> dict[str, Any]:
+        """Get data about a transfer job.
+
+        Args:
+            job_id: The ID of the transfer job, as returned by `upload` or `fxp`.
+
+        Returns:
+            Data for the transfer job.
+        """
+        return self.cbftp.get_transferjob(id=job_id)
+
+    def abort_transferjob(self, job_id: int) -> None:
+        """Abort a transfer job.
+
+        Args:
+            job_id: The ID of the transfer job, as returned by `upload` or `fxp`.
+        """
+        self.cbftp.abort_transferjob(id=job_id)
+
+    def abort_transferjobs(self, job_ids: Iterable[int], workers: int = ABORT_WORKERS) -> dict[int, Exception]:
+        """Abort transfer jobs concurrently, using a bounded thread pool.
+
+        Aborted jobs are recorded as such in the journal, if any.
+
+        Args:
+            job_ids: The IDs of the transfer jobs, as returned by `upload` or `fxp`.
+            workers: The maximum number of jobs aborted concurrently.
+
+        Returns:
+            The error raised for each job that couldn't be aborted.
+        """
+        job_ids = list(dict.fromkeys(job_ids))
+        if not job_ids:
+            return {}
+
+        def abort(job_id: int) -> Exception | None:
+            try:
+                self.abort_transferjob(job_id)
+            except RequestException as e:
+                return e
+            return None
+
+        failed = {}
+        with profiler.phase("abort"), concurrent.futures.ThreadPoolExecutor(min(workers, len(job_ids))) as executor:
+            for job_id, error in zip(job_ids, executor.map(abort, job_ids)):
+                if error is not None:
+                    self.log.error("Couldn't abort transfer job %d: %s", job_id, error)
+                    failed[job_id] = error
+                    continue
+                events.emit("job.aborted", job_id=job_id)
+                action = self._journaled.pop(job_id, None)
+                if action is not None:
+                    self._journal_finished(action, "ABORTED")
+        self.log.info("Aborted %d of %d transfer jobs", len(job_ids) - len(failed), len(job_ids))
+        return failed
+
+    def get_transferjobs(self) -> list[dict[str, Any]]:
+        """Get data about all the transfer jobs of the CBFTP instance(s), including the ones not submitted by pypre.
+
+        Returns:
+            Data for each transfer job, identified by an ID usable with the other methods of the manager.
+        """
+        return self.cbftp.get_transferjobs()
+
+    def job_origin(self, job_id: int) -> tuple[str, int]:
+        """Return the name of the CBFTP instance running a transfer job, and the ID of the job on this instance.
+
+        Args:
+            job_id: The ID of the transfer job, as returned by `upload` or `fxp`.
+        """
+        return self.cbftp.name, job_id
+
+    def attach_transferjob(self, cbftp: str, cbftp_job_id: int) -> int:
+        """Attach to a transfer job that was not submitted by this manager, e.g. during a previous run.
+
+        Args:
+            cbftp: The name of the CBFTP instance running the job.
+            cbftp_job_id: The ID of the transfer job on this instance.
+
+        Returns:
+            The ID of the transfer job, to be used with this manager.
+
+        Raises:
+            ValueError: If the CBFTP instance is not used by this manager.
+        """
+        if cbftp != self.cbftp.name:
+            raise ValueError(f"The CBFTP server {cbftp!r} is not in use.")
+        return cbftp_job_id
+
+    def reattach(self, action: Action, state: ActionState) -> dict[str, Any] | None:
+        """Re-attach to the transfer job of an action submitted by a previous run.
+
+        Args:
+            action: The action to resume.
+            state: The last journaled state of the action.
+
+        Returns:
+            The current data of the transfer job, with an ID to be used with this manager, or `None` if the
+            action was not submitted, or its transfer job can't be found or didn't succeed.
+        """
+        if state.status != "SUBMITTED" or state.cbftp is None or state.job_id is None:
+            return None
+        try:
+            job_id = self.attach_transferjob(state.cbftp, state.job_id)
+            transferjob = self.get_transferjob(job_id)
+        except (RequestException, ValueError) as e:
+            self.log.warning("Couldn't re-attach to the transfer job of %s to %s: %s", action.release, action.site, e)
+            return None
+        if transferjob["status"] in {"ABORTED", "FAILED"}:
+            return None
+
+        if transferjob["status"] == "DONE":
+            self._journal_finished(action, "DONE")
+        elif self.journal is not None:
+            self._journaled[job_id] = action
+        return transferjob
+
+    def _job_submitted(self, action: Action, src_site: str | None, job_id: int) -> None:
+        self._submitted_at[job_id] = monotonic()
+        cbftp, cbftp_job_id = self.job_origin(job_id)
+        events.emit(
+            "job.submitted",
+            kind=action.kind,
+            release=action.release,
+            src_site=src_site,
+            dst_site=action.site,
+            job_id=job_id,
+            cbftp=cbftp,
+            cbftp_job_id=cbftp_job_id,
+        )
+        if self.journal is None:
+            return
+        self.journal.submitted(action, src_site, cbftp, cbftp_job_id)
+        self._journaled[job_id] = action
+
+    def _journal_finished(self, action: Action, status: ActionStatus) -> None:
+        if self.journal is not None:
+            self.journal.finished(action, status)
+
+    @profiler.timed("check")
     def check(self, release_name: str, site: Site) -> bool:
         release_dir = self._get_dst_path(site, release_name) / release_name
-        list_path = self.cbftp.list_path(site=site.id, path=release_dir)
-        return any("COMPLETE" in path["name"].upper() for path in list_path)
+        list_path = self._client(site).list_path_fields(site=site.id, path=release_dir)
+        is_complete = any("COMPLETE" in name.upper() for (name,) in list_path)
+        events.emit("release.checked", release=release_name, site=site.id, complete=is_complete)
+        return is_complete
+
+    @profiler.timed("wait.progress")
+    def show_transfer_progress(self, upload_jobs: list[int], totals: Mapping[int, int] | None = None) -> None:
+        """Show the transfer progress of the provided upload jobs IDs, until all of them are finished.
 
-    def show_transfer_progress(self, upload_jobs: list[int]) -> None:
-        """Show the transfer progress of the provided upload jobs IDs.
+        Finished jobs are recorded in the transfer history, if any.
 
         Args:
             upload_jobs: The upload jobs IDs to display.
+            totals: The known total size in bytes of some jobs, e.g. computed from the local files. The
+                estimation of the CBFTP instance is used for the other jobs.
         """
-        sleep(1)  # Necessary to be sure that cbftp returns the correct number of estimated bytes
+        totals = totals or {}
+        display = self._transfer_display(len(upload_jobs))
+        # Only the fields used by the displays are kept for each job, the full job data being dropped after each poll
+        states: dict[int, JobState] = {}
+        running = list(upload_jobs)
         try:
-            pbars: list[PBarsType] = [
-                {
-                    "job_id": job_id,
-                    "tqdm": tqdm(
-                        total=self.cbftp.get_transferjob(id=job_id)["size_estimated_bytes"],
-                        desc=f"Upload #{job_id}",
-                        unit="B",
-                        position=i,
-                        unit_scale=True,
-                    ),
-                    "state": self.cbftp.get_transferjob(id=job_id),
-                }
-                for i, job_id in enumerate(upload_jobs)
-            ]
-
-            while not all(pbar["state"]["status"] == "DONE" for pbar in pbars):
-                for pbar in pbars:
-                    pbar["state"] = self.cbftp.get_transferjob(id=pbar["job_id"])
-                    pbar["tqdm"].update(pbar["state"]["size_progress_bytes"] - pbar["tqdm"].n)
-                sleep(2)
+            started = monotonic()
+            while running:
+                for job_id in running:
+                    transferjob = self.get_transferjob(job_id)
+                    state = states.get(job_id)
+                    if state is None:
+                        states[job_id] = state = JobState.from_transferjob(transferjob, totals.get(job_id))
+                    else:
+                        state.update(transferjob, totals.get(job_id))
+                    if state.finished:
+                        self.record_transfer(transferjob, monotonic() - self._submitted_at.pop(job_id, started))
+                    else:
+                        emit_job_progress(transferjob)
+                display.update(states)
+                running = [job_id for job_id in running if not states[job_id].finished]
+                if running:
+                    sleep(2)
         except KeyboardInterrupt:
+            display.close()
             abort = click.confirm("Do you want to abort all running transfer jobs?")
-            for pbar in pbars:
-                pbar["tqdm"].close()
-                if abort:
-                    self.cbftp.abort_transferjob(id=pbar["job_id"])
+            if abort:
+                # The interrupted poll may have seen some of the jobs finish
+                self.abort_transferjobs(
+                    job_id for job_id in running if job_id not in states or not states[job_id].finished
+                )
+            raise
+        display.close()
+
+    def _transfer_display(self, job_count: int) -> TransferDisplay:
+        if self.progress == "none":
+            return NoDisplay()
+        if self.progress == "bars" or (self.progress == "auto" and job_count <= BARS_MAX_JOBS and sys.stderr.isatty()):
+            return TransferBars()
+        return TransferDashboard()
+
+    @profiler.timed("wait.spread")
+    def wait_spreadjobs(self, spreadjobs: list[SpreadJob]) -> dict[str, list[Site]]:
+        """Show the progress of spread jobs until all of them are finished, and map their result to each destination.
+
+        A destination is done once its site is reported as done in the spread job. Each destination is
+        journaled as done or failed once its spread job finished, if a journal is set.
 
+        Args:
+            spreadjobs: The spread jobs, as returned by `spread` or `reattach_spread`.
+
+        Returns:
+            The destinations each release couldn't be spread to.
+        """
+        job_ids = {
+            (spreadjob.release_name, dst_site.id): job_id
+            for job_id, (spreadjob, dst_site) in enumerate(
+                ((spreadjob, dst_site) for spreadjob in spreadjobs for dst_site in spreadjob.dst_sites), start=1
+            )
+        }
+        display = self._transfer_display(len(job_ids))
+        states: dict[int, JobState] = {}
+        failed: dict[str, list[Site]] = {}
+        running = list(spreadjobs)
+        try:
+            while running:
+                for spreadjob in list(running):
+                    data = spreadjob.client.get_spreadjob(spreadjob.release_name)
+                    finished = data["status"] in SPREAD_FINISHED_STATUSES
+                    sites = {site["name"]: site for site in data.get("sites", [])}
+                    for dst_site in spreadjob.dst_sites:
+                        site = sites.get(dst_site.id, {})
+                        status = site.get("status", "QUEUED")
+                        if finished and status != "DONE":
+                            status = "ABORTED" if data["status"] == "ABORTED" else "FAILED"
+                        job_id = job_ids[spreadjob.release_name, dst_site.id]
+                        states[job_id] = JobState(
+                            job_id,
+                            spreadjob.release_name,
+                            dst_site.id,
+                            status,
+                            bytes=site.get("size_progress_bytes", 0),
+                            total=site.get("size_estimated_bytes", 0),
+                        )
+                    if not finished:
+                        events.emit(
+                            "spread.progress",
+                            release=spreadjob.release_name,
+                            status=data["status"],
+                            bytes=data.get("size_progress_bytes"),
+                            total_bytes=data.get("size_estimated_bytes"),
+                        )
+                        continue
+                    running.remove(spreadjob)
+                    statuses: dict[str, ActionStatus] = {
+                        dst_site.id: "DONE"
+                        if states[job_ids[spreadjob.release_name, dst_site.id]].status == "DONE"
+                        else "ABORTED"
+                        if data["status"] == "ABORTED"
+                        else "FAILED"
+                        for dst_site in spreadjob.dst_sites
+                    }
+                    events.emit(
+                        "spread.finished", release=spreadjob.release_name, status=data["status"], sites=statuses
+                    )
+                    for dst_site in spreadjob.dst_sites:
+                        status = statuses[dst_site.id]
+                        self._journal_finished(Action("fxp", spreadjob.release_name, dst_site.id), status)
+                        if status != "DONE":
+                            failed.setdefault(spreadjob.release_name, []).append(dst_site)
+                display.update(states)
+                if running:
+                    sleep(2)
+        except KeyboardInterrupt:
+            display.close()
+            abort = click.confirm("Do you want to abort all running spread jobs?")
             if abort:
-                self.log.info("Aborted running transfer jobs")
+                self.abort_spreadjobs(running)
             raise
+        display.close()
+        return failed
+
+    def abort_spreadjobs(self, spreadjobs: Iterable[SpreadJob], workers: int = ABORT_WORKERS) -> dict[str, Exception]:
+        """Abort spread jobs concurrently.
+
+        The destinations of aborted jobs are recorded as such in the journal, if any.
+
+        Args:
+            spreadjobs: The spread jobs, as returned by `spread` or `reattach_spread`.
+            workers: The maximum number of jobs aborted concurrently.
+
+        Returns:
+            The error raised for each release whose spread job couldn't be aborted.
+        """
+        spreadjobs = list(spreadjobs)
+        if not spreadjobs:
+            return {}
+
+        def abort(spreadjob: SpreadJob) -> Exception | None:
+            try:
+                spreadjob.client.abort_spreadjob(spreadjob.release_name)
+            except RequestException as e:
+                return e
+            return None
+
+        failed = {}
+        with profiler.phase("abort"), concurrent.futures.ThreadPoolExecutor(min(workers, len(spreadjobs))) as executor:
+            for spreadjob, error in zip(spreadjobs, executor.map(abort, spreadjobs)):
+                if error is not None:
+                    self.log.error("Couldn't abort the spread job of %s: %s", spreadjob.release_name, error)
+                    failed[spreadjob.release_name] = error
+                    continue
+                events.emit("spread.aborted", release=spreadjob.release_name)
+                for dst_site in spreadjob.dst_sites:
+                    self._journal_finished(Action("fxp", spreadjob.release_name, dst_site.id), "ABORTED")
+        self.log.info("Aborted %d of %d spread jobs", len(spreadjobs) - len(failed), len(spreadjobs))
+        return failed
+
+    def record_transfer(self, transferjob: dict[str, Any], duration: float) -> None:
+        """Record a finished transfer job, to be used in speed estimations, in the transfer history and in the journal.
+
+        Args:
+            transferjob: The last transfer job data returned by the CBFTP instance.
+            duration: The measured duration of the job, used if the CBFTP instance didn't report it.
+        """
+        _, duration, speed = transfer_speed(transferjob, duration)
+        if transferjob["status"] == "DONE":
+            route = (transferjob.get("src_site") or LOCAL_SITE, transferjob["dst_site"])
+            self._live_speeds.setdefault(route, []).append(speed)
+        events.emit(
+            "job.finished",
+            job_id=transferjob["id"],
+            status=transferjob["status"],
+            bytes=transferjob.get("size_progress_bytes"),
+            duration=duration,
+        )
+        action = self._journaled.pop(transferjob["id"], None)
+        if action is not None:
+            self._journal_finished(action, transferjob["status"])
+        if self.history is not None:
+            self.history.record(transferjob.get("cbftp") or self.cbftp.name, transferjob, duration)
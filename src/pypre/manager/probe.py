@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import concurrent.futures
+import logging
+from time import monotonic, time
+
+from requests import RequestException
+
+from pypre.cbftp import CBFTP
+from pypre.storage import ProbeCache, ProbeResult
+from pypre.utils.profiling import profiler
+from pypre.utils.progress import FINISHED_STATUSES
+
+log = logging.getLogger("pypre.probe")
+
+
+def probe_cbftp(cbftp: CBFTP) -> ProbeResult:
+    """Measure the API latency and the number of running transfer jobs of a CBFTP instance.
+
+    Args:
+        cbftp: The CBFTP client instance to probe.
+
+    Returns:
+        The probe result.
+    """
+    started = monotonic()
+    online = cbftp.online
+    latency = monotonic() - started
+    if not online:
+        return ProbeResult(cbftp=cbftp.name, online=False, latency=None, running_jobs=None, probed_at=time())
+
+    try:
+        transferjobs = cbftp.get_transferjobs()
+    except (RequestException, ValueError) as e:
+        log.debug("Couldn't get the transfer jobs of %s: %s", cbftp.name, e)
+        running_jobs = None
+    else:
+        running_jobs = sum(transferjob.get("status") not in FINISHED_STATUSES for transferjob in transferjobs)
+    return ProbeResult(cbftp=cbftp.name, online=True, latency=latency, running_jobs=running_jobs, probed_at=time())
+
+
+@profiler.timed("cbftp.probe")
+def probe_cbftps(cbftps: list[CBFTP], cache: ProbeCache | None = None) -> dict[str, ProbeResult]:
+    """Probe the CBFTP instances in parallel, reusing the fresh cached results if any.
+
+    Args:
+        cbftps: The CBFTP client instances to probe.
+        cache: The cache in which probe results are looked up and stored.
+
+    Returns:
+        The probe results, keyed by CBFTP instance name.
+    """
+    results = cache.load() if cache is not None else {}
+    to_probe = [cbftp for cbftp in cbftps if cbftp.name not in results]
+    if to_probe:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(to_probe)) as executor:
+            probed = list(executor.map(probe_cbftp, to_probe))
+        if cache is not None:
+            cache.save(probed)
+        results.update((result.cbftp, result) for result in probed)
+    return {cbftp.name: results[cbftp.name] for cbftp in cbftps}
+
+
+def rank_cbftps(cbftps: list[CBFTP], results: dict[str, ProbeResult]) -> list[CBFTP]:
+    """Sort the online CBFTP instances from the least to the most loaded one.
+
+    Instances with the same number of running transfer jobs are sorted by latency. Instances for which
+    the number of running transfer jobs is unknown are ranked last.
+
+    Args:
+        cbftps: The CBFTP client instances to rank.
+        results: The probe results, keyed by CBFTP instance name.
+
+    Returns:
+        The sorted online instances.
+    """
+
+    def key(cbftp: CBFTP) -> tuple[bool, int, float]:
+        result = results[cbftp.name]
+        return result.running_jobs is None, result.running_jobs or 0, result.latency or 0.0
+
+    return sorted((cbftp for cbftp in cbftps if results[cbftp.name].online), key=key)
+
+
+def select_cbftp(cbftps: list[CBFTP], cache: ProbeCache | None = None) -> CBFTP:
+    """Select the healthiest and least loaded CBFTP instance.
+
+    Instances selected from cached probe results are checked to be still online, falling back to
+    the next instance otherwise.
+
+    Args:
+        cbftps: The candidate CBFTP client instances.
+        cache: The cache in which probe results are looked up and stored.
+
+    Returns:
+        The selected CBFTP client instance.
+
+    Raises:
+        SystemExit: If none of the instances are reachable.
+    """
+    cached = set(cache.load()) if cache is not None else set()
+    results = probe_cbftps(cbftps, cache)
+    for cbftp in cbftps:
+        if not results[cbftp.name].online:
+            log.warning("The CBFTP server %r is not reachable.", cbftp.name)
+
+    for cbftp in rank_cbftps(cbftps, results):
+        result = results[cbftp.name]
+        if cbftp.name in cached and not cbftp.online:
+            log.warning("The CBFTP server %r is not reachable anymore, trying the next one.", cbftp.name)
+            if cache is not None:
+                cache.save(
+                    [ProbeResult(cbftp=cbftp.name, online=False, latency=None, running_jobs=None, probed_at=time())]
+                )
+            continue
+        log.info(
+            "Using CBFTP server %r (%s running transfer jobs, %.0f ms latency).",
+            cbftp.name,
+            "unknown" if result.running_jobs is None else result.running_jobs,
+            (result.latency or 0.0) * 1000,
+        )
+        return cbftp
+
+    log.critical("None of the CBFTP servers are reachable.")
+    raise SystemExit()
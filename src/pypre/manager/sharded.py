@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import concurrent.futures
+import itertools
+import re
+import threading
+from collections import Counter
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+from pypre.cbftp import CBFTP
+from pypre.manager.manager import ABORT_WORKERS, CBFTPManager, ProgressMode, SpreadJob
+from pypre.objects.site import Site
+from pypre.storage import GroupDirCache, TransferHistory
+from pypre.utils.profiling import profiler
+
+
+class ShardedCBFTPManager(CBFTPManager):
+    """Manager spreading operations across several CBFTP instances.
+
+    Each operation is routed to an instance having all the involved sites. If several instances
+    qualify, the one with the fewest running transfer and spread jobs submitted by this manager is used.
+    Transfer jobs are exposed with IDs unique across instances, so that their progress can be displayed
+    in a single view.
+
+    Args:
+        cbftps: The CBFTP client instances to use. Unreachable instances are ignored.
+        history: The history in which finished transfer jobs are recorded.
+        group_dirs: The cache in which the group directories listed on each site are stored.
+        progress: How to display the transfer progress.
+        sections: The configured sections, used to render the pre commands.
+    """
+
+    def __init__(
+        self,
+        cbftps: list[CBFTP],
+        history: TransferHistory | None = None,
+        group_dirs: GroupDirCache | None = None,
+        progress: ProgressMode = "auto",
+        sections: Sequence[tuple[str, re.Pattern[str]]] = (),
+    ) -> None:
+        self.cbftps = cbftps
+        self._sites: dict[str, set[str]] = {}
+        self._load: Counter[str] = Counter()
+        self._jobs: dict[int, tuple[CBFTP, int]] = {}
+        self._ids: dict[tuple[str, int], int] = {}
+        self._running: set[int] = set()
+        self._spreads: set[tuple[str, str]] = set()
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        super().__init__(cbftps[0], history=history, group_dirs=group_dirs, progress=progress, sections=sections)
+
+    def _check_online(self) -> None:
+        with profiler.phase("cbftp.online"), concurrent.futures.ThreadPoolExecutor(len(self.cbftps)) as executor:
+            online = dict(zip(self.cbftps, executor.map(lambda cbftp: cbftp.online, self.cbftps)))
+        for cbftp, is_online in online.items():
+            if not is_online:
+                self.log.warning("The CBFTP server %r is not reachable, and will not be used.", cbftp.name)
+        self.cbftps = [cbftp for cbftp, is_online in online.items() if is_online]
+        if not self.cbftps:
+            self.log.critical("None of the CBFTP servers are reachable.")
+            raise SystemExit()
+        self.cbftp = self.cbftps[0]
+
+        with concurrent.futures.ThreadPoolExecutor(len(self.cbftps)) as executor:
+            sites = executor.map(lambda cbftp: cbftp.get_sites(), self.cbftps)
+        self._sites = {cbftp.name: set(cbftp_sites) for cbftp, cbftp_sites in zip(self.cbftps, sites)}
+
+    def _client(self, *sites: Site) -> CBFTP:
+        candidates = [cbftp for cbftp in self.cbftps if all(site.id in self._sites[cbftp.name] for site in sites)]
+        if not candidates:
+            raise ValueError(f"No CBFTP server has all of the sites: {', '.join(site.id for site in sites)}")
+        with self._lock:
+            return min(candidates, key=lambda cbftp: self._load[cbftp.name])
+
+    def _register_job(self, client: CBFTP, transfer_data: dict[str, Any]) -> dict[str, Any]:
+        with self._lock:
+            job_id = self._job_id(client, transfer_data["id"])
+            if job_id not in self._running:
+                self._running.add(job_id)
+                self._load[client.name] += 1
+        return {**transfer_data, "id": job_id, "cbftp": client.name}
+
+    def _job_id(self, client: CBFTP, cbftp_job_id: int) -> int:
+        """Return the ID exposing a transfer job of an instance, the same for every call. Must be called with the
+        lock held."""
+        job_id = self._ids.get((client.name, cbftp_job_id))
+        if job_id is None:
+            job_id = self._ids[client.name, cbftp_job_id] = next(self._job_ids)
+            self._jobs[job_id] = (client, cbftp_job_id)
+        return job_id
+
+    def _job_finished(self, job_id: int) -> None:
+        """Stop counting a transfer job in the load of its instance."""
+        with self._lock:
+            if job_id in self._running:
+                self._running.remove(job_id)
+                self._load[self._jobs[job_id][0].name] -= 1
+
+    def get_sites(self, **kwargs: Any) -> list[str]:
+        """Get the sites available on any of the CBFTP instances.
+
+        Args:
+            **kwargs: kwargs to be passed to the CBFTP clients.
+
+        Returns:
+            The list of the site string IDs.
+        """
+        return sorted(set().union(*self._sites.values()))
+
+    def job_origin(self, job_id: int) -> tuple[str, int]:
+        client, cbftp_job_id = self._jobs[job_id]
+        return client.name, cbftp_job_id
+
+    def spread(self, release_name: str, src_sites: list[Site], dst_sites: list[Site]) -> SpreadJob:
+        spreadjob = super().spread(release_name, src_sites, dst_sites)
+        with self._lock:
+            self._spreads.add((spreadjob.client.name, release_name))
+            self._load[spreadjob.client.name] += 1
+        return spreadjob
+
+    def _spreads_finished(self, spreadjobs: Iterable[SpreadJob]) -> None:
+        """Stop counting spread jobs in the load of their instance."""
+        with self._lock:
+            for spreadjob in spreadjobs:
+                if (spreadjob.client.name, spreadjob.release_name) in self._spreads:
+                    self._spreads.remove((spreadjob.client.name, spreadjob.release_name))
+                    self._load[spreadjob.client.name] -= 1
+
+    def wait_spreadjobs(self, spreadjobs: list[SpreadJob]) -> dict[str, list[Site]]:
+        failed = super().wait_spreadjobs(spreadjobs)
+        self._spreads_finished(spreadjobs)
+        return failed
+
+    def abort_spreadjobs(self, spreadjobs: Iterable[SpreadJob], workers: int = ABORT_WORKERS) -> dict[str, Exception]:
+        spreadjobs = list(spreadjobs)
+        failed = super().abort_spreadjobs(spreadjobs, workers)
+        self._spreads_finished(spreadjob for spreadjob in spreadjobs if spreadjob.release_name not in failed)
+        return failed
+
+    def _cbftp_named(self, cbftp: str) -> CBFTP:
+        for client in self.cbftps:
+            if client.name == cbftp:
+                return client
+        raise ValueError(f"The CBFTP server {cbftp!r} is not in use.")
+
+    def attach_transferjob(self, cbftp: str, cbftp_job_id: int) -> int:
+        client = self._cbftp_named(cbftp)
+        with self._lock:
+            return self._job_id(client, cbftp_job_id)
+
+    def get_transferjobs(self) -> list[dict[str, Any]]:
+        with concurrent.futures.ThreadPoolExecutor(len(self.cbftps)) as executor:
+            transferjobs = list(executor.map(lambda cbftp: cbftp.get_transferjobs(), self.cbftps))
+        # The jobs not submitted by this manager are exposed without being counted in the load of their instance
+        with self._lock:
+            return [
+                {**transferjob, "id": self._job_id(client, transferjob["id"]), "cbftp": client.name}
+                for client, client_transferjobs in zip(self.cbftps, transferjobs)
+                for transferjob in client_transferjobs
+            ]
+
+    def get_transferjob(self, job_id: int) -> dict[str, Any]:
+        client, cbftp_job_id = self._jobs[job_id]
+        return {**client.get_transferjob(id=cbftp_job_id), "id": job_id, "cbftp": client.name}
+
+    def abort_transferjob(self, job_id: int) -> None:
+        client, cbftp_job_id = self._jobs[job_id]
+        client.abort_transferjob(id=cbftp_job_id)
+        self._job_finished(job_id)
+
+    def record_transfer(self, transferjob: dict[str, Any], duration: float) -> None:
+        super().record_transfer(transferjob, duration)
+        self._job_finished(transferjob["id"])
@@ -1,6 +1,13 @@
 from __future__ import annotations
 
-from pydantic import BaseModel, field_validator
+import re
+from collections.abc import Collection, Iterable, Iterator
+from functools import cached_property
+from pathlib import PurePosixPath
+
+from pydantic import BaseModel, Field, field_validator
+
+from pypre.utils.profiling import profiler
 
 
 class DirConfig(BaseModel):
@@ -19,6 +26,49 @@ class DirConfig(BaseModel):
     """A mapping used to determine group directory from the group tag."""
 
 
+class GroupDirIndex(Collection[str]):
+    """The group directories available on a site, indexed for constant time lookups.
+
+    Args:
+        group_dirs: The names of the group directories.
+    """
+
+    def __init__(self, group_dirs: Iterable[str]) -> None:
+        self._names: set[str] = set()
+        self._folded: dict[str, str] = {}
+        for name in group_dirs:
+            self._names.add(name)
+            self._folded.setdefault(name.lower(), name)
+
+    def get(self, name: str) -> str | None:
+        """Return the group directory with the provided name, compared case insensitively if not found as is.
+
+        Args:
+            name: The name of the group directory.
+
+        Returns:
+            The name of the group directory as listed on site, or `None` if it doesn't exist.
+        """
+        if name in self._names:
+            return name
+        return self._folded.get(name.lower())
+
+    def __contains__(self, name: object) -> bool:
+        return isinstance(name, str) and self.get(name) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+def _strip_int(group_dir: str | None) -> str | None:
+    if group_dir is not None and group_dir.lower().endswith("_int"):
+        return group_dir[:-4]
+    return group_dir
+
+
 class Site(BaseModel):
     """Site configuration."""
 
@@ -37,6 +87,9 @@ class Site(BaseModel):
     sections_config: dict[str, str] = {}
     """Sections configuration."""
 
+    max_outbound: int | None = Field(default=None, ge=1)
+    """Maximum number of simultaneous outbound copies from this site, when distributing releases as a tree."""
+
     @field_validator("groups_dir")
     @classmethod
     def starts_with_slash(cls, v: str) -> str:
@@ -54,9 +107,21 @@ class Site(BaseModel):
     def __hash__(self) -> int:
         return hash(self.id)
 
+    @cached_property
+    def _group_map(self) -> dict[str, str]:
+        """The group map of the directory configuration, keyed by lowercase group tag."""
+        return {tag.lower(): group for tag, group in (self.dir_config.group_map or {}).items()}
+
+    @cached_property
+    def _default_group_dir(self) -> str | None:
+        """The default group directory, without its `_INT` suffix."""
+        return _strip_int(self.dir_config.default)
+
     def get_group_dir(self, release_name: str) -> tuple[str | None, str | None]:
         """Determine the group directory from the release name.
 
+        Group tags are matched case insensitively against the group map.
+
         Args:
             release_name: The release name to use when determining group directory.
 
@@ -75,18 +140,68 @@ class Site(BaseModel):
         elif self.dir_config.match_group:
             return (release_tag, default)
         elif self.dir_config.group_map:
-            group = self.dir_config.group_map.get(release_tag)
+            group = self._group_map.get(release_tag.lower())
             if group is None and default is None:
                 raise ValueError("Couldn't find any matching group, and no default value was provided.")
             return (group, default)
         else:
             raise ValueError("Invalid site configuration.")
 
-    def get_section(self, release_name: str) -> str:
+    def get_dst_path(self, release_name: str, site_group_dirs: Collection[str]) -> PurePosixPath:
+        """Determine the path of the group directory the release is located in.
+
+        The `_INT` suffix of group directories is ignored, and the directories available on site are matched
+        case insensitively if not found as is.
+
+        Args:
+            release_name: The release name to use when determining group directory.
+            site_group_dirs: The group directories available on site. Pass a `GroupDirIndex` to avoid indexing
+                them on each call.
+
+        Returns:
+            The path of the group directory.
+
+        Raises:
+            ValueError: No existing group directory could be found, or site configuration is invalid.
+        """
+        if not isinstance(site_group_dirs, GroupDirIndex):
+            site_group_dirs = GroupDirIndex(site_group_dirs)
+        group_dir, _ = self.get_group_dir(release_name)
+        group_dir = _strip_int(group_dir)
+
+        found = site_group_dirs.get(group_dir) if group_dir is not None else None
+        if found is None:
+            default_group_dir = self._default_group_dir
+            if default_group_dir is None:
+                raise ValueError("No group directory matching and no default one provided.")
+            found = site_group_dirs.get(default_group_dir)
+            if found is None:
+                raise ValueError(f"{default_group_dir} does not exist.")
+
+        return PurePosixPath(self.groups_dir, found)
+
+    def get_pre_command(self, release_name: str, sections: Iterable[tuple[str, re.Pattern[str]]]) -> str:
+        """Render the pre command of the release.
+
+        Args:
+            release_name: The release name to pre.
+            sections: The configured sections, as (name, pattern) pairs matched in order.
+
+        Returns:
+            The pre command.
+
+        Raises:
+            ValueError: If no matching section could be found for this release name.
+        """
+        return self.pre_command.format(release=release_name, section=self.get_section(release_name, sections))
+
+    @profiler.timed("plan.section")
+    def get_section(self, release_name: str, sections: Iterable[tuple[str, re.Pattern[str]]]) -> str:
         """Get site section.
 
         Args:
             release_name: The release name to use to determine section.
+            sections: The configured sections, as (name, pattern) pairs matched in order.
 
         Returns:
             The section string representation for this site.
@@ -94,9 +209,7 @@ class Site(BaseModel):
         Raises:
             ValueError: If no matching section could be found for this release name.
         """
-        from pypre.config import config
-
-        for section, regex in config.sections:
+        for section, regex in sections:
             if regex.match(release_name):
                 return self.sections_config.get(section, section)
         raise ValueError(f"Couldn't find any matching section for {release_name}")
@@ -0,0 +1,5 @@
+__all__ = ("fxp_releases", "fxp_releases_spread", "fxp_releases_tree", "pre_releases", "upload_releases")
+
+from pypre.operations.fxp import fxp_releases, fxp_releases_spread, fxp_releases_tree
+from pypre.operations.pre import pre_releases
+from pypre.operations.upload import upload_releases
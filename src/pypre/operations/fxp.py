@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import logging
+
+from requests import HTTPError
+
+from pypre.manager import CBFTPManager, SpreadJob, TreeDistribution
+from pypre.objects.site import Site
+from pypre.storage import Action, Batch
+
+
+def fxp_releases(
+    manager: CBFTPManager,
+    releases: list[str],
+    src_sites: list[Site],
+    dst_sites: list[Site],
+    *,
+    wait: bool,
+    check: bool,
+    batch: Batch | None = None,
+) -> None:
+    """FXP releases to the provided sites.
+
+    The presence of every release is verified on the source sites before submitting anything, listing each
+    source group directory once. Releases missing on all the sources are skipped. If several source sites
+    have a release, they are ranked for each destination by their measured speed, falling back to the
+    next one if the transfer job could not be created. A transfer job failing once submitted isn't retried
+    from another source. Releases missing on all the sources, or that couldn't be submitted from any of them,
+    are journaled as failed.
+
+    If a batch is provided, the copies it already journaled as done are skipped, and the ones still
+    running are waited for instead of being submitted again.
+    """
+    log = logging.getLogger("pypre.fxp")
+
+    states = batch.states() if batch is not None else {}
+    if batch is not None:
+        batch.planned(
+            action
+            for dst_site in dst_sites
+            for release in releases
+            if (action := Action("fxp", release, dst_site.id)) not in states
+        )
+
+    available = manager.verify_sources(releases, src_sites)
+    for release, holders in available.items():
+        if not holders:
+            log.error("%s is missing on all the source sites, and will be skipped.", release)
+
+    upload_jobs = []
+    for dst_site in dst_sites:
+        ranked_sources = manager.rank_sources(dst_site, src_sites)
+        for release in releases:
+            action = Action("fxp", release, dst_site.id)
+            previous = states.get(action)
+            if previous is not None and previous.status == "DONE":
+                log.info("%s was already transferred to %s, skipping.", release, dst_site.id)
+                continue
+            transfer_data = manager.reattach(action, previous) if previous is not None else None
+            if transfer_data is not None:
+                log.info("%s is already being transferred to %s (%s).", release, dst_site.id, transfer_data["status"])
+                if transfer_data["status"] != "DONE":
+                    upload_jobs.append(transfer_data["id"])
+                continue
+            holder_ids = {holder.id for holder in available[release]}
+            sources = [src_site for src_site in ranked_sources if src_site.id in holder_ids]
+            if not _fxp_release(manager, release, sources, dst_site, upload_jobs):
+                # Releases missing on all the sources were already reported
+                if sources:
+                    log.error("Couldn't FXP %s to %s from any of the source sites.", release, dst_site.id)
+                if batch is not None:
+                    batch.finished(action, "FAILED")
+
+    if wait:
+        manager.show_transfer_progress(upload_jobs)
+    if check:
+        _check_releases(manager, releases, dst_sites)
+
+
+def fxp_releases_tree(
+    manager: CBFTPManager,
+    releases: list[str],
+    src_sites: list[Site],
+    dst_sites: list[Site],
+    *,
+    max_outbound: int,
+    check: bool,
+    batch: Batch | None = None,
+) -> None:
+    """FXP releases to the provided sites, using the sites that completed a release as additional sources.
+
+    If a batch is provided, the destinations it already journaled as done are used as sources, and the
+    copies still running are waited for instead of being submitted again. The destinations a release couldn't
+    be copied to are journaled as failed.
+    """
+    log = logging.getLogger("pypre.fxp")
+
+    distribution = TreeDistribution(manager, src_sites=src_sites, dst_sites=dst_sites, max_outbound=max_outbound)
+
+    states = batch.states() if batch is not None else {}
+    if batch is not None:
+        batch.planned(
+            action
+            for dst_site in dst_sites
+            for release in releases
+            if (action := Action("fxp", release, dst_site.id)) not in states
+        )
+    release_set = set(releases)
+    sites = {site.id: site for site in [*src_sites, *dst_sites]}
+    dst_ids = {dst_site.id for dst_site in dst_sites}
+    for action, previous in states.items():
+        if action.release not in release_set or action.site not in dst_ids:
+            continue
+        dst_site = sites[action.site]
+        if previous.status == "DONE":
+            log.info("%s was already transferred to %s, skipping.", action.release, action.site)
+            distribution.completed(action.release, dst_site)
+            continue
+        transfer_data = manager.reattach(action, previous)
+        if transfer_data is None:
+            continue
+        if transfer_data["status"] == "DONE":
+            distribution.completed(action.release, dst_site)
+        else:
+            log.info("%s is already being transferred to %s.", action.release, action.site)
+            src_site_id = previous.src_site or transfer_data["src_site"]
+            distribution.attach(transfer_data["id"], action.release, src_site_id, dst_site)
+
+    failed = distribution.run(releases)
+    for release, failed_sites in failed.items():
+        log.error("%s couldn't be transferred to %s", release, ", ".join(site.id for site in failed_sites))
+        if batch is not None:
+            for dst_site in failed_sites:
+                batch.finished(Action("fxp", release, dst_site.id), "FAILED")
+
+    if check:
+        _check_releases(manager, releases, dst_sites)
+
+
+def fxp_releases_spread(
+    manager: CBFTPManager,
+    releases: list[str],
+    src_sites: list[Site],
+    dst_sites: list[Site],
+    *,
+    wait: bool,
+    check: bool,
+    batch: Batch | None = None,
+) -> None:
+    """FXP releases to the provided sites, using one CBFTP spread job per release covering all the destinations.
+
+    The presence of every release is verified on the source sites first, and the sources having a release
+    are only downloaded from. CBFTP takes care of the fan-out, using the destinations as sources for each
+    other.
+
+    If a batch is provided, the destinations it already journaled as done are skipped, and the spread jobs
+    still running are waited for instead of being created again.
+    """
+    log = logging.getLogger("pypre.fxp")
+
+    states = batch.states() if batch is not None else {}
+    if batch is not None:
+        batch.planned(
+            action
+            for dst_site in dst_sites
+            for release in releases
+            if (action := Action("fxp", release, dst_site.id)) not in states
+        )
+
+    available = manager.verify_sources(releases, src_sites)
+    spreadjobs: list[SpreadJob] = []
+    for release in releases:
+        pending = []
+        for dst_site in dst_sites:
+            previous = states.get(Action("fxp", release, dst_site.id))
+            if previous is not None and previous.status == "DONE":
+                log.info("%s was already transferred to %s, skipping.", release, dst_site.id)
+            else:
+                pending.append(dst_site)
+        if not pending:
+            continue
+
+        submitted = [
+            previous.cbftp
+            for dst_site in pending
+            if (previous := states.get(Action("fxp", release, dst_site.id))) is not None
+            and previous.status == "SUBMITTED"
+            and previous.cbftp is not None
+            and previous.job_id is None
+        ]
+        spreadjob = manager.reattach_spread(release, submitted[0], pending) if submitted else None
+        if spreadjob is not None:
+            log.info("%s is already being spread to %s.", release, ", ".join(site.id for site in pending))
+            spreadjobs.append(spreadjob)
+            continue
+
+        failure = None
+        if not available[release]:
+            failure = "missing on all the source sites"
+        else:
+            try:
+                log.info(
+                    "Spreading %s from %s to %s...",
+                    release,
+                    ", ".join(site.id for site in available[release]),
+                    ", ".join(site.id for site in pending),
+                )
+                spreadjobs.append(manager.spread(release, available[release], pending))
+            except (HTTPError, ValueError) as e:
+                failure = str(e)
+        if failure is not None:
+            log.error("Couldn't spread %s: %s", release, failure)
+            if batch is not None:
+                for dst_site in pending:
+                    batch.finished(Action("fxp", release, dst_site.id), "FAILED")
+
+    if wait:
+        failed = manager.wait_spreadjobs(spreadjobs)
+        for release, failed_sites in failed.items():
+            log.error("%s couldn't be spread to %s", release, ", ".join(site.id for site in failed_sites))
+    if check:
+        _check_releases(manager, releases, dst_sites)
+
+
+def _fxp_release(
+    manager: CBFTPManager,
+    release: str,
+    src_sites: list[Site],
+    dst_site: Site,
+    upload_jobs: list[int],
+) -> bool:
+    log = logging.getLogger("pypre.fxp")
+
+    for src_site in src_sites:
+        try:
+            log.info("FXP %s from %s to %s...", release, src_site.id, dst_site.id)
+            transfer_data = manager.fxp(src_site=src_site, dst_site=dst_site, release_name=release)
+        except (HTTPError, ValueError) as e:
+            log.warning("Couldn't FXP %s from %s to %s: %s", release, src_site.id, dst_site.id, e)
+            continue
+        upload_jobs.append(transfer_data["id"])
+        return True
+    return False
+
+
+def _check_releases(manager: CBFTPManager, releases: list[str], dst_sites: list[Site]) -> None:
+    log = logging.getLogger("pypre.fxp")
+
+    for dst_site in dst_sites:
+        for release in releases:
+            if manager.check(release, dst_site):
+                log.info("%s is complete on %s", release, dst_site.id)
+            else:
+                log.warning("%s is incomplete on %s", release, dst_site.id)
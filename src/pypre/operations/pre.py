@@ -0,0 +1,355 @@
+from __future__ import annotations
+
+import concurrent.futures
+import functools
+import logging
+from collections import Counter
+from datetime import datetime
+from time import monotonic, sleep, time
+
+from pypre.manager import CBFTPManager, PendingPre, PreparedPre, PreResult
+from pypre.objects.site import Site
+from pypre.storage import Action, ActionState, Batch
+from pypre.utils.events import events
+from pypre.utils.profiling import profiler
+
+WARM_UP_LEAD = 2.0
+"""Number of seconds before a scheduled pre at which the connections to CBFTP are warmed up."""
+
+WARM_UP_MIN_WAIT = 10.0
+"""Minimum wait before a scheduled pre for the connections to be warmed up again."""
+
+PRE_RETRIES = 3
+"""Default number of times a pre is retried on the sites it failed on."""
+
+PRE_COLLECTORS = 8
+"""Maximum number of threads collecting the results of asynchronous pres and retrying failed ones."""
+
+PRE_RETRY_BACKOFF = 1.0
+"""Number of seconds before the first retry of the sites a pre failed on, doubled after each attempt."""
+
+PRE_RETRY_MAX_BACKOFF = 30.0
+"""Maximum number of seconds between two attempts to pre a release on the sites it failed on."""
+
+RESUMED_RESULT_TIMEOUT = 5.0
+"""Maximum number of seconds to wait for the results of the pres an interrupted batch sent asynchronously."""
+
+_COARSE_SLEEP = 0.5
+"""Longest single sleep while waiting for a pre, so that wall clock changes are noticed."""
+
+
+def pre_releases(
+    manager: CBFTPManager,
+    releases: list[str],
+    sites: list[Site],
+    cooldown: float,
+    *,
+    batch: Batch | None = None,
+    at: float | None = None,
+    fixed_rate: bool = False,
+    async_: bool = False,
+    retries: int = PRE_RETRIES,
+) -> dict[str, dict[str, str]]:
+    """Pre releases to the provided sites.
+
+    The commands and paths of every release are resolved beforehand. Pres are then fired on deadlines
+    computed from a monotonic clock: with `fixed_rate`, the n-th pre is due `n * cooldown` seconds after
+    the first one, so that the time taken by each pre doesn't accumulate; otherwise each pre is due
+    `cooldown` seconds after the previous one finished.
+
+    With `async_`, pres are sent without waiting for the sites to answer, and their results are collected
+    by background threads while the next pres are sent.
+
+    The sites CBFTP reported a pre as failed on are retried in the background, with an exponential backoff,
+    while the next releases are pred, so a retried pre may reach a site after the next releases: the pre order
+    is only kept on the sites that didn't fail. Sites that succeeded are never pred again, nor are the sites
+    whose outcome is unknown, because their request failed or wasn't answered, as the pre may have happened
+    on them. A summary of each site is logged once all the pres are done.
+
+    If a batch is provided, the sites it already journaled as pred are skipped for each release. The results
+    of the pres it journaled as sent asynchronously are collected, and only the sites they failed on are pred
+    again. The other sites it journaled as sent are never pred again, as the pre may have happened on them:
+    they are reported as failed instead, to be checked manually.
+
+    Args:
+        manager: The CBFTP manager.
+        releases: The names of the releases to pre, in order.
+        sites: The sites to pre to.
+        cooldown: The number of seconds between each pre.
+        batch: The batch journaling the pres, if any.
+        at: The UNIX timestamp at which to fire the first pre, if not immediately.
+        fixed_rate: Schedule pres at a fixed rate, instead of with a fixed delay.
+        async_: Send the pres asynchronously.
+        retries: The number of times a pre is retried on the sites it failed on.
+
+    Returns:
+        The failure reason of each site each release couldn't be pred on, or whose outcome is unknown.
+
+    Raises:
+        ValueError: The pre of a release couldn't be resolved on a site. Nothing is pred in this case.
+    """
+    log = logging.getLogger("pypre.pre")
+
+    states = batch.states() if batch is not None else {}
+    if batch is not None:
+        batch.planned(
+            action
+            for release_name in releases
+            for site in sites
+            if (action := Action("pre", release_name, site.id)) not in states
+        )
+
+    with profiler.phase("plan.pre"):
+        schedule, unknown, summary = _plan(manager, releases, sites, states)
+    if not schedule:
+        _log_summary(summary, unknown)
+        return unknown
+
+    if at is not None:
+        log.info("First pre scheduled at %s", datetime.fromtimestamp(at))
+        start = _wait_until_wall(at, manager, [prepared.site for prepared in schedule[0][1]])
+    else:
+        start = monotonic()
+        at = time()
+
+    collector = concurrent.futures.ThreadPoolExecutor(min(len(schedule), PRE_COLLECTORS), "pypre-pre")
+    collecting: dict[str, concurrent.futures.Future[dict[str, str]]] = {}
+    deadline = start
+    try:
+        for index, (release_name, prepared) in enumerate(schedule):
+            if index:
+                deadline = start + index * cooldown if fixed_rate else monotonic() + cooldown
+                _wait_until(deadline, manager, [item.site for item in prepared])
+
+            # The fire time is taken once the pre is journaled, right before it is sent
+            fired = functools.partial(_fired, release_name, at + deadline - start, deadline)
+            if async_:
+                pending = manager.send_pre(release_name, prepared, on_send=fired)
+                collecting[release_name] = collector.submit(
+                    _collect_and_retry, manager, release_name, prepared, pending, retries
+                )
+            else:
+                result = manager.submit_pre(release_name, prepared, on_send=fired)
+                if result.failures or result.unknown:
+                    collecting[release_name] = collector.submit(
+                        _retry_failed, manager, release_name, prepared, result, retries=retries, async_=async_
+                    )
+    finally:
+        collector.shutdown(wait=True)
+
+    failed = {release_name: future.result() for release_name, future in collecting.items()}
+    for release_name, reasons in unknown.items():
+        failed[release_name] = {**failed.get(release_name, {}), **reasons}
+    failed = {release_name: failures for release_name, failures in failed.items() if failures}
+    _log_summary(summary, failed)
+    return failed
+
+
+def _plan(
+    manager: CBFTPManager, releases: list[str], sites: list[Site], states: dict[Action, ActionState]
+) -> tuple[list[tuple[str, list[PreparedPre]]], dict[str, dict[str, str]], list[tuple[str, list[Site]]]]:
+    """Resolve the pres of each release on the sites it wasn't pred on yet.
+
+    The outcome of the pres sent by an interrupted batch is collected beforehand, and only the sites they
+    failed on are pred again.
+
+    Returns:
+        The resolved pres of each release to fire, the sites each release was already sent to without a known
+        outcome, and the sites of each release to report in the summary.
+
+    Raises:
+        ValueError: The pre of a release couldn't be resolved on a site.
+    """
+    log = logging.getLogger("pypre.pre")
+    schedule = []
+    unknown = {}
+    summary = []
+    for release_name in releases:
+        remaining = []
+        sent = []
+        for site in sites:
+            previous = states.get(Action("pre", release_name, site.id))
+            if previous is not None and previous.status == "DONE":
+                log.info("%s was already pred on %s, skipping.", release_name, site.id)
+            elif previous is not None and previous.status == "SUBMITTED":
+                sent.append(site)
+            else:
+                remaining.append(site)
+        try:
+            failed, reasons = _collect_sent(manager, release_name, sent, states) if sent else ([], {})
+            remaining.extend(failed)
+            if remaining:
+                schedule.append((release_name, manager.prepare_pre(release_name, remaining)))
+        except ValueError as e:
+            raise ValueError(f"Couldn't resolve the pre of {release_name}: {e}") from e
+        if reasons:
+            unknown[release_name] = reasons
+        if remaining or reasons:
+            summary.append((release_name, [*remaining, *(site for site in sent if site.id in reasons)]))
+    return schedule, unknown, summary
+
+
+def _collect_sent(
+    manager: CBFTPManager, release_name: str, sent: list[Site], states: dict[Action, ActionState]
+) -> tuple[list[Site], dict[str, str]]:
+    """Collect the outcome of a pre an interrupted batch sent to some sites.
+
+    Returns:
+        The sites the pre failed on, and the reason the outcome of the others is unknown.
+
+    Raises:
+        ValueError: The pre of the release couldn't be resolved on a site.
+    """
+    log = logging.getLogger("pypre.pre")
+    pending = manager.resume_pre(
+        release_name,
+        manager.prepare_pre(release_name, sent),
+        {site.id: states[Action("pre", release_name, site.id)] for site in sent},
+    )
+    result = manager.collect_pre(pending, RESUMED_RESULT_TIMEOUT)
+    for site in sent:
+        if site.id in result.unknown:
+            log.warning(
+                "%s was sent to %s by the interrupted batch, but its outcome is unknown, skipping: %s",
+                release_name,
+                site.id,
+                result.unknown[site.id],
+            )
+        elif site.id in result.failures:
+            log.info("%s failed on %s in the interrupted batch: %s", release_name, site.id, result.failures[site.id])
+        else:
+            log.info("%s was pred on %s by the interrupted batch, skipping.", release_name, site.id)
+    return [site for site in sent if site.id in result.failures], result.unknown
+
+
+def _collect_and_retry(
+    manager: CBFTPManager,
+    release_name: str,
+    prepared: list[PreparedPre],
+    pending: PendingPre,
+    retries: int,
+) -> dict[str, str]:
+    return _retry_failed(manager, release_name, prepared, manager.collect_pre(pending), retries=retries, async_=True)
+
+
+def _retry_failed(
+    manager: CBFTPManager,
+    release_name: str,
+    prepared: list[PreparedPre],
+    result: PreResult,
+    *,
+    retries: int,
+    async_: bool,
+) -> dict[str, str]:
+    """Pre a release again on the sites CBFTP reported it as failed on, with an exponential backoff, until it
+    succeeded on all of them or the retries are exhausted. The sites it succeeded on, and the sites whose
+    outcome is unknown, are never pred again.
+
+    Returns:
+        The failure reason of each site the release couldn't be pred on, or whose outcome is unknown.
+    """
+    log = logging.getLogger("pypre.pre")
+    failures = result.failures
+    unknown = dict(result.unknown)
+    for attempt in range(retries):
+        if not failures:
+            break
+        delay = min(PRE_RETRY_BACKOFF * 2**attempt, PRE_RETRY_MAX_BACKOFF)
+        for site_id, reason in failures.items():
+            log.warning("Couldn't pre %s on %s: %s", release_name, site_id, reason)
+        log.info("Retrying %s on %s in %.1fs (%d/%d)", release_name, ", ".join(failures), delay, attempt + 1, retries)
+        sleep(delay)
+
+        failed = [item for item in prepared if item.site.id in failures]
+        if async_:
+            result = manager.collect_pre(manager.send_pre(release_name, failed))
+        else:
+            result = manager.submit_pre(release_name, failed)
+        failures = result.failures
+        unknown.update(result.unknown)
+    for site_id, reason in failures.items():
+        log.error("Couldn't pre %s on %s: %s", release_name, site_id, reason)
+    for site_id, reason in unknown.items():
+        log.error("The outcome of the pre of %s on %s is unknown, not retrying it: %s", release_name, site_id, reason)
+    return {**failures, **unknown}
+
+
+def _log_summary(pred: list[tuple[str, list[Site]]], failed: dict[str, dict[str, str]]) -> None:
+    log = logging.getLogger("pypre.pre")
+    done: Counter[str] = Counter()
+    failed_releases: dict[str, list[str]] = {}
+    for release_name, sites in pred:
+        for site in sites:
+            if site.id in failed.get(release_name, {}):
+                failed_releases.setdefault(site.id, []).append(release_name)
+            else:
+                done[site.id] += 1
+    for site_id in sorted({site.id for _, sites in pred for site in sites}):
+        if site_id in failed_releases:
+            log.error(
+                "%s: %d pred, %d failed (%s)",
+                site_id,
+                done[site_id],
+                len(failed_releases[site_id]),
+                ", ".join(failed_releases[site_id]),
+            )
+        else:
+            log.info("%s: %d pred", site_id, done[site_id])
+
+
+def _fired(release_name: str, planned: float, deadline: float) -> None:
+    """Log and emit the time a pre is fired at, compared to the time it was planned at."""
+    delay = monotonic() - deadline
+    logging.getLogger("pypre.pre").info(
+        "Preing %s (planned at %s, fired at %s, %+.1f ms)",
+        release_name,
+        _format_time(planned),
+        _format_time(planned + delay),
+        delay * 1000,
+    )
+    events.emit("pre.fired", release=release_name, planned=planned, delay=delay)
+
+
+def _format_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%H:%M:%S.%f")[:-3]
+
+
+def _wait_until(deadline: float, manager: CBFTPManager, sites: list[Site]) -> None:
+    """Sleep until a monotonic deadline, warming up the connections to CBFTP shortly before if the wait is long.
+
+    Sleeping is done in steps, each one computed from the remaining time, so that oversleeping doesn't
+    accumulate.
+    """
+    if deadline - monotonic() >= WARM_UP_MIN_WAIT:
+        _sleep_until(deadline - WARM_UP_LEAD)
+        manager.warm_up(sites)
+    _sleep_until(deadline)
+
+
+def _sleep_until(deadline: float) -> None:
+    while (remaining := deadline - monotonic()) > 0:
+        sleep(min(remaining, _COARSE_SLEEP))
+
+
+def _wait_until_wall(at: float, manager: CBFTPManager, sites: list[Site]) -> float:
+    """Sleep until a UNIX timestamp, warming up the connections to CBFTP shortly before.
+
+    The wall clock is read again after each step, so that clock adjustments while waiting are taken into account.
+    The final approach uses the monotonic clock. The connections are not warmed up if the timestamp is too close
+    for the warm-up to finish before it.
+
+    Returns:
+        The monotonic deadline matching the timestamp.
+    """
+    while (remaining := at - time()) > WARM_UP_LEAD + _COARSE_SLEEP:
+        sleep(min(remaining - WARM_UP_LEAD, _COARSE_SLEEP))
+    deadline = monotonic() + remaining
+    if remaining <= 0:
+        logging.getLogger("pypre.pre").warning(
+            "The scheduled time %s has already passed, preing now.", datetime.fromtimestamp(at)
+        )
+    elif remaining > WARM_UP_LEAD:
+        _sleep_until(deadline - WARM_UP_LEAD)
+        manager.warm_up(sites)
+    _sleep_until(deadline)
+    return deadline
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import logging
+from collections.abc import Iterable
+from pathlib import Path
+
+from pypre.manager import CBFTPManager
+from pypre.objects.site import Site
+from pypre.storage import Action, Batch
+
+
+def upload_releases(
+    manager: CBFTPManager,
+    releases: list[Path],
+    sites: Iterable[Site],
+    batch: Batch | None = None,
+) -> dict[int, Path]:
+    """Upload releases to the provided sites.
+
+    If a batch is provided, the uploads it already journaled as done are skipped, and the ones still
+    running are waited for instead of being submitted again.
+
+    Returns:
+        The uploaded release of each running transfer job, keyed by job ID.
+    """
+    log = logging.getLogger("pypre.upload")
+
+    sites = list(sites)
+    states = batch.states() if batch is not None else {}
+    if batch is not None:
+        batch.planned(
+            action
+            for site in sites
+            for release in releases
+            if (action := Action("upload", release.name, site.id)) not in states
+        )
+
+    upload_jobs = {}
+    for site in sites:
+        for release in releases:
+            action = Action("upload", release.name, site.id)
+            previous = states.get(action)
+            if previous is not None and previous.status == "DONE":
+                log.info("%s was already uploaded to %s, skipping.", release, site.id)
+                continue
+            up_data = manager.reattach(action, previous) if previous is not None else None
+            if up_data is not None:
+                log.info("%s is already being uploaded to %s (%s).", release, site.id, up_data["status"])
+                if up_data["status"] == "DONE":
+                    continue
+            else:
+                log.info("Uploading %s to %s...", release, site.id)
+                up_data = manager.upload(site=site, release_name=release.name, src_path=str(release.parent))
+            upload_jobs[up_data["id"]] = release
+    return upload_jobs
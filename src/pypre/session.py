@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import concurrent.futures
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from functools import cached_property
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Literal
+
+from typing_extensions import Self
+
+from pypre.config import Config
+from pypre.manager import CBFTPManager, ShardedCBFTPManager
+from pypre.manager.manager import ProgressMode
+from pypre.objects.site import Site
+from pypre.operations import fxp_releases, fxp_releases_spread, fxp_releases_tree, pre_releases, upload_releases
+from pypre.operations.pre import PRE_RETRIES
+from pypre.storage import (
+    Action,
+    ActionKind,
+    ActionState,
+    Batch,
+    GroupDirCache,
+    JobJournal,
+    ReleaseSizeIndex,
+    TransferHistory,
+)
+from pypre.utils.events import events
+
+EventCallback = Callable[[dict[str, Any]], None]
+"""A function called with the data of each event emitted while a batch runs, as written by `--events ndjson`."""
+
+
+@dataclass
+class BatchResult:
+    """The outcome of a batch run by a `Session`."""
+
+    command: str
+    batch_id: int
+    """The ID of the batch in the journal."""
+    actions: dict[Action, ActionState] = field(default_factory=dict)
+    """The last journaled state of every action of the batch."""
+    errors: dict[Action, str] = field(default_factory=dict)
+    """The failure reason of the actions that reported one, e.g. the pres refused by a site."""
+    incomplete: list[Action] = field(default_factory=list)
+    """The actions whose release was found incomplete on the site, if the batch checked them."""
+
+    @property
+    def done(self) -> list[Action]:
+        """The actions that completed."""
+        return [action for action, state in self.actions.items() if state.status == "DONE"]
+
+    @property
+    def failed(self) -> list[Action]:
+        """The actions that failed, were aborted, or couldn't be submitted."""
+        return [action for action, state in self.actions.items() if state.status not in ("DONE", "SUBMITTED")]
+
+    @property
+    def ok(self) -> bool:
+        """Whether no action failed, and every checked release is complete."""
+        return not self.failed and not self.incomplete
+
+
+class Session:
+    """Drive CBFTP from a Python program, using an explicit configuration instead of the command line.
+
+    The session keeps its CBFTP manager between batches, and thus the connections, the listing caches
+    and the measured speeds. Batches are journaled like the ones of the commands, and run one at a time
+    by a background thread, in the order they were submitted. Each batch method returns a future resolved
+    with the `BatchResult` of the batch once it is finished.
+
+    Args:
+        config: The configuration, e.g. loaded with `pypre.config.load_config`.
+        cbftp: The name(s) of the CBFTP instance(s) to use. Operations are spread across them if several
+            are provided. Every configured instance is used by default.
+        progress: How to display the transfer progress while waiting for transfer jobs.
+
+    Raises:
+        ValueError: A CBFTP instance isn't configured.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        cbftp: str | Iterable[str] | None = None,
+        progress: ProgressMode = "none",
+    ) -> None:
+        names = [cbftp] if isinstance(cbftp, str) else list(cbftp if cbftp is not None else config.cbftp)
+        unknown = [name for name in names if name not in config.cbftp]
+        if unknown or not names:
+            raise ValueError(f"Unknown CBFTP instance(s): {', '.join(unknown) or '-'}")
+        self.config = config
+        self.cbftp_names = names
+        self.progress = progress
+        self.history = TransferHistory(config.data_dir / "history.sqlite3")
+        self.group_dirs = GroupDirCache(config.data_dir / "group_dirs.json")
+        self.journal = JobJournal(config.data_dir / "journal.sqlite3")
+        self.sizes = ReleaseSizeIndex(config.data_dir / "sizes.sqlite3")
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="pypre-session")
+
+    @cached_property
+    def manager(self) -> CBFTPManager:
+        """The CBFTP manager. The CBFTP instances are only reached by the first batch."""
+        clients = [self.config.cbftp_client(name) for name in self.cbftp_names]
+        kwargs: dict[str, Any] = {
+            "history": self.history,
+            "group_dirs": self.group_dirs,
+            "progress": self.progress,
+            "sections": self.config.sections,
+        }
+        if len(clients) == 1:
+            return CBFTPManager(cbftp=clients[0], **kwargs)
+        return ShardedCBFTPManager(cbftps=clients, **kwargs)
+
+    def upload(
+        self,
+        releases: Iterable[str | Path],
+        sites: Iterable[str],
+        *,
+        wait: bool = False,
+        check: bool = False,
+        resume: bool = False,
+        on_event: EventCallback | None = None,
+    ) -> concurrent.futures.Future[BatchResult]:
+        """Upload releases to sites.
+
+        Args:
+            releases: The paths of the release directories, as seen by the CBFTP instance.
+            sites: The sites to upload to.
+            wait: Wait for the transfer jobs to finish before resolving the future. The progress of the releases
+                also available locally is computed from their local size.
+            check: Check the completeness of the releases on the sites once submitted, or finished with `wait`.
+            resume: Resume the last upload batch, instead of starting a new one.
+            on_event: Called with each event emitted while the batch runs.
+
+        Raises:
+            ValueError: A site isn't configured.
+        """
+        paths = [Path(release) for release in dict.fromkeys(releases)]
+        dst_sites = self._sites(sites)
+
+        def run(batch: Batch, result: BatchResult) -> None:
+            local_releases = self.sizes.get(paths) if wait else {}
+            upload_jobs = upload_releases(self.manager, paths, dst_sites, batch=batch)
+            if wait:
+                totals = {
+                    job_id: size
+                    for job_id, release in upload_jobs.items()
+                    if release in local_releases and (size := local_releases[release].size)
+                }
+                self.manager.show_transfer_progress(list(upload_jobs), totals)
+            if check:
+                self._check(result, "upload", [path.name for path in paths], dst_sites)
+
+        return self._submit("upload", run, resume, on_event)
+
+    def fxp(
+        self,
+        releases: Iterable[str],
+        to: Iterable[str],
+        from_: Iterable[str] | None = None,
+        *,
+        wait: bool = False,
+        check: bool = False,
+        distribution: Literal["star", "tree"] = "star",
+        engine: Literal["transfer", "spread"] = "transfer",
+        max_outbound: int = 2,
+        resume: bool = False,
+        on_event: EventCallback | None = None,
+    ) -> concurrent.futures.Future[BatchResult]:
+        """FXP releases between sites.
+
+        Args:
+            releases: The release names.
+            to: The sites to FXP to.
+            from_: The sites to FXP from. Every other configured site is considered by default.
+            wait: Wait for the transfer jobs to finish before resolving the future. Always done with the
+                'tree' distribution.
+            check: Check the completeness of the releases on the destinations once submitted, or finished.
+            distribution: 'star' copies every release from the source sites to each destination. 'tree' uses
+                the destinations that completed a release as additional sources for the remaining ones.
+            engine: 'transfer' creates one transfer job per release and destination. 'spread' creates one CBFTP
+                spread job per release covering all the destinations, and can't be used with the 'tree' distribution.
+            max_outbound: Maximum number of simultaneous outbound copies per site with the 'tree' distribution.
+            resume: Resume the last fxp batch, instead of starting a new one.
+            on_event: Called with each event emitted while the batch runs.
+
+        Raises:
+            ValueError: A site isn't configured, or is both a source and a destination, or the 'spread' engine
+                is used with the 'tree' distribution.
+        """
+        if engine == "spread" and distribution == "tree":
+            raise ValueError("The 'tree' distribution can't be used with the 'spread' engine.")
+        names = list(dict.fromkeys(releases))
+        dst_sites = self._sites(to)
+        dst_ids = {site.id for site in dst_sites}
+        if from_ is None:
+            src_sites = [site for site in self.config.sites.values() if site.id not in dst_ids]
+        else:
+            src_sites = self._sites(from_)
+            if any(site.id in dst_ids for site in src_sites):
+                raise ValueError("Can't FXP to a source site.")
+
+        def run(batch: Batch, result: BatchResult) -> None:
+            if engine == "spread":
+                fxp_releases_spread(self.manager, names, src_sites, dst_sites, wait=wait, check=False, batch=batch)
+            elif distribution == "tree":
+                fxp_releases_tree(
+                    self.manager, names, src_sites, dst_sites, max_outbound=max_outbound, check=False, batch=batch
+                )
+            else:
+                fxp_releases(self.manager, names, src_sites, dst_sites, wait=wait, check=False, batch=batch)
+            if check:
+                self._check(result, "fxp", names, dst_sites)
+
+        return self._submit("fxp", run, resume, on_event)
+
+    def pre(
+        self,
+        releases: Iterable[str],
+        sites: Iterable[str],
+        *,
+        cooldown: float = 5.0,
+        at: float | None = None,
+        fixed_rate: bool = False,
+        async_: bool = False,
+        retries: int = PRE_RETRIES,
+        resume: bool = False,
+        on_event: EventCallback | None = None,
+    ) -> concurrent.futures.Future[BatchResult]:
+        """Pre releases on sites, in order.
+
+        The failure reason of the sites a release couldn't be pred on after all the retries is reported in
+        the `errors` of the result.
+
+        Args:
+            releases: The release names, in pre order.
+            sites: The sites to pre to.
+            cooldown: The number of seconds between each pre.
+            at: The UNIX timestamp at which to fire the first pre, if not immediately.
+            fixed_rate: Schedule pres at a fixed rate, instead of with a fixed delay.
+            async_: Send the pres without waiting for the sites to answer before the next one.
+            retries: The number of times a pre is retried on the sites it failed on.
+            resume: Resume the last pre batch, instead of starting a new one.
+            on_event: Called with each event emitted while the batch runs.
+
+        Raises:
+            ValueError: A site isn't configured.
+        """
+        names = list(dict.fromkeys(releases))
+        pre_sites = self._sites(sites)
+
+        def run(batch: Batch, result: BatchResult) -> None:
+            failures = pre_releases(
+                self.manager,
+                names,
+                pre_sites,
+                cooldown,
+                batch=batch,
+                at=at,
+                fixed_rate=fixed_rate,
+                async_=async_,
+                retries=retries,
+            )
+            for release_name, reasons in failures.items():
+                for site_id, reason in reasons.items():
+                    result.errors[Action("pre", release_name, site_id)] = reason
+
+        return self._submit("pre", run, resume, on_event)
+
+    def close(self) -> None:
+        """Wait for the submitted batches to finish, and stop the background thread."""
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def _sites(self, site_keys: Iterable[str]) -> list[Site]:
+        sites = []
+        for site_key in dict.fromkeys(site_keys):
+            site = self.config.sites.get(site_key)
+            if site is None:
+                raise ValueError(f"{site_key} is not a configured site.")
+            sites.append(site)
+        return sites
+
+    def _check(self, result: BatchResult, kind: ActionKind, release_names: list[str], sites: list[Site]) -> None:
+        for site in sites:
+            for release_name in release_names:
+                if not self.manager.check(release_name, site):
+                    result.incomplete.append(Action(kind, release_name, site.id))
+
+    def _submit(
+        self,
+        command: str,
+        run: Callable[[Batch, BatchResult], None],
+        resume: bool,
+        on_event: EventCallback | None,
+    ) -> concurrent.futures.Future[BatchResult]:
+        def run_batch() -> BatchResult:
+            # Events are process wide: the callback also receives the ones of other sessions running batches
+            if on_event is not None:
+                events.subscribe(on_event)
+            try:
+                batch = self.journal.last_batch(command) if resume else None
+                resumed = batch is not None
+                if batch is None:
+                    batch = self.journal.start(command)
+                events.emit("batch.started", command=command, batch=batch.id, resumed=resumed)
+                result = BatchResult(command, batch.id)
+                try:
+                    self.manager.journal = batch
+                    run(batch, result)
+                except SystemExit as e:  # Raised by the manager after logging fatal errors
+                    raise RuntimeError(f"The {command} batch #{batch.id} was aborted, see the logs.") from e
+                result.actions = batch.states()
+                return result
+            finally:
+                if on_event is not None:
+                    events.unsubscribe(on_event)
+
+        return self._executor.submit(run_batch)
@@ -0,0 +1,22 @@
+__all__ = (
+    "LOCAL_SITE",
+    "Action",
+    "ActionKind",
+    "ActionState",
+    "ActionStatus",
+    "Batch",
+    "GroupDirCache",
+    "JobJournal",
+    "ProbeCache",
+    "ProbeResult",
+    "ReleaseSizeIndex",
+    "RouteStats",
+    "TransferHistory",
+    "transfer_speed",
+)
+
+from pypre.storage.group_dirs import GroupDirCache
+from pypre.storage.history import LOCAL_SITE, RouteStats, TransferHistory, transfer_speed
+from pypre.storage.journal import Action, ActionKind, ActionState, ActionStatus, Batch, JobJournal
+from pypre.storage.probes import ProbeCache, ProbeResult
+from pypre.storage.sizes import ReleaseSizeIndex
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+from time import time
+from typing import Any
+
+
+class GroupDirCache:
+    """Local cache of the group directories listed on each site, used to plan commands offline.
+
+    Args:
+        path: The path of the JSON cache file.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, dict[str, Any]]:
+        try:
+            data: dict[str, dict[str, Any]] = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+        return data
+
+    def get(self, site_id: str) -> tuple[list[str], float] | None:
+        """Return the cached group directories of a site, if any.
+
+        Args:
+            site_id: The site ID.
+
+        Returns:
+            The group directories, and the timestamp at which they were listed.
+        """
+        entry = self._load().get(site_id)
+        if entry is None:
+            return None
+        return entry["dirs"], entry["listed_at"]
+
+    def save(self, site_id: str, group_dirs: list[str]) -> None:
+        """Store the group directories listed on a site.
+
+        Args:
+            site_id: The site ID.
+            group_dirs: The group directories.
+        """
+        with self._lock:
+            data = self._load()
+            data[site_id] = {"dirs": group_dirs, "listed_at": time()}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(data))
+            tmp_path.replace(self.path)
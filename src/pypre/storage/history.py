@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import math
+import sqlite3
+import statistics
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from time import time
+from typing import Any
+
+LOCAL_SITE = "local"
+"""Source site name used for uploads."""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transfers (
+    finished_at REAL NOT NULL,
+    cbftp TEXT NOT NULL,
+    name TEXT NOT NULL,
+    src_site TEXT NOT NULL,
+    dst_site TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    speed REAL NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transfers_route ON transfers (src_site, dst_site, finished_at);
+"""
+
+
+@dataclass
+class RouteStats:
+    """Aggregated statistics of the transfers between two sites."""
+
+    src_site: str
+    dst_site: str
+    transfers: int
+    failures: int
+    total_bytes: int
+    median_speed: float | None
+    """Median speed of successful transfers, in bytes/s."""
+
+    p90_speed: float | None
+    """90th percentile speed of successful transfers, in bytes/s."""
+
+    @property
+    def failure_rate(self) -> float:
+        return self.failures / self.transfers if self.transfers else 0.0
+
+
+class TransferHistory:
+    """Local store of finished transfer jobs, backed by SQLite.
+
+    The database is only created when first used.
+
+    Args:
+        path: The path of the SQLite database.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    @cached_property
+    def _connection(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path)
+        connection.executescript(_SCHEMA)
+        return connection
+
+    def record(self, cbftp: str, transferjob: dict[str, Any], duration: float) -> None:
+        """Record a finished transfer job.
+
+        Args:
+            cbftp: The name of the CBFTP instance the job ran on.
+            transferjob: The last transfer job data returned by the CBFTP instance.
+            duration: The measured duration of the job, used if the CBFTP instance didn't report it.
+        """
+        size, duration, speed = transfer_speed(transferjob, duration)
+        with self._connection:
+            self._connection.execute(
+                "INSERT INTO transfers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    time(),
+                    cbftp,
+                    transferjob.get("name", ""),
+                    transferjob.get("src_site") or LOCAL_SITE,
+                    transferjob["dst_site"],
+                    size,
+                    duration,
+                    speed,
+                    transferjob["status"],
+                ),
+            )
+
+    def route_stats(self, since: float | None = None, sites: set[str] | None = None) -> list[RouteStats]:
+        """Aggregate the recorded transfers per route.
+
+        Args:
+            since: Only use transfers finished after this timestamp.
+            sites: Only return routes from or to these sites.
+
+        Returns:
+            The statistics of each route, sorted by source and destination site.
+        """
+        rows = self._connection.execute(
+            "SELECT src_site, dst_site, size, speed, status FROM transfers WHERE finished_at >= ?",
+            (since or 0.0,),
+        )
+        routes: dict[tuple[str, str], list[tuple[int, float, str]]] = {}
+        for src_site, dst_site, size, speed, status in rows:
+            if sites is None or src_site in sites or dst_site in sites:
+                routes.setdefault((src_site, dst_site), []).append((size, speed, status))
+
+        stats = []
+        for (src_site, dst_site), transfers in sorted(routes.items()):
+            speeds = sorted(speed for _, speed, status in transfers if status == "DONE")
+            stats.append(
+                RouteStats(
+                    src_site=src_site,
+                    dst_site=dst_site,
+                    transfers=len(transfers),
+                    failures=len(transfers) - len(speeds),
+                    total_bytes=sum(size for size, _, __ in transfers),
+                    median_speed=statistics.median(speeds) if speeds else None,
+                    p90_speed=_percentile(speeds, 0.9) if speeds else None,
+                )
+            )
+        return stats
+
+
+def transfer_speed(transferjob: dict[str, Any], duration: float) -> tuple[int, float, float]:
+    """Compute the speed of a transfer job.
+
+    Args:
+        transferjob: The transfer job data returned by the CBFTP instance.
+        duration: The measured duration of the job, used if the CBFTP instance didn't report it.
+
+    Returns:
+        A three-tuple containing the transferred bytes, the duration in seconds and the speed in bytes/s.
+    """
+    duration = float(transferjob.get("time_spent_seconds") or duration)
+    size = int(transferjob.get("size_progress_bytes") or 0)
+    return size, duration, size / duration if duration > 0 else 0.0
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    # Nearest-rank percentile
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from collections.abc import Iterable
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from time import time
+from typing import Literal, NamedTuple, cast
+
+_SCHEMA = """
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    command TEXT NOT NULL,
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    batch INTEGER NOT NULL REFERENCES batches (id),
+    at REAL NOT NULL,
+    kind TEXT NOT NULL,
+    release TEXT NOT NULL,
+    site TEXT NOT NULL,
+    state TEXT NOT NULL,
+    src_site TEXT,
+    cbftp TEXT,
+    job_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS events_batch ON events (batch);
+"""
+
+ActionKind = Literal["upload", "fxp", "pre"]
+ActionStatus = Literal["PLANNED", "SUBMITTED", "DONE", "FAILED", "ABORTED"]
+
+
+class Action(NamedTuple):
+    """An action of a batch: a release uploaded, FXPed or pred to a site."""
+
+    kind: ActionKind
+    release: str
+    site: str
+    """The destination site ID."""
+
+
+@dataclass
+class ActionState:
+    """The last journaled state of an action."""
+
+    status: ActionStatus
+    src_site: str | None = None
+    cbftp: str | None = None
+    """The name of the CBFTP instance the transfer job was submitted to."""
+    job_id: int | None = None
+    """The ID of the transfer job on the CBFTP instance, or the request ID of an asynchronous pre. Spread jobs are
+    identified by the release name instead, and synchronous pres have none."""
+
+
+class JobJournal:
+    """Append-only local journal of the actions of each batch, backed by SQLite in WAL mode.
+
+    Every event is committed as soon as it is recorded, so that an interrupted batch can be resumed.
+    The database is only created when first used, and can be used from several threads.
+
+    Args:
+        path: The path of the SQLite database.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    @cached_property
+    def _connection(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.executescript(_SCHEMA)
+        connection.execute("PRAGMA synchronous = NORMAL")
+        return connection
+
+    def start(self, command: str) -> Batch:
+        """Start a new batch.
+
+        Args:
+            command: The name of the command running the batch.
+        """
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO batches (command, started_at) VALUES (?, ?)", (command, time())
+            )
+        return Batch(self, cast(int, cursor.lastrowid))
+
+    def last_batch(self, command: str) -> Batch | None:
+        """Return the last batch run by the command, if any.
+
+        Args:
+            command: The name of the command running the batch.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT id FROM batches WHERE command = ? ORDER BY id DESC LIMIT 1", (command,)
+            ).fetchone()
+        return Batch(self, row[0]) if row is not None else None
+
+
+class Batch:
+    """The journal of a single batch.
+
+    Args:
+        journal: The journal the batch is stored in.
+        id: The ID of the batch.
+    """
+
+    def __init__(self, journal: JobJournal, id: int) -> None:
+        self.journal = journal
+        self.id = id
+
+    def _record(self, states: Iterable[tuple[Action, ActionState]]) -> None:
+        now = time()
+        with self.journal._lock, self.journal._connection as connection:
+            connection.executemany(
+                "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (self.id, now, *action, state.status, state.src_site, state.cbftp, state.job_id)
+                    for action, state in states
+                ],
+            )
+
+    def planned(self, actions: Iterable[Action]) -> None:
+        """Record the actions planned by the batch."""
+        state = ActionState("PLANNED")
+        self._record((action, state) for action in actions)
+
+    def submitted(self, action: Action, src_site: str | None, cbftp: str, job_id: int | None) -> None:
+        """Record the submission of the transfer or spread job of an action, or of its pre request.
+
+        Args:
+            action: The submitted action.
+            src_site: The source site ID, for FXP actions transferred by a transfer job.
+            cbftp: The name of the CBFTP instance the job was submitted to.
+            job_id: The ID of the transfer job on the CBFTP instance, the request ID of an asynchronous pre, or
+                `None` for spread jobs and synchronous pres.
+        """
+        self.submitted_all([(action, src_site, cbftp, job_id)])
+
+    def submitted_all(self, submissions: Iterable[tuple[Action, str | None, str, int | None]]) -> None:
+        """Record the submission of several actions in a single transaction, e.g. all the sites of a pre.
+
+        Args:
+            submissions: The action, source site ID, CBFTP instance name and job ID of each submission, as passed
+                to `submitted`.
+        """
+        self._record(
+            (action, ActionState("SUBMITTED", src_site, cbftp, job_id))
+            for action, src_site, cbftp, job_id in submissions
+        )
+
+    def finished(self, action: Action, status: ActionStatus) -> None:
+        """Record the final status of an action."""
+        self._record([(action, ActionState(status))])
+
+    def states(self) -> dict[Action, ActionState]:
+        """Return the last state of every action of the batch."""
+        with self.journal._lock:
+            rows = self.journal._connection.execute(
+                "SELECT kind, release, site, state, src_site, cbftp, job_id FROM events WHERE batch = ? ORDER BY rowid",
+                (self.id,),
+            ).fetchall()
+        return {
+            Action(kind, release, site): ActionState(status, src_site, cbftp, job_id)
+            for kind, release, site, status, src_site, cbftp, job_id in rows
+        }
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from time import time
+
+
+@dataclass
+class ProbeResult:
+    """Health and load of a CBFTP instance, as measured at some point in time."""
+
+    cbftp: str
+    online: bool
+    latency: float | None
+    """Duration in seconds of an API request, if the instance is online."""
+    running_jobs: int | None
+    """Number of transfer jobs not finished yet, if it could be retrieved."""
+    probed_at: float
+
+
+class ProbeCache:
+    """Short-lived cache of the CBFTP instances probe results, shared between commands.
+
+    Args:
+        path: The path of the JSON cache file.
+        ttl: Duration in seconds during which probe results are considered fresh.
+    """
+
+    def __init__(self, path: Path, ttl: float = 30.0) -> None:
+        self.path = path
+        self.ttl = ttl
+
+    def load(self) -> dict[str, ProbeResult]:
+        """Return the fresh probe results, keyed by CBFTP instance name."""
+        try:
+            data = json.loads(self.path.read_text())
+            results = [ProbeResult(**result) for result in data]
+        except (OSError, ValueError, TypeError):
+            return {}
+        now = time()
+        return {result.cbftp: result for result in results if 0 <= now - result.probed_at < self.ttl}
+
+    def save(self, results: list[ProbeResult]) -> None:
+        """Store probe results, replacing the ones of the same instances."""
+        merged = {**self.load(), **{result.cbftp: result for result in results}}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps([asdict(result) for result in merged.values()]))
+        tmp_path.replace(self.path)
+
+    def clear(self) -> None:
+        """Remove all the cached probe results."""
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import concurrent.futures
+import os
+import sqlite3
+from collections.abc import Iterable
+from functools import cached_property
+from pathlib import Path
+
+from pypre.utils.scan import SCAN_WORKERS, LocalRelease, release_size
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS release_sizes (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+"""
+
+_QUERY_CHUNK = 500
+"""Maximum number of paths looked up by a single query, below the limit of SQLite on bound parameters."""
+
+
+def _tree_mtime_ns(path: Path) -> int | None:
+    """Return the latest modification time of a directory and of its subdirectories, or `None` if the directory
+    can't be accessed.
+
+    Adding, removing or renaming a file anywhere in the tree changes the modification time of its parent
+    directory. Symbolic links to directories are not followed.
+    """
+    try:
+        latest = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    stack = [os.fspath(path)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        latest = max(latest, entry.stat(follow_symlinks=False).st_mtime_ns)
+        except OSError:
+            continue
+    return latest
+
+
+class ReleaseSizeIndex:
+    """Local index of the number of files and total size of release directories, backed by SQLite.
+
+    Sizes are cached per release directory, and computed again if the latest modification time of the
+    directory and its subdirectories changed. The database is only created when first used.
+
+    Args:
+        path: The path of the SQLite database.
+        workers: The number of threads used to scan the filesystem.
+    """
+
+    def __init__(self, path: Path, workers: int = SCAN_WORKERS) -> None:
+        self.path = path
+        self.workers = workers
+
+    @cached_property
+    def _connection(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path)
+        connection.executescript(_SCHEMA)
+        return connection
+
+    def get(self, paths: Iterable[Path]) -> dict[Path, LocalRelease]:
+        """Get the number of files and total size of release directories.
+
+        Args:
+            paths: The absolute paths of the release directories.
+
+        Returns:
+            The releases with their file count and size, keyed by path. Directories that couldn't be
+            accessed are omitted.
+        """
+        paths = list(dict.fromkeys(paths))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            mtimes = dict(zip(paths, executor.map(_tree_mtime_ns, paths)))
+
+            cached = self._cached([str(path) for path, mtime_ns in mtimes.items() if mtime_ns is not None])
+            releases = {}
+            stale = []
+            for path, mtime_ns in mtimes.items():
+                if mtime_ns is None:
+                    continue
+                entry = cached.get(str(path))
+                if entry is not None and entry[0] == mtime_ns:
+                    releases[path] = LocalRelease(path, entry[1], entry[2])
+                else:
+                    stale.append(path)
+
+            for path, (files, size) in zip(stale, executor.map(release_size, stale)):
+                releases[path] = LocalRelease(path, files, size)
+
+        if stale:
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO release_sizes VALUES (?, ?, ?, ?)",
+                    [(str(path), mtimes[path], releases[path].files, releases[path].size) for path in stale],
+                )
+        return releases
+
+    def _cached(self, paths: list[str]) -> dict[str, tuple[int, int, int]]:
+        """Return the cached modification time, file count and size of the release directories indexed."""
+        cached: dict[str, tuple[int, int, int]] = {}
+        for start in range(0, len(paths), _QUERY_CHUNK):
+            chunk = paths[start : start + _QUERY_CHUNK]
+            rows = self._connection.execute(
+                f"SELECT path, mtime_ns, files, size FROM release_sizes WHERE path IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+            cached.update((path, (mtime_ns, files, size)) for path, mtime_ns, files, size in rows)
+        return cached
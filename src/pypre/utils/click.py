@@ -1,15 +1,21 @@
 from __future__ import annotations
 
-from collections.abc import Iterable
+import logging
+from collections.abc import Callable, Iterable
 from dataclasses import dataclass
-from glob import iglob
-from os import R_OK, W_OK, access
+from datetime import datetime, time, timedelta
+from functools import cached_property
 from pathlib import Path
-from typing import Literal
+from typing import Literal, TypeVar
 
 from click import Context, Parameter, ParamType
+from natsort import natsorted
 
 from pypre.manager import CBFTPManager
+from pypre.storage import Batch, GroupDirCache, JobJournal, ReleaseSizeIndex, TransferHistory
+from pypre.utils.events import events
+
+_Release = TypeVar("_Release", str, Path)
 
 
 @dataclass
@@ -18,72 +24,117 @@ class CtxObj:
     yes: bool
     sort_order: Literal["ASC", "DSC"]
     psort: bool
-    manager: CBFTPManager
+    resume: bool
+    history: TransferHistory
+    sizes: ReleaseSizeIndex
+    journal: JobJournal
+    group_dirs: GroupDirCache
+    manager_factory: Callable[[], CBFTPManager]
 
+    @cached_property
+    def manager(self) -> CBFTPManager:
+        """The CBFTP manager. The CBFTP instance is only reached on first access."""
+        return self.manager_factory()
 
-class GlobPaths(ParamType):
-    """
-    This class is designed to allow users of a click application to pass in a
-    glob-based file pattern with filtering and other various requirements.
-    While some of the parameters are very similar to those found in the
-    click.Path type, they are more geared towards filtering out files that do
-    not fit the given requirements and non-existent files are not really
-    meaningful for globbing.
-
-    Source: https://gitlab.com/abraxos/click-path/-/blob/master/click_path/core.py
-    (Project does not have a py.typed file, so it is used locally).
+    def start_batch(self, command: str) -> Batch:
+        """Start the batch of a command, or resume the last one if requested, and journal it with the manager.
+
+        Args:
+            command: The name of the command.
+        """
+        log = logging.getLogger("pypre.journal")
+        batch = None
+        if self.resume:
+            batch = self.journal.last_batch(command)
+            if batch is not None:
+                log.info("Resuming %s batch #%d", command, batch.id)
+            else:
+                log.warning("No %s batch to resume, starting a new one.", command)
+        resumed = batch is not None
+        if batch is None:
+            batch = self.journal.start(command)
+        events.emit("batch.started", command=command, batch=batch.id, resumed=resumed)
+        self.manager.journal = batch
+        return batch
+
+    def sort_releases(self, releases: Iterable[_Release]) -> list[_Release]:
+        """Sort releases in the requested order, naturally unless plain sorting was requested.
+
+        Args:
+            releases: The release names or paths.
+        """
+        reverse = self.sort_order == "DSC"
+        if self.psort:
+            return sorted(releases, reverse=reverse)
+        return natsorted(releases, reverse=reverse)
+
+
+class CBFTPNames(ParamType):
+    """A comma-separated list of CBFTP instance names, 'all' to use every configured instance, or 'auto'
+    to select the least loaded one.
+
+    Args:
+        choices: The configured CBFTP instance names.
     """
 
-    name = "Path-or-Glob"
-
-    def __init__(
-        self,
-        files_okay: bool = True,
-        dirs_okay: bool = True,
-        writable_only: bool = False,
-        readable_only: bool = True,
-        resolve: bool = False,
-        at_least_one: bool = True,
-    ) -> None:
-        self.files_okay = files_okay
-        self.dirs_okay = dirs_okay
-        self.writable_only = writable_only
-        self.readable_only = readable_only
-        self.resolve = resolve
-        self.at_least_one = at_least_one
-
-    def _validated_path(self, file_path: Path) -> tuple[Path, bool, str]:
-        if not file_path.exists():
-            return file_path, False, "does not exist"
-        if self.writable_only and not access(str(file_path), W_OK):
-            return file_path, False, "exists, but is not writable"
-        if self.readable_only and not access(str(file_path), R_OK):
-            return file_path, False, "exists, but is not readable"
-        if not self.files_okay and file_path.is_file():
-            return file_path, False, "exists, is a file"
-        if not self.dirs_okay and file_path.is_dir():
-            return file_path, False, "exists, is a directory"
-        return file_path, True, "valid"
-
-    def convert(self, value: str, param: Parameter | None, ctx: Context | None) -> Iterable[Path]:
-        validation_results = [self._validated_path(Path(p)) for p in iglob(value)]
-        if self.at_least_one and not any(valid for _, valid, __ in validation_results):
-            summary = "\n".join(f"\t{path}: {why}" for path, _, why in validation_results)
+    name = "cbftp"
+    AUTO = "auto"
+
+    def __init__(self, choices: Iterable[str]) -> None:
+        self.choices = list(choices)
+
+    def get_metavar(self, param: Parameter, ctx: Context | None = None) -> str:
+        return f"[{'|'.join([*self.choices, 'all', self.AUTO])}][,...]"
+
+    def convert(self, value: str | list[str], param: Parameter | None, ctx: Context | None) -> list[str]:
+        if isinstance(value, list):
+            return value
+        if value.strip().lower() == "all":
+            return list(self.choices)
+        if value.strip().lower() == self.AUTO:
+            return [self.AUTO]
+
+        names = [name.strip() for name in value.split(",") if name.strip()]
+        unknown = [name for name in names if name not in self.choices]
+        if not names or unknown:
             self.fail(
-                f"No paths from '{value}' matched the requirements: [{', '.join(self.filters())}]\n{summary}",
+                f"{', '.join(map(repr, unknown)) or repr(value)} is not one of {', '.join(map(repr, self.choices))}, "
+                f"'all' or '{self.AUTO}'.",
                 param,
                 ctx,
             )
-        return [path if not self.resolve else path.resolve() for path, _, __ in validation_results]
-
-    def filters(self) -> Iterable[str]:
-        filters = []
-        if self.files_okay:
-            filters.append("files")
-        if self.dirs_okay:
-            filters.append("directories")
-        if self.writable_only:
-            filters.append("write-permissions")
-        if self.readable_only:
-            filters.append("read-permissions")
-        return filters
+        return list(dict.fromkeys(names))
+
+
+class Timestamp(ParamType):
+    """A point in time, as a UNIX timestamp, an ISO 8601 date and time, or a time of day (HH:MM[:SS[.ffffff]])
+    referring to its next occurrence. Dates and times without a timezone are in local time.
+
+    The value is converted to a UNIX timestamp.
+    """
+
+    name = "timestamp"
+
+    def convert(self, value: str | float, param: Parameter | None, ctx: Context | None) -> float:
+        if isinstance(value, float):
+            return value
+        try:
+            return float(value)
+        except ValueError:
+            pass
+
+        now = datetime.now().astimezone()
+        try:
+            time_of_day = time.fromisoformat(value)
+        except ValueError:
+            pass
+        else:
+            at = datetime.combine(now.date(), time_of_day, tzinfo=time_of_day.tzinfo or now.tzinfo)
+            if at <= now:
+                at += timedelta(days=1)
+            return at.timestamp()
+
+        try:
+            return datetime.fromisoformat(value).astimezone().timestamp()
+        except ValueError:
+            self.fail(f"{value!r} is not a UNIX timestamp, an ISO 8601 date and time, or a time of day.", param, ctx)
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import sys
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from time import time
+from typing import IO, Any
+
+EVENTS_BUFFER = 10_000
+"""Maximum number of events waiting to be written, after which new events are dropped."""
+
+STOP_TIMEOUT = 5.0
+"""Maximum number of seconds to wait for the buffered events to be written when stopping."""
+
+_STOP = object()
+
+
+class EventStream:
+    """Write structured events as newline-delimited JSON, for programs wrapping pypre.
+
+    Events are only collected once the stream is started, to avoid any overhead otherwise. They are
+    serialized and written by a background thread from a bounded buffer: if the consumer is too slow
+    and the buffer is full, new events are dropped instead of blocking the caller, and the number of
+    dropped events is reported by a final `events.dropped` event.
+
+    Each event has an `event` type and a `ts` UNIX timestamp, taken when it is emitted.
+
+    Programs embedding pypre can also subscribe callbacks, which are called synchronously by the thread
+    emitting each event, whether the stream is started or not.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.dropped = 0
+        self._queue: queue.Queue[dict[str, Any] | object] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._subscribers: tuple[Callable[[dict[str, Any]], None], ...] = ()
+        self._subscribers_lock = threading.Lock()
+
+    def emit(self, event: str, **fields: Any) -> None:
+        """Emit an event, if the stream is started or callbacks are subscribed.
+
+        Args:
+            event: The event type, e.g. `job.submitted`.
+            **fields: The JSON serializable fields of the event.
+        """
+        subscribers = self._subscribers
+        if not self.enabled and not subscribers:
+            return
+        data = {"event": event, "ts": time(), **fields}
+        for callback in subscribers:
+            try:
+                callback(data)
+            except Exception:
+                logging.getLogger("pypre.events").exception("Event subscriber %r failed", callback)
+        if not self.enabled:
+            return
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            self.dropped += 1
+
+    def subscribe(self, callback: Callable[[dict[str, Any]], None]) -> None:
+        """Call a function with each emitted event, until it is unsubscribed.
+
+        Exceptions raised by the callback are logged, and don't interrupt the operation emitting the event.
+
+        Args:
+            callback: The function, called with the event data.
+        """
+        with self._subscribers_lock:
+            self._subscribers = (*self._subscribers, callback)
+
+    def unsubscribe(self, callback: Callable[[dict[str, Any]], None]) -> None:
+        """Stop calling a function subscribed with `subscribe`."""
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+            subscribers.remove(callback)
+            self._subscribers = tuple(subscribers)
+
+    def start(self, path: Path | None = None, buffer: int = EVENTS_BUFFER) -> None:
+        """Start writing the events.
+
+        Args:
+            path: The file or FIFO to write the events to. Standard output is used if not provided.
+                The file is opened by the writer thread, so that waiting for the reader of a FIFO doesn't
+                block the command.
+            buffer: The maximum number of events waiting to be written.
+        """
+        self._queue = queue.Queue(maxsize=buffer)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._write, args=(path,), name="pypre-events", daemon=True)
+        self._thread.start()
+        self.enabled = True
+
+    def stop(self) -> None:
+        """Stop collecting events, and wait up to `STOP_TIMEOUT` seconds for the buffered ones to be written."""
+        if not self.enabled:
+            return
+        self.enabled = False
+        try:
+            if self.dropped:
+                self._queue.put({"event": "events.dropped", "ts": time(), "count": self.dropped}, timeout=STOP_TIMEOUT)
+            self._queue.put(_STOP, timeout=STOP_TIMEOUT)
+        except queue.Full:  # The consumer is stuck, e.g. nothing is reading the FIFO
+            return
+        if self._thread is not None:
+            self._thread.join(STOP_TIMEOUT)
+            self._thread = None
+
+    def _write(self, path: Path | None) -> None:
+        output: IO[str] = open(path, "w", buffering=1) if path is not None else sys.stdout
+        try:
+            while (event := self._queue.get()) is not _STOP:
+                output.write(json.dumps(event, default=str) + "\n")
+                if path is None:
+                    output.flush()
+        except BrokenPipeError:
+            # The consumer went away: keep draining the buffer so that stop() doesn't wait forever
+            while self._queue.get() is not _STOP:
+                pass
+        finally:
+            if path is not None:
+                output.close()
+
+
+events = EventStream()
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import json
+from collections.abc import Callable, Mapping, Sequence
+from operator import itemgetter
+from typing import Any
+
+try:
+    import orjson
+
+    has_orjson = True
+except ModuleNotFoundError:
+    has_orjson = False
+
+
+def loads(data: bytes | str) -> Any:
+    """Decode a JSON document, using orjson if it is installed (`pip install pypre[fast]`).
+
+    Raises:
+        ValueError: The document is not valid JSON.
+    """
+    if has_orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load_records(
+    data: bytes | str,
+    fields: Sequence[str],
+    where: Mapping[str, Any] | None = None,
+) -> list[tuple[Any, ...]]:
+    """Decode a JSON array of flat objects, only keeping some fields of the objects matching a filter.
+
+    Without orjson, the objects are filtered and reduced to the fields while being decoded, so that the
+    decoded objects are never all held at once.
+
+    Args:
+        data: The JSON document.
+        fields: The names of the fields to keep, in order.
+        where: The values the fields of an object must have for it to be kept.
+
+    Returns:
+        The values of the fields of each kept object.
+
+    Raises:
+        ValueError: The document is not valid JSON.
+        KeyError: A kept object lacks one of the fields.
+    """
+    conditions = dict(where or {}).items()
+    getter = itemgetter(*fields)
+    project: Callable[[dict[str, Any]], tuple[Any, ...]] = (lambda obj: (getter(obj),)) if len(fields) == 1 else getter
+
+    if has_orjson:
+        return [project(obj) for obj in orjson.loads(data) if conditions <= obj.items()]
+
+    def record(pairs: list[tuple[str, Any]]) -> tuple[Any, ...] | None:
+        obj = dict(pairs)
+        return project(obj) if conditions <= obj.items() else None
+
+    return [values for values in json.loads(data, object_pairs_hook=record) if values is not None]
@@ -1,9 +1,13 @@
 from __future__ import annotations
 
+import atexit
+import copy
 import logging
+import logging.config
+import queue
 import sys
-from copy import copy
-from typing import Callable, ClassVar, Literal
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, ClassVar, Literal
 
 import click
 
@@ -39,18 +43,75 @@ class ColourizedFormatter(logging.Formatter):
         else:
             self.use_colors = sys.stdout.isatty()
         super().__init__(fmt=fmt, datefmt=datefmt, style=style)
+        self._level_names = {
+            level_no: func(logging.getLevelName(level_no)) for level_no, func in self.level_name_colors.items()
+        }
 
     def color_level_name(self, level_name: str, level_no: int) -> str:
-        def default(level_name: str) -> str:
-            return str(level_name)
-
-        func = self.level_name_colors.get(level_no, default)
-        return func(level_name)
+        styled = self._level_names.get(level_no)
+        if styled is not None and level_name == logging.getLevelName(level_no):
+            return styled
+        return self.level_name_colors.get(level_no, str)(level_name)
 
     def formatMessage(self, record: logging.LogRecord) -> str:
-        recordcopy = copy(record)
-        levelname = recordcopy.levelname
-        if self.use_colors:
-            levelname = self.color_level_name(levelname, recordcopy.levelno)
-            recordcopy.__dict__["levelname"] = levelname
-        return super().formatMessage(recordcopy)
+        if not self.use_colors:
+            return super().formatMessage(record)
+        # The record is shared with the other handlers, possibly running in other threads
+        record = copy.copy(record)
+        record.levelname = self.color_level_name(record.levelname, record.levelno)
+        return super().formatMessage(record)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """A queue handler leaving the formatting of the records to the listener thread.
+
+    As with `QueueHandler`, the arguments and the exception of a record are merged into a copy of it before
+    being queued, so that objects changed by the logging thread afterwards are logged as they were.
+    """
+
+    _exception_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(logging_config: dict[str, Any], use_queue: bool = False) -> list[QueueListener]:
+    """Configure logging from a `logging.config.dictConfig` dictionary.
+
+    With `use_queue`, the handlers of each configured logger are moved to a background thread: the logger
+    only puts its records in a queue, and a `QueueListener` formats and emits them. The listeners are
+    stopped, and the queued records flushed, at exit.
+
+    Args:
+        logging_config: The logging configuration dictionary.
+        use_queue: Emit the records from a background thread.
+
+    Returns:
+        The started queue listeners.
+    """
+    logging.config.dictConfig(logging_config)
+    if not use_queue:
+        return []
+
+    listeners = []
+    loggers = [logging.getLogger(name) for name in logging_config.get("loggers", {})]
+    if "root" in logging_config:
+        loggers.append(logging.getLogger())
+    for logger in loggers:
+        if not logger.handlers:
+            continue
+        records: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+        listener = QueueListener(records, *logger.handlers, respect_handler_level=True)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(_DeferredQueueHandler(records))
+        listener.start()
+        atexit.register(listener.stop)
+        listeners.append(listener)
+    return listeners
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import cProfile
+import functools
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+from time import perf_counter
+from typing import TypeVar
+
+from typing_extensions import ParamSpec
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+@dataclass
+class PhaseTiming:
+    """Accumulated timings of a named phase."""
+
+    calls: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+
+class Profiler:
+    """Collect monotonic wall clock timings of named phases, and optionally run cProfile.
+
+    Phases are only timed once the profiler is started, to avoid any overhead in hot loops: until then,
+    timed functions are called directly and phases are null contexts.
+    Explicit calls to `record` are always collected, as some phases (e.g. config loading)
+    happen before command line arguments are parsed.
+
+    Phases may be nested (e.g. `plan.group_dirs` is part of `plan.dst_path`), so their
+    totals are not meant to be summed.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.timings: dict[str, PhaseTiming] = {}
+        self._lock = threading.Lock()
+        self._start_time: float | None = None
+        self._cprofile: cProfile.Profile | None = None
+
+    def record(self, name: str, duration: float) -> None:
+        """Record a duration for the provided phase.
+
+        Args:
+            name: The phase name.
+            duration: The duration of the phase, in seconds.
+        """
+        with self._lock:
+            timing = self.timings.setdefault(name, PhaseTiming())
+            timing.calls += 1
+            timing.total += duration
+            timing.max = max(timing.max, duration)
+
+    def phase(self, name: str) -> AbstractContextManager[None]:
+        """Time the wrapped block as the provided phase."""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._phase(name)
+
+    @contextmanager
+    def _phase(self, name: str) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, perf_counter() - start)
+
+    def timed(self, name: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+        """Decorator timing each call of the decorated function as the provided phase.
+
+        The profiler is started after the decorated functions are defined, so the wrapper remains, but only
+        enters a phase once the profiler is enabled.
+        """
+
+        def decorator(func: Callable[P, R]) -> Callable[P, R]:
+            @functools.wraps(func)
+            def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self._phase(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def start(self, cprofile: bool = False) -> None:
+        """Start collecting phase timings.
+
+        Args:
+            cprofile: Whether to also run cProfile. Only the calling thread is profiled.
+        """
+        self.enabled = True
+        self._start_time = perf_counter()
+        if cprofile:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def stop(self, profile_path: Path | None = None) -> None:
+        """Stop collecting phase timings.
+
+        Args:
+            profile_path: Where to dump the raw cProfile stats, if cProfile was started.
+        """
+        if self._start_time is not None:
+            self.record("total", perf_counter() - self._start_time)
+            self._start_time = None
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            if profile_path is not None:
+                self._cprofile.dump_stats(profile_path)
+            self._cprofile = None
+        self.enabled = False
+
+    def report(self) -> str:
+        """Return a compact breakdown of the collected timings."""
+        lines = [f"{'Phase':<24} {'Calls':>7} {'Total':>10} {'Mean':>10} {'Max':>10}"]
+        for name, timing in sorted(self.timings.items(), key=lambda item: item[0] == "total"):
+            lines.append(
+                f"{name:<24} {timing.calls:>7} {_format_duration(timing.total):>10} "
+                f"{_format_duration(timing.total / timing.calls):>10} {_format_duration(timing.max):>10}"
+            )
+        return "\n".join(lines)
+
+
+_NULL_CONTEXT = nullcontext()
+
+
+def _format_duration(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f}s"
+    return f"{seconds * 1000:.1f}ms"
+
+
+profiler = Profiler()
+"""The profiler used across pypre."""
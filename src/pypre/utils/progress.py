@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import sys
+from abc import ABC, abstractmethod
+from collections.abc import Mapping
+from dataclasses import dataclass
+from time import monotonic
+from typing import Any, TextIO
+
+from tqdm import tqdm
+
+from pypre.utils.units import format_size
+
+FINISHED_STATUSES = ("DONE", "ABORTED", "FAILED")
+"""Transfer job statuses for which the job won't progress anymore."""
+
+
+class JobState:
+    """The progress of a transfer job, only keeping the fields pypre uses, so that waiting for many jobs stays light.
+
+    Args:
+        job_id: The ID of the transfer job.
+        name: The release name.
+        site: The destination site ID.
+        status: The status of the transfer job.
+        bytes: The number of bytes transferred.
+        total: The total size in bytes of the release.
+    """
+
+    __slots__ = ("bytes", "job_id", "name", "site", "status", "total")
+
+    def __init__(self, job_id: int, name: str, site: str, status: str, *, bytes: int, total: int) -> None:
+        self.job_id = job_id
+        self.name = name
+        self.site = site
+        self.status = status
+        self.bytes = bytes
+        self.total = total
+
+    @classmethod
+    def from_transferjob(cls, transferjob: dict[str, Any], total: int | None = None) -> JobState:
+        """Create the state of a transfer job from its data returned by CBFTP.
+
+        Args:
+            transferjob: The transfer job data.
+            total: The known total size in bytes of the release, instead of the CBFTP estimation.
+        """
+        state = cls(transferjob["id"], transferjob.get("name", ""), transferjob["dst_site"], "", bytes=0, total=0)
+        state.update(transferjob, total)
+        return state
+
+    def update(self, transferjob: dict[str, Any], total: int | None = None) -> None:
+        """Update the progress from the transfer job data returned by CBFTP.
+
+        Args:
+            transferjob: The transfer job data.
+            total: The known total size in bytes of the release, instead of the CBFTP estimation.
+        """
+        self.status = transferjob["status"]
+        self.bytes = transferjob.get("size_progress_bytes") or 0
+        self.total = total if total is not None else transferjob.get("size_estimated_bytes") or 0
+
+    @property
+    def finished(self) -> bool:
+        """Whether the transfer job won't progress anymore."""
+        return self.status in FINISHED_STATUSES
+
+
+class TransferDisplay(ABC):
+    """Base class of the transfer progress displays.
+
+    Displays are fed with the latest state of every transfer job, keyed by job ID.
+    """
+
+    @abstractmethod
+    def update(self, states: Mapping[int, JobState]) -> None:
+        """Display the latest state of every transfer job."""
+
+    @abstractmethod
+    def close(self) -> None:
+        """Stop displaying the progress."""
+
+
+class NoDisplay(TransferDisplay):
+    """Don't display anything, e.g. when pypre is embedded in another program."""
+
+    def update(self, states: Mapping[int, JobState]) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class TransferBars(TransferDisplay):
+    """Display one progress bar per transfer job."""
+
+    def __init__(self) -> None:
+        self._bars: dict[int, tqdm[Any]] = {}
+
+    def update(self, states: Mapping[int, JobState]) -> None:
+        for job_id, state in states.items():
+            bar = self._bars.get(job_id)
+            if bar is None:
+                bar = self._bars[job_id] = tqdm(
+                    total=state.total,
+                    desc=f"Upload #{job_id}",
+                    unit="B",
+                    position=len(self._bars),
+                    unit_scale=True,
+                )
+            if state.total != bar.total:
+                bar.total = state.total
+                bar.refresh()
+            bar.update(state.bytes - bar.n)
+
+    def close(self) -> None:
+        for bar in self._bars.values():
+            bar.close()
+
+
+@dataclass
+class _SiteSummary:
+    speed: float = 0.0
+    left: int = 0
+    done: int = 0
+
+
+class _JobSpeed:
+    __slots__ = ("bytes", "speed", "time")
+
+    def __init__(self, bytes: int, time: float) -> None:
+        self.bytes = bytes
+        self.time = time
+        self.speed: float | None = None
+
+
+class TransferDashboard(TransferDisplay):
+    """Display an aggregated view of the transfer jobs.
+
+    Speeds per destination site and in total, job counts, ETA and the slowest running jobs are
+    displayed. Redraws are throttled, and if the stream is not a TTY, a single summary line
+    is periodically written instead.
+
+    Args:
+        slowest: The number of slowest running jobs to display.
+        refresh_interval: Minimum delay in seconds between two redraws.
+        summary_interval: Delay in seconds between two summary lines, if the stream is not a TTY.
+        stream: The stream to write to.
+    """
+
+    SPEED_SMOOTHING = 0.3
+    """Weight of the last measured speed in the exponential moving average of job speeds."""
+
+    def __init__(
+        self,
+        slowest: int = 5,
+        refresh_interval: float = 1.0,
+        summary_interval: float = 30.0,
+        stream: TextIO | None = None,
+    ) -> None:
+        self.slowest = slowest
+        self.stream = stream or sys.stderr
+        self.is_tty = self.stream.isatty()
+        self.interval = refresh_interval if self.is_tty else summary_interval
+        self._speeds: dict[int, _JobSpeed] = {}
+        self._states: Mapping[int, JobState] = {}
+        self._last_render: float | None = None
+        self._drawn_lines = 0
+        self._pending_render = False
+
+    def update(self, states: Mapping[int, JobState]) -> None:
+        now = monotonic()
+        for job_id, state in states.items():
+            progress = state.bytes
+            job_speed = self._speeds.get(job_id)
+            if job_speed is None:
+                self._speeds[job_id] = _JobSpeed(progress, now)
+            elif now > job_speed.time:
+                speed = (progress - job_speed.bytes) / (now - job_speed.time)
+                if job_speed.speed is not None:
+                    speed = job_speed.speed + self.SPEED_SMOOTHING * (speed - job_speed.speed)
+                job_speed.speed, job_speed.bytes, job_speed.time = speed, progress, now
+        self._states = states
+        self._pending_render = True
+
+        if self._last_render is None or now - self._last_render >= self.interval:
+            self._render()
+            self._last_render = now
+
+    def close(self) -> None:
+        if self._pending_render:
+            self._render()
+
+    def _speed(self, job_id: int, state: JobState) -> float:
+        if state.finished:
+            return 0.0
+        return max(self._speeds[job_id].speed or 0.0, 0.0)
+
+    def summary(self) -> str:
+        """Return a single line summary of all the transfer jobs."""
+        done = running = queued = 0
+        transferred = total = 0
+        speed = 0.0
+        for job_id, state in self._states.items():
+            if state.finished:
+                done += 1
+            elif state.status == "RUNNING":
+                running += 1
+            else:
+                queued += 1
+            transferred += state.bytes
+            total += max(state.total, state.bytes)
+            speed += self._speed(job_id, state)
+
+        eta = tqdm.format_interval((total - transferred) / speed) if speed > 0 else "--:--"
+        return (
+            f"Transfers: {done} done, {running} running, {queued} queued | "
+            f"{format_size(transferred)}/{format_size(total)} | {format_size(speed)}/s | ETA {eta}"
+        )
+
+    def _lines(self) -> list[str]:
+        sites: dict[str, _SiteSummary] = {}
+        for job_id, state in self._states.items():
+            site = sites.setdefault(state.site, _SiteSummary())
+            site.speed += self._speed(job_id, state)
+            if state.finished:
+                site.done += 1
+            else:
+                site.left += 1
+
+        lines = [self.summary()]
+        for site_id, site in sorted(sites.items()):
+            lines.append(f"  {site_id:<12} {format_size(site.speed):>10}/s  {site.left:>5} left  {site.done:>5} done")
+
+        running = [
+            (self._speed(job_id, state), job_id, state)
+            for job_id, state in self._states.items()
+            if state.status == "RUNNING"
+        ]
+        if running and self.slowest:
+            lines.append("Slowest jobs:")
+            for speed, job_id, state in sorted(running, key=lambda job: job[0])[: self.slowest]:
+                percent = 100 * state.bytes / state.total if state.total else 0.0
+                lines.append(
+                    f"  #{job_id:<6} {state.name:<50.50} -> {state.site:<12} "
+                    f"{format_size(speed):>10}/s {percent:>5.1f}%"
+                )
+        return lines
+
+    def _render(self) -> None:
+        self._pending_render = False
+        if not self.is_tty:
+            self.stream.write(self.summary() + "\n")
+            self.stream.flush()
+            return
+
+        lines = self._lines()
+        # Move the cursor back to the first previously drawn line, and clear everything below
+        prefix = f"\x1b[{self._drawn_lines}F\x1b[J" if self._drawn_lines else ""
+        self.stream.write(prefix + "\n".join(lines) + "\n")
+        self.stream.flush()
+        self._drawn_lines = len(lines)
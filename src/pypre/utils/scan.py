@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import concurrent.futures
+import fnmatch
+import glob
+import os
+import re
+import stat
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from pypre.utils.profiling import profiler
+
+_MAGIC = re.compile(r"[*?[]")
+
+SCAN_WORKERS = 8
+"""Default number of threads used to scan the local filesystem."""
+
+
+@dataclass(frozen=True)
+class LocalRelease:
+    """A release directory found on the local filesystem."""
+
+    path: Path
+    files: int | None = None
+    """Number of files in the release, if computed."""
+    size: int | None = None
+    """Total size in bytes of the files in the release, if computed."""
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+
+def _has_magic(part: str) -> bool:
+    return _MAGIC.search(part) is not None
+
+
+def _glob_dirs(pattern: str, readable_only: bool) -> list[str]:
+    """List the directories matching a glob pattern, as `glob.iglob` would, with a single `scandir` per parent.
+
+    The pattern root (its leading components without any wildcard) is resolved once, so that
+    no per-match `resolve` is needed.
+    """
+    parts = Path(pattern).parts
+    root_parts: list[str] = []
+    for part in parts:
+        if _has_magic(part):
+            break
+        root_parts.append(part)
+    root = os.path.realpath(os.path.join(*root_parts) if root_parts else os.curdir)
+    parts = parts[len(root_parts) :]
+
+    if "**" in parts:
+        # Recursive patterns are rare enough to fall back to the standard implementation. The root is escaped,
+        # as `root_dir` is only available from Python 3.10
+        matches: Iterator[str] = glob.iglob(os.path.join(glob.escape(root), *parts), recursive=True)
+        matches = (match for match in matches if os.path.isdir(match))
+    else:
+        matches = _match_dirs(root, [_matcher(part) for part in parts])
+    if readable_only:
+        return [match for match in matches if os.access(match, os.R_OK)]
+    return list(matches)
+
+
+def _matcher(part: str) -> Callable[[str], bool] | str:
+    if not _has_magic(part):
+        return part
+    match = re.compile(fnmatch.translate(part)).match
+    if part.startswith("."):
+        return lambda name: match(name) is not None
+    return lambda name: not name.startswith(".") and match(name) is not None
+
+
+def _match_dirs(root: str, parts: list[Callable[[str], bool] | str]) -> Iterator[str]:
+    if not parts:
+        if _is_dir(root):
+            yield root
+        return
+
+    part, rest = parts[0], parts[1:]
+    if isinstance(part, str):
+        yield from _match_dirs(os.path.join(root, part), rest)
+        return
+
+    try:
+        with os.scandir(root) as entries:
+            # DirEntry.is_dir() uses the file type returned by the directory listing, if any
+            matches = sorted(entry.path for entry in entries if part(entry.name) and entry.is_dir())
+    except OSError:
+        return
+    if not rest:
+        yield from matches
+        return
+    for match in matches:
+        yield from _match_dirs(match, rest)
+
+
+def _is_dir(path: str) -> bool:
+    try:
+        return stat.S_ISDIR(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+def release_size(path: Path | str) -> tuple[int, int]:
+    """Compute the number of files and the total size of a release directory.
+
+    Symbolic links to directories are not followed.
+
+    Args:
+        path: The release directory.
+
+    Returns:
+        The number of files, and their total size in bytes.
+    """
+    files = size = 0
+    stack = [os.fspath(path)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file():
+                        files += 1
+                        size += entry.stat().st_size
+        except OSError:
+            continue
+    return files, size
+
+
+def _with_sizes(paths: list[Path], workers: int) -> list[LocalRelease]:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        sizes = executor.map(release_size, paths)
+        return [LocalRelease(path, files, size) for path, (files, size) in zip(paths, sizes)]
+
+
+@profiler.timed("plan.glob")
+def scan_releases(
+    patterns: Iterable[str],
+    readable_only: bool = True,
+    sizes: bool = False,
+    workers: int = SCAN_WORKERS,
+) -> list[LocalRelease]:
+    """Find the release directories matching glob patterns.
+
+    Patterns are scanned in parallel. Hidden directories are only matched by patterns starting with a dot,
+    as with `glob.glob`.
+
+    Args:
+        patterns: The glob patterns of the release directories.
+        readable_only: Only return the readable directories.
+        sizes: Compute the number of files and the total size of each release.
+        workers: The number of threads used to scan the filesystem.
+
+    Returns:
+        The matching releases, with absolute paths, without duplicates.
+    """
+    patterns = list(patterns)
+    if not patterns:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(workers, len(patterns))) as executor:
+        matches = executor.map(lambda pattern: _glob_dirs(pattern, readable_only), patterns)
+        paths = [Path(path) for path in dict.fromkeys(path for paths in matches for path in paths)]
+    if sizes:
+        return _with_sizes(paths, workers)
+    return [LocalRelease(path) for path in paths]
+
+
+def scan_paths(
+    paths: Iterable[str | Path],
+    sizes: bool = False,
+    workers: int = SCAN_WORKERS,
+) -> tuple[list[LocalRelease], list[str]]:
+    """Check a list of release directories, with a single `stat` per release.
+
+    The parent directories are resolved once, instead of resolving every release path.
+
+    Args:
+        paths: The paths of the release directories.
+        sizes: Compute the number of files and the total size of each release.
+        workers: The number of threads used to scan the filesystem.
+
+    Returns:
+        The existing release directories, with absolute paths and without duplicates, and the paths that
+        don't exist or are not directories.
+    """
+    parents: dict[str, str] = {}
+    found: dict[Path, None] = {}
+    missing = []
+    for path in (os.fspath(raw_path) for raw_path in paths):
+        if not _is_dir(path):
+            missing.append(path)
+            continue
+        parent, name = os.path.split(os.path.normpath(path))
+        if name in {os.curdir, os.pardir}:
+            found[Path(os.path.realpath(path))] = None
+            continue
+        if parent not in parents:
+            parents[parent] = os.path.realpath(parent or os.curdir)
+        found[Path(parents[parent], name)] = None
+
+    if sizes:
+        return _with_sizes(list(found), workers), missing
+    return [LocalRelease(path) for path in found], missing
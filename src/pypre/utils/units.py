@@ -0,0 +1,10 @@
+from __future__ import annotations
+
+
+def format_size(size: float) -> str:
+    """Format a size in bytes using binary units, e.g. `1.5 MiB`."""
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if size < 1024 or unit == "TiB":
+            break
+        size /= 1024
+    return f"{size:.1f} {unit}"
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import re
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+from fake_cbftp import FakeCBFTP, FakeSettings, make_handler
+
+from pypre.cbftp import CBFTP
+from pypre.manager import CBFTPManager
+from pypre.objects.site import DirConfig, Site
+from pypre.storage import JobJournal
+
+RELEASE = "A.S01E01.x264-GRP"
+
+SECTIONS = [("tv", re.compile(r".+S\d{2,3}E\d+.+"))]
+
+
+@pytest.fixture
+def fake() -> FakeCBFTP:
+    """The state of the fake cbftp instance, having every release in every group directory of every site."""
+    return FakeCBFTP(FakeSettings(sites=["S1", "S2", "S3"], releases=[RELEASE], release_size=1000, speed=1e9))
+
+
+@contextmanager
+def serve(fake: FakeCBFTP, name: str = "fake") -> Iterator[CBFTP]:
+    """Serve a fake cbftp instance from a thread on a random port, and return a client to it."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(fake))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield CBFTP(name, f"http://127.0.0.1:{server.server_address[1]}", "password")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def cbftp(fake: FakeCBFTP) -> Iterator[CBFTP]:
+    with serve(fake) as cbftp:
+        yield cbftp
+
+
+@pytest.fixture
+def manager(cbftp: CBFTP) -> CBFTPManager:
+    return CBFTPManager(cbftp, sections=SECTIONS, check_online=False)
+
+
+@pytest.fixture
+def sites() -> dict[str, Site]:
+    return {
+        site_id: Site(
+            id=site_id,
+            groups_dir="/groups",
+            pre_command="site pre {release} {section}",
+            dir_config=DirConfig(match_group=True),
+        )
+        for site_id in ("S1", "S2", "S3")
+    }
+
+
+@pytest.fixture
+def journal(tmp_path: Path) -> JobJournal:
+    return JobJournal(tmp_path / "journal.sqlite3")
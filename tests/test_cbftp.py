@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import pytest
+import requests
+from requests import RequestException
+from requests.exceptions import InvalidJSONError
+
+from pypre.cbftp import CBFTP
+
+
+def _answering(monkeypatch: pytest.MonkeyPatch, content: bytes) -> CBFTP:
+    """Return a client receiving the provided body for every request."""
+    cbftp = CBFTP("fake", "https://127.0.0.1:55477", "password")
+    response = requests.Response()
+    response.status_code = 200
+    response._content = content
+    monkeypatch.setattr(cbftp, "_raw_request", lambda *args, **kwargs: response)
+    return cbftp
+
+
+@pytest.mark.parametrize("content", [b"", b"{", b"<html>Bad gateway</html>"])
+def test_undecodable_responses_raise_request_errors(monkeypatch: pytest.MonkeyPatch, content: bytes) -> None:
+    cbftp = _answering(monkeypatch, content)
+
+    with pytest.raises(requests.JSONDecodeError) as excinfo:
+        cbftp.get_sites()
+    assert isinstance(excinfo.value, RequestException)
+    assert excinfo.value.response is not None
+
+    with pytest.raises(RequestException):
+        cbftp.list_path_fields(site="S1", path="/groups")
+
+
+def test_listings_missing_a_field_raise_request_errors(monkeypatch: pytest.MonkeyPatch) -> None:
+    cbftp = _answering(monkeypatch, b'[{"name": "GRP", "type": "DIR"}, {"type": "DIR"}]')
+
+    with pytest.raises(InvalidJSONError, match="name"):
+        cbftp.list_path_fields(site="S1", path="/groups")
+
+
+def test_valid_responses_are_decoded(monkeypatch: pytest.MonkeyPatch) -> None:
+    cbftp = _answering(monkeypatch, b'[{"name": "GRP", "type": "DIR"}, {"name": "a.nfo", "type": "FILE"}]')
+
+    assert cbftp.list_path_fields(site="S1", path="/groups", type="DIR") == [("GRP",)]
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import time
+from collections.abc import Mapping
+from typing import Any
+
+import pytest
+from conftest import RELEASE
+from fake_cbftp import FakeCBFTP
+from requests import HTTPError
+
+from pypre.manager import CBFTPManager, TreeDistribution, distribution
+from pypre.objects.site import Site
+from pypre.operations import fxp_releases_tree
+from pypre.storage import Action, JobJournal
+from pypre.utils.progress import JobState, TransferDisplay
+
+
+class RecordingDisplay(TransferDisplay):
+    def __init__(self) -> None:
+        self.updates: list[dict[int, str]] = []
+        self.closed = False
+
+    def update(self, states: Mapping[int, JobState]) -> None:
+        self.updates.append({job_id: state.status for job_id, state in states.items()})
+
+    def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fast_polls(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(distribution, "sleep", lambda _: time.sleep(0.01))
+
+
+def _destinations(fake: FakeCBFTP) -> list[str]:
+    return [job["dst_site"] for job in fake.stats()["jobs"]]
+
+
+def test_completed_sites_are_sources_and_not_copied_again(
+    manager: CBFTPManager, sites: dict[str, Site], fake: FakeCBFTP
+) -> None:
+    tree = TreeDistribution(manager, src_sites=[sites["S1"]], dst_sites=[sites["S2"], sites["S3"]])
+    tree.completed(RELEASE, sites["S2"])
+
+    assert tree.run([RELEASE]) == {}
+    assert _destinations(fake) == ["S3"]
+
+
+def test_attached_copies_are_waited_for(manager: CBFTPManager, sites: dict[str, Site], fake: FakeCBFTP) -> None:
+    fake.settings.speed = 5000
+    job_id = manager.fxp(src_site=sites["S1"], dst_site=sites["S3"], release_name=RELEASE)["id"]
+
+    # The source of the attached copy isn't one of the sites of the distribution
+    tree = TreeDistribution(manager, src_sites=[sites["S2"]], dst_sites=[sites["S3"]])
+    tree.attach(job_id, RELEASE, "S1", sites["S3"])
+
+    assert tree.run([RELEASE]) == {}
+    assert _destinations(fake) == ["S3"]
+
+
+def test_resume_attaches_the_copies_from_other_sources(
+    manager: CBFTPManager, sites: dict[str, Site], journal: JobJournal, fake: FakeCBFTP
+) -> None:
+    fake.settings.speed = 5000
+    batch = journal.start("fxp")
+    manager.journal = batch
+    manager.fxp(src_site=sites["S1"], dst_site=sites["S3"], release_name=RELEASE)
+
+    fxp_releases_tree(manager, [RELEASE], [sites["S2"]], [sites["S3"]], max_outbound=2, check=False, batch=batch)
+
+    assert _destinations(fake) == ["S3"]
+    assert batch.states()[Action("fxp", RELEASE, "S3")].status == "DONE"
+
+
+def test_failed_submissions_are_retried_after_a_delay(
+    manager: CBFTPManager, sites: dict[str, Site], fake: FakeCBFTP, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    submitted: list[float] = []
+    fxp = manager.fxp
+
+    def flaky_fxp(**kwargs: Any) -> dict[str, Any]:
+        submitted.append(time.monotonic())
+        if len(submitted) == 1:
+            raise HTTPError("500 Server Error")
+        return fxp(**kwargs)
+
+    monkeypatch.setattr(manager, "fxp", flaky_fxp)
+    tree = TreeDistribution(manager, src_sites=[sites["S1"]], dst_sites=[sites["S2"]], retry_delay=0.2)
+
+    assert tree.run([RELEASE]) == {}
+    assert len(submitted) == 2
+    assert submitted[1] - submitted[0] >= 0.2
+    assert _destinations(fake) == ["S2"]
+
+
+def test_missing_releases_only_fail_the_pending_destinations(
+    manager: CBFTPManager, sites: dict[str, Site], fake: FakeCBFTP
+) -> None:
+    fake.settings.speed = 5000
+    missing = "B.S01E01.x264-GRP"
+    job_id = manager.fxp(src_site=sites["S1"], dst_site=sites["S3"], release_name=missing)["id"]
+
+    tree = TreeDistribution(manager, src_sites=[sites["S1"]], dst_sites=[sites["S2"], sites["S3"]])
+    tree.attach(job_id, missing, "S1", sites["S3"])
+
+    assert tree.run([missing]) == {missing: [sites["S2"]]}
+
+
+def test_progress_is_displayed(manager: CBFTPManager, sites: dict[str, Site], monkeypatch: pytest.MonkeyPatch) -> None:
+    display = RecordingDisplay()
+    monkeypatch.setattr(manager, "_transfer_display", lambda job_count: display)
+    tree = TreeDistribution(manager, src_sites=[sites["S1"]], dst_sites=[sites["S2"], sites["S3"]])
+
+    assert tree.run([RELEASE]) == {}
+    assert set(display.updates[-1].values()) == {"DONE"}
+    assert len(display.updates[-1]) == 2
+    assert display.closed
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from conftest import RELEASE
+from requests import HTTPError
+
+from pypre.manager import CBFTPManager
+from pypre.objects.site import Site
+from pypre.operations import fxp_releases
+from pypre.storage import Action, JobJournal
+
+
+def test_releases_not_submitted_from_any_source_are_journaled_as_failed(
+    manager: CBFTPManager, sites: dict[str, Site], journal: JobJournal, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    batch = journal.start("fxp")
+    manager.journal = batch
+    sources: list[str] = []
+
+    def failing_fxp(src_site: Site, **kwargs: Any) -> dict[str, Any]:
+        sources.append(src_site.id)
+        raise HTTPError("500 Server Error")
+
+    monkeypatch.setattr(manager, "fxp", failing_fxp)
+
+    fxp_releases(
+        manager,
+        [RELEASE, "Missing-GRP"],
+        [sites["S1"], sites["S2"]],
+        [sites["S3"]],
+        wait=False,
+        check=False,
+        batch=batch,
+    )
+
+    assert sorted(sources) == ["S1", "S2"]
+    states = batch.states()
+    assert states[Action("fxp", RELEASE, "S3")].status == "FAILED"
+    assert states[Action("fxp", "Missing-GRP", "S3")].status == "FAILED"
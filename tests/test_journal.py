@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from pypre.storage import Action, ActionState, JobJournal
+
+ACTION = Action("fxp", "A.S01E01.x264-GRP", "S2")
+
+
+def test_states_follow_the_transitions_of_an_action(journal: JobJournal) -> None:
+    batch = journal.start("fxp")
+    assert batch.states() == {}
+
+    batch.planned([ACTION])
+    assert batch.states() == {ACTION: ActionState("PLANNED")}
+
+    batch.submitted(ACTION, "S1", "fake", 3)
+    assert batch.states() == {ACTION: ActionState("SUBMITTED", "S1", "fake", 3)}
+
+    batch.finished(ACTION, "DONE")
+    assert batch.states() == {ACTION: ActionState("DONE")}
+
+
+def test_states_are_kept_per_batch(journal: JobJournal) -> None:
+    first = journal.start("fxp")
+    first.planned([ACTION])
+    first.finished(ACTION, "FAILED")
+    second = journal.start("fxp")
+    second.planned([ACTION])
+
+    assert first.states() == {ACTION: ActionState("FAILED")}
+    assert second.states() == {ACTION: ActionState("PLANNED")}
+
+
+def test_last_batch_is_resumed_from_disk(tmp_path: Path) -> None:
+    batch = JobJournal(tmp_path / "journal.sqlite3").start("fxp")
+    batch.planned([ACTION])
+    batch.submitted(ACTION, "S1", "fake", 3)
+    JobJournal(tmp_path / "journal.sqlite3").start("upload")
+
+    journal = JobJournal(tmp_path / "journal.sqlite3")
+    resumed = journal.last_batch("fxp")
+    assert resumed is not None
+    assert resumed.id == batch.id
+    assert resumed.states() == {ACTION: ActionState("SUBMITTED", "S1", "fake", 3)}
+    assert journal.last_batch("pre") is None
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import pytest
+from conftest import RELEASE
+from fake_cbftp import FakeCBFTP
+
+from pypre.cbftp import CBFTP
+from pypre.manager import CBFTPManager
+from pypre.objects.site import Site
+from pypre.operations import pre
+from pypre.operations.pre import pre_releases
+from pypre.storage import Action, JobJournal
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(pre, "sleep", lambda _: None)
+
+
+def _pred_sites(fake: FakeCBFTP) -> list[list[str]]:
+    return [call["sites"] for call in fake.raw_calls]
+
+
+@pytest.mark.parametrize("async_", [False, True])
+def test_retries_never_pre_the_sites_that_succeeded(
+    manager: CBFTPManager, sites: dict[str, Site], fake: FakeCBFTP, async_: bool
+) -> None:
+    fake.settings.raw_failures = {"S2": 1, "S3": 2}
+
+    failures = pre_releases(manager, [RELEASE], list(sites.values()), cooldown=1, async_=async_, retries=3)
+
+    assert failures == {}
+    assert _pred_sites(fake) == [["S1", "S2", "S3"], ["S2", "S3"], ["S3"]]
+
+
+def test_retries_are_bounded(manager: CBFTPManager, sites: dict[str, Site], fake: FakeCBFTP) -> None:
+    fake.settings.raw_failures = {"S2": 3}
+
+    failures = pre_releases(manager, [RELEASE], [sites["S1"], sites["S2"]], cooldown=1, retries=2)
+
+    assert failures == {RELEASE: {"S2": "scripted failure"}}
+    assert _pred_sites(fake) == [["S1", "S2"], ["S2"], ["S2"]]
+
+
+def test_unknown_outcomes_are_never_retried(manager: CBFTPManager, sites: dict[str, Site], fake: FakeCBFTP) -> None:
+    fake.settings.raw_failures = {"S2": 1}
+    fake.settings.raw_unanswered = ["S3"]
+
+    failures = pre_releases(manager, [RELEASE], list(sites.values()), cooldown=1, retries=3)
+
+    assert set(failures) == {RELEASE}
+    assert set(failures[RELEASE]) == {"S3"}
+    assert _pred_sites(fake) == [["S1", "S2", "S3"], ["S2"]]
+
+
+def test_resume_skips_the_sites_already_pred_or_sent(
+    manager: CBFTPManager, sites: dict[str, Site], journal: JobJournal, fake: FakeCBFTP
+) -> None:
+    batch = journal.start("pre")
+    batch.planned(Action("pre", RELEASE, site_id) for site_id in sites)
+    batch.finished(Action("pre", RELEASE, "S1"), "DONE")
+    batch.submitted(Action("pre", RELEASE, "S2"), None, "fake", None)
+    manager.journal = batch
+
+    failures = pre_releases(manager, [RELEASE], list(sites.values()), cooldown=1, batch=batch)
+
+    assert [call["sites"] for call in fake.raw_calls] == [["S3"]]
+    assert set(failures) == {RELEASE}
+    assert set(failures[RELEASE]) == {"S2"}
+    states = batch.states()
+    assert states[Action("pre", RELEASE, "S2")].status == "SUBMITTED"
+    assert states[Action("pre", RELEASE, "S3")].status == "DONE"
+
+
+def test_resume_collects_the_asynchronous_pres_sent(
+    manager: CBFTPManager, sites: dict[str, Site], journal: JobJournal, fake: FakeCBFTP
+) -> None:
+    batch = journal.start("pre")
+    manager.journal = batch
+    # Interrupted before the results are collected
+    manager.send_pre(RELEASE, manager.prepare_pre(RELEASE, [sites["S1"], sites["S2"]]))
+
+    failures = pre_releases(manager, [RELEASE], [sites["S1"], sites["S2"]], cooldown=1, batch=batch, async_=True)
+
+    assert failures == {}
+    assert len(fake.raw_calls) == 1
+    assert {state.status for state in batch.states().values()} == {"DONE"}
+
+
+def test_asynchronous_pre_without_request_id_fails(
+    manager: CBFTPManager, cbftp: CBFTP, sites: dict[str, Site], journal: JobJournal, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    batch = journal.start("pre")
+    manager.journal = batch
+    monkeypatch.setattr(cbftp, "raw", lambda *args, **kwargs: {})
+
+    pending = manager.send_pre(RELEASE, manager.prepare_pre(RELEASE, [sites["S1"]]))
+
+    assert pending.requests == []
+    assert pending.result.failures == {"S1": "No request ID returned."}
+    assert batch.states()[Action("pre", RELEASE, "S1")].status == "FAILED"
+
+
+def test_pres_are_journaled_before_being_sent(
+    manager: CBFTPManager, sites: dict[str, Site], journal: JobJournal, fake: FakeCBFTP
+) -> None:
+    batch = journal.start("pre")
+    manager.journal = batch
+    journaled = []
+
+    def on_send() -> None:
+        journaled.append({action.site: state.status for action, state in batch.states().items()})
+        assert fake.raw_calls == []
+
+    manager.submit_pre(RELEASE, manager.prepare_pre(RELEASE, list(sites.values())), on_send=on_send)
+
+    assert journaled == [dict.fromkeys(sites, "SUBMITTED")]
+
+
+def test_unresolved_pres_raise_before_preing(manager: CBFTPManager, sites: dict[str, Site], fake: FakeCBFTP) -> None:
+    with pytest.raises(ValueError, match="Unknown-GRP"):
+        pre_releases(manager, [RELEASE, "Unknown-GRP"], list(sites.values()), cooldown=1)
+
+    assert fake.raw_calls == []
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from pypre.utils.scan import scan_releases
+
+
+def test_recursive_patterns_match_nested_directories(tmp_path: Path) -> None:
+    # The resolved root of the pattern contains glob wildcards, which must not be interpreted
+    root = tmp_path / "[tv]"
+    for path in ("A.S01E01.x264-GRP", "2024/B.S01E01.x264-GRP", "2024/.C.S01E01.x264-GRP"):
+        (root / path).mkdir(parents=True)
+    (root / "D.S01E01.x264-GRP").write_text("not a directory")
+    (tmp_path / "tv").symlink_to(root)
+
+    releases = scan_releases([f"{tmp_path}/tv/**/*-GRP"])
+
+    assert sorted(release.path for release in releases) == [
+        root / "2024" / "B.S01E01.x264-GRP",
+        root / "A.S01E01.x264-GRP",
+    ]
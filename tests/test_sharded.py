@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+from contextlib import ExitStack
+
+import pytest
+from conftest import RELEASE, serve
+from fake_cbftp import FakeCBFTP, FakeSettings
+
+from pypre.manager import ShardedCBFTPManager
+from pypre.objects.site import Site
+
+
+@pytest.fixture
+def sharded() -> Iterator[ShardedCBFTPManager]:
+    settings = FakeSettings(sites=["S1", "S2", "S3"], releases=[RELEASE], release_size=1000, speed=1e9)
+    with ExitStack() as stack:
+        cbftps = [stack.enter_context(serve(FakeCBFTP(settings), name)) for name in ("first", "second")]
+        yield ShardedCBFTPManager(cbftps)
+
+
+def test_transfer_jobs_keep_their_id(sharded: ShardedCBFTPManager, sites: dict[str, Site]) -> None:
+    job_id = sharded.fxp(src_site=sites["S1"], dst_site=sites["S2"], release_name=RELEASE)["id"]
+
+    first = {(job["cbftp"], job["id"]) for job in sharded.get_transferjobs()}
+    second = {(job["cbftp"], job["id"]) for job in sharded.get_transferjobs()}
+
+    assert first == second
+    assert job_id in {job_id for _, job_id in first}
+    assert sharded.attach_transferjob(*sharded.job_origin(job_id)) == job_id
+
+
+def test_finished_jobs_are_not_counted_in_the_load(sharded: ShardedCBFTPManager, sites: dict[str, Site]) -> None:
+    first = sharded.fxp(src_site=sites["S1"], dst_site=sites["S2"], release_name=RELEASE)
+    sharded.show_transfer_progress([first["id"]])
+    second = sharded.fxp(src_site=sites["S1"], dst_site=sites["S3"], release_name=RELEASE)
+    sharded.get_transferjobs()
+    third = sharded.fxp(src_site=sites["S1"], dst_site=sites["S3"], release_name=RELEASE)
+
+    # The first job finished, so the second one is routed to the same instance, and the third one to the other
+    assert first["cbftp"] == second["cbftp"]
+    assert third["cbftp"] != second["cbftp"]
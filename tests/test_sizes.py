@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pytest
+
+from pypre.storage import ReleaseSizeIndex, sizes
+from pypre.utils.scan import LocalRelease, release_size
+
+
+@pytest.fixture
+def scanned(monkeypatch: pytest.MonkeyPatch) -> list[Path]:
+    """The release directories whose size is computed, in order."""
+    paths: list[Path] = []
+
+    def recording_release_size(path: Path) -> tuple[int, int]:
+        paths.append(path)
+        return release_size(path)
+
+    monkeypatch.setattr(sizes, "release_size", recording_release_size)
+    return paths
+
+
+def _touch_later(path: Path) -> None:
+    """Move the modification time of a directory forward, regardless of the timestamp resolution."""
+    mtime_ns = os.stat(path).st_mtime_ns + 10**9
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_sizes_are_cached_until_a_subdirectory_changes(tmp_path: Path, scanned: list[Path]) -> None:
+    release = tmp_path / "A.S01E01.x264-GRP"
+    (release / "Sample").mkdir(parents=True)
+    (release / "a.rar").write_bytes(b"x" * 10)
+    index = ReleaseSizeIndex(tmp_path / "sizes.sqlite3")
+
+    assert index.get([release]) == {release: LocalRelease(release, 1, 10)}
+    assert index.get([release]) == {release: LocalRelease(release, 1, 10)}
+    assert scanned == [release]
+
+    (release / "Sample" / "a.mkv").write_bytes(b"y" * 5)
+    _touch_later(release / "Sample")
+
+    assert index.get([release]) == {release: LocalRelease(release, 2, 15)}
+    assert scanned == [release, release]
+
+
+def test_sizes_are_looked_up_in_chunks(tmp_path: Path, scanned: list[Path], monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(sizes, "_QUERY_CHUNK", 2)
+    releases = [tmp_path / f"{name}.S01E01.x264-GRP" for name in "ABCDE"]
+    for release in releases:
+        release.mkdir()
+    index = ReleaseSizeIndex(tmp_path / "sizes.sqlite3")
+    index.get(releases)
+
+    assert ReleaseSizeIndex(tmp_path / "sizes.sqlite3").get(releases) == {
+        release: LocalRelease(release, 0, 0) for release in releases
+    }
+    assert scanned == releases
+
+
+def test_missing_directories_are_omitted(tmp_path: Path, scanned: list[Path]) -> None:
+    assert ReleaseSizeIndex(tmp_path / "sizes.sqlite3").get([tmp_path / "missing"]) == {}
+    assert scanned == []